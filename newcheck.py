@@ -1,9 +1,37 @@
 import streamlit as st
 import pandas as pd
-import math
-import requests
+import numpy as np
+import altair as alt
+import html
+import sqlite3
 from datetime import datetime
 
+from solarcalc.batch import columns_from_scenarios
+from solarcalc.cashflow import evaluate_lifetime
+from solarcalc.catalog import get_catalog
+from solarcalc.components import evaluate_bill, get_components, select_components, value_horizon_years
+from solarcalc.dispatch import dispatch_scenario
+from solarcalc.engine import Scenario, panel_wattage_kw
+from solarcalc.financing import financing_grid
+from solarcalc.graph import ResultGraph
+from solarcalc.history import ScenarioHistory, compare, make_run, max_pinned, max_runs
+from solarcalc.irradiance import IrradianceGrid
+from solarcalc.loads import Load, daily_load, load_arrays, site_row
+from solarcalc.location import LocationResolver
+from solarcalc.optimize import Bounds, optimize
+from solarcalc.rates import RateCache
+from solarcalc.risk import Distribution, percentiles, simulate
+from solarcalc.schedule import amortization_schedule, month_names
+from solarcalc.seasonal import (
+    day_month,
+    design_month_options,
+    evaluate_monthly,
+    monthly_scenario,
+    sun_hour_catalog,
+)
+from solarcalc.sensitivity import outputs, sensitivity
+from solarcalc.store import get_store
+
 # Configure page
 st.set_page_config(
     page_title="Solar Productive Use Calculator",
@@ -16,6 +44,8 @@ if 'inputs_visible' not in st.session_state:
     st.session_state.inputs_visible = True
 if 'calculated' not in st.session_state:
     st.session_state.calculated = False
+if 'history' not in st.session_state:
+    st.session_state.history = ScenarioHistory()
 
 # Minimalist CSS for styling
 st.markdown("""
@@ -46,6 +76,15 @@ st.markdown("""
         justify-content: center;
     }
     
+    .metric-grid {
+        display: grid;
+        column-gap: 16px;
+    }
+    
+    .metric-help {
+        cursor: help;
+    }
+    
     .metric-title {
         font-size: 0.75rem;
         color: #000000;
@@ -171,97 +210,84 @@ div.stButton > button:first-child:hover {
 """, unsafe_allow_html=True)
 
 # Custom metric card component
-def metric_card(title, value, unit="", help_text=None):
-    card = f"""
-    <div class="metric-card">
-        <div class="metric-title">{title}</div>
+def metric_card_html(title, value, unit="", help_text=None):
+    info = f' <span class="metric-help" title="{html.escape(help_text, quote=True)}">ℹ️</span>' if help_text else ""
+    return f"""<div class="metric-card">
+        <div class="metric-title">{title}{info}</div>
         <div class="metric-value">{value}</div>
         <div class="metric-unit">{unit}</div>
-    </div>
-    """
-    if help_text:
-        with st.expander("ℹ️"):
-            st.caption(help_text)
-    st.markdown(card, unsafe_allow_html=True)
+    </div>"""
+
+def metric_grid(cards, columns):
+    # One markdown block per grid instead of one element per card.
+    # cards are (title, value, unit[, help_text]) tuples; None leaves a cell empty.
+    cells = [metric_card_html(*card) if card else "<div></div>" for card in cards]
+    st.markdown(
+        f'<div class="metric-grid" style="grid-template-columns: repeat({columns}, minmax(0, 1fr));">{"".join(cells)}</div>',
+        unsafe_allow_html=True
+    )
 
 # Appliance & system options
-appliances = ["Choose one", "Mill 2kW", "Mill 3kW"]
+appliance_matches = 200  # Most catalog matches listed in the picker
+# First row of the several-appliances table; columns follow the fields of Load
+site_table_defaults = {"Appliance": "Mill 2kW", "Power (kW)": 2.0, "Speed (kg/hr)": 100.0, "Runtime (hrs)": 4.0,
+                       "Start Hour": 8.0, "Price (USD)": 600.0, "Income per kg (USD)": round(5/140, 3)}
 system_rating = ["Choose one", "AC", "DC"]
 
-# Panel specs
-panel_wattage_kw = 0.5  # 500W
-panel_cost = 50  
-
-# Maps
-power_map = {"Mill 2kW": 2.0, "Mill 3kW": 3.0}
-price_map_usd = {"Mill 2kW": 600, "Mill 3kW": 800}
-processing_speed_map = {"Mill 2kW": 100, "Mill 3kW": 150}  # kg/hr
-
-# Common currencies with sample exchange rates (fallback)
-common_currencies = {
-    "USD": 1.0,
-    "EUR": 0.93,
-    "GBP": 0.80,
-    "JPY": 154.62,
-    "CAD": 1.37,
-    "AUD": 1.52,
-    "CHF": 0.91,
-    "CNY": 7.24,
-    "INR": 83.45,
-    "BRL": 5.40,
-    "MXN": 17.05,
-    "ZAR": 18.85,
-    "NGN": 1400.0,
-    "KES": 133.0,
-    "GHS": 13.5,
-    "EGP": 47.9,
-    "XOF": 610.0
-}
-
 # --- GET EXCHANGE RATES WITH FALLBACK ---
-@st.cache_data(ttl=3600)  # cache for 1 hour
+@st.cache_resource
+def get_rate_cache():
+    # One process-wide cache; its snapshot survives restarts
+    return RateCache(ttl=3600)
+
 def get_exchange_rates():
-    try:
-        # Try multiple API endpoints
-        endpoints = [
-            "https://api.exchangerate-api.com/v4/latest/USD",
-            "https://open.er-api.com/v6/latest/USD"
-        ]
-        
-        for url in endpoints:
-            try:
-                resp = requests.get(url, timeout=5)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if "rates" in data:
-                        # Merge with our common currencies as fallback
-                        rates = data["rates"]
-                        for currency, rate in common_currencies.items():
-                            if currency not in rates:
-                                rates[currency] = rate
-                        return rates
-            except:
-                continue
-                
-        # If all APIs fail, use our fallback currencies
+    rates, fetched_at = get_rate_cache().get()
+    if fetched_at is None:
         st.warning("Could not fetch live exchange rates. Using sample rates.")
-        return common_currencies
-    except:
-        st.warning("Could not fetch exchange rates. Using sample rates.")
-        return common_currencies
+    return rates, fetched_at
+
+# --- LOCAL IRRADIANCE DATASET ---
+@st.cache_resource
+def get_irradiance_grid():
+    # Memory-mapped once per process; None when no dataset is installed
+    try:
+        return IrradianceGrid()
+    except (OSError, ValueError):
+        return None
 
 # --- DETECT USER LOCATION & CURRENCY ---
+@st.cache_resource
+def get_location_resolver():
+    # Shared across sessions: lookups are cached per client IP
+    return LocationResolver(ttl=24 * 3600, failure_ttl=600)
+
+def get_client_ip():
+    forwarded = st.context.headers.get("X-Forwarded-For", "")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return st.context.ip_address
+
 def get_user_currency():
-    try:
-        ip_info = requests.get("https://ipapi.co/json/", timeout=3).json()
-        country = ip_info.get("country_name", "Unknown")
-        currency = ip_info.get("currency", "USD")
-        return country, currency
-    except:
-        return "Unknown", "USD"
-
-# Fetch exchange rates on every rerun
-rates = get_exchange_rates()
+    # Returns (country, currency), or None while the lookup is still running
+    if "user_location" in st.session_state:
+        return st.session_state.user_location
+    found = get_location_resolver().get(get_client_ip())
+    if found is None:
+        return None
+    location, ok = found
+    if ok:
+        st.session_state.user_location = location
+    return location
+
+@st.fragment(run_every=0.5)
+def wait_for_location():
+    # Polls the background lookup and reruns the app once it has an answer
+    if get_user_currency() is not None:
+        st.rerun()
+    st.info("📍 Detecting your location...")
+
+# Served from the on-disk snapshot; refreshed in the background when stale
+rates, rates_fetched_at = get_exchange_rates()
 currencies = sorted(rates.keys())
 
 # ... (previous code remains the same until the currency section)
@@ -274,740 +300,1454 @@ if 'selected_currency' not in st.session_state:
 st.title("☀️ Solar Productive Use Calculator")
 
 # --- INPUT SECTION ---
-if st.session_state.inputs_visible:
+# Runs as a fragment so the mode and location toggles only rerun this section,
+# and the sliders live in a form so they are committed together on Calculate.
+# In live mode the form is dropped and results are drawn inside the fragment.
+@st.fragment
+def input_section():
+    live = st.toggle(
+        "⚡ Live results",
+        key="live_mode",
+        help="Update the results as you change inputs instead of pressing Calculate"
+    )
+
     with st.expander("Input Parameters", expanded=True):
-        # Create columns for input layout
-        col1, col2 = st.columns(2)
+        col_mode, col_location = st.columns(2)
 
-        with col1:
-            st.markdown('<div class="section-title">Appliance Details</div>', unsafe_allow_html=True)
-            
+        with col_mode:
             # Choice: from database or manual entry
-            appliance_mode = st.radio("Select Appliance Mode:", ["Pick from Database", "Enter Custom Specs"], horizontal=True)
+            appliance_mode = st.radio("Select Appliance Mode:", ["Pick from Database", "Enter Custom Specs", "Several Appliances"], horizontal=True, key="input_appliance_mode")
 
-            if appliance_mode == "Pick from Database":
-                selected_appliance = st.selectbox(
-                    "Productive Use Appliance:", 
-                    appliances,
-                    help="Select the appliance you want to power with solar"
-                )
-                if selected_appliance != "Choose one":
-                    power = power_map[selected_appliance]
-                    price_usd = price_map_usd[selected_appliance]
-                    processing_speed = processing_speed_map[selected_appliance]
+        with col_location:
+            use_location = st.checkbox(
+                "Use my location to set currency automatically",
+                key="input_use_location",
+                value=False,
+                help="Automatically detect your country and currency"
+            )
+
+            # Get the current selected currency from session state
+            selected_currency = st.session_state.selected_currency
+
+            detected = get_user_currency() if use_location else None
+
+            if use_location and detected is None:
+                # Keep the current currency until the lookup finishes
+                wait_for_location()
+            elif use_location:
+                user_country, detected_currency = detected
+                if detected_currency in currencies:
+                    selected_currency = detected_currency
+                    st.success(f"Detected location: {user_country} - Using {detected_currency}")
                 else:
-                    power, price_usd, processing_speed = 0, 0, 0
-
-            else:  # Custom Specs
-                custom_name = st.text_input("Appliance Name", value="Custom Mill")
-                power = st.number_input("Power Consumption (kW)", min_value=0.1, value=2.0, step=0.1)
-                processing_speed = st.number_input("Processing Speed (kg/hour)", min_value=1, value=100, step=1)
-                price_usd = st.number_input("Appliance Price (USD)", min_value=0.0, value=500.0, step=50.0)
-                selected_appliance = custom_name  # assign custom name
+                    st.warning(f"Detected currency {detected_currency} not supported. Using USD instead.")
+                    selected_currency = "USD"
+
+        if appliance_mode == "Pick from Database":
+            # Outside the form so the list narrows as the search is typed
+            catalog = get_catalog()
+            col_search, col_category, col_max_power = st.columns(3)
+            with col_search:
+                appliance_search = st.text_input("Search Appliances", key="input_appliance_search",
+                                                 placeholder="e.g. rice huller")
+            with col_category:
+                appliance_category = st.selectbox("Category", ["All", *catalog.categories()],
+                                                  key="input_appliance_category")
+            with col_max_power:
+                appliance_max_power = st.number_input("Max Power (kW)", min_value=0.0, value=0.0, step=0.5,
+                                                      key="input_appliance_max_power", help="0 means any power")
+            matches = {item.name: item for item in catalog.search(
+                appliance_search,
+                None if appliance_category == "All" else appliance_category,
+                max_power=appliance_max_power or None,
+                limit=appliance_matches
+            )}
+            # Keep the current pick listed while the search changes
+            current = catalog.get(st.session_state.get("input_selected_appliance", ""))
+            if current is not None:
+                matches.setdefault(current.name, current)
+
+        with st.container() if live else st.form("input_form", border=False):
+            # Create columns for input layout
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.markdown('<div class="section-title">Appliance Details</div>', unsafe_allow_html=True)
+
+                if appliance_mode == "Pick from Database":
+                    selected_appliance = st.selectbox(
+                        "Productive Use Appliance:",
+                        ["Choose one", *matches],
+                        key="input_selected_appliance",
+                        help="Select the appliance you want to power with solar"
+                    )
+                    if len(matches) >= appliance_matches:
+                        st.caption(f"Showing the first {appliance_matches} matches. Search to narrow the list.")
+                    if selected_appliance != "Choose one":
+                        power = matches[selected_appliance].power
+                        price_usd = matches[selected_appliance].price_usd
+                        processing_speed = matches[selected_appliance].processing_speed
+                    else:
+                        power, price_usd, processing_speed = 0, 0, 0
+
+                elif appliance_mode == "Enter Custom Specs":
+                    custom_name = st.text_input("Appliance Name", value="Custom Mill", key="input_custom_name")
+                    power = st.number_input("Power Consumption (kW)", min_value=0.1, value=2.0, step=0.1, key="input_power")
+                    processing_speed = st.number_input("Processing Speed (kg/hour)", min_value=1, value=100, step=1, key="input_processing_speed")
+                    price_usd = st.number_input("Appliance Price (USD)", min_value=0.0, value=500.0, step=50.0, key="input_price_usd")
+                    selected_appliance = custom_name  # assign custom name
+
+                else:  # Several Appliances
+                    # One row per appliance; they share the solar system and run in their own windows
+                    site_table = st.data_editor(
+                        pd.DataFrame([site_table_defaults]),
+                        num_rows="dynamic",
+                        hide_index=True,
+                        use_container_width=True,
+                        key="input_site_loads",
+                        column_config={
+                            "Power (kW)": st.column_config.NumberColumn(min_value=0.0, step=0.1),
+                            "Speed (kg/hr)": st.column_config.NumberColumn(min_value=0.0, step=1.0),
+                            "Runtime (hrs)": st.column_config.NumberColumn(min_value=0.0, max_value=24.0, step=0.5),
+                            "Start Hour": st.column_config.NumberColumn(min_value=0.0, max_value=23.5, step=0.5),
+                            "Price (USD)": st.column_config.NumberColumn(min_value=0.0, step=50.0),
+                            "Income per kg (USD)": st.column_config.NumberColumn(min_value=0.0, step=0.001,
+                                                                                 format="%.3f"),
+                        }
+                    )
+                    st.caption("The system is sized for the appliances' combined daily energy, and the inverter "
+                               "for the most they draw at once.")
             
-            selected_system = st.selectbox(
-                "System Rating:", 
-                system_rating,
-                help="Select AC or DC system type"
-            )
+                selected_system = st.selectbox(
+                    "System Rating:",
+                    system_rating,
+                    key="input_selected_system",
+                    help="Select AC or DC system type"
+                )
             
-            runtime_per_day = st.slider(
-                "Runtime Per Day (hrs)", 
-                min_value=1.0, 
-                max_value=24.0,
-                value=4.0, 
-                step=0.5,
-                help="Daily operating hours of the appliance"
-            )
+                if appliance_mode != "Several Appliances":
+                    runtime_per_day = st.slider(
+                        "Runtime Per Day (hrs)",
+                        key="input_runtime_per_day",
+                        min_value=1.0,
+                        max_value=24.0,
+                        value=4.0,
+                        step=0.5,
+                        help="Daily operating hours of the appliance"
+                    )
             
-            operating_days = st.slider(
-                "Operating Days per Year", 
-                min_value=1, 
-                max_value=365,
-                value=250,
-                help="Number of days per year the business will operate"
-            )
+                operating_days = st.slider(
+                    "Operating Days per Year",
+                    key="input_operating_days",
+                    min_value=1, 
+                    max_value=365,
+                    value=250,
+                    help="Number of days per year the business will operate"
+                )
             
-            income_per_kg = st.number_input(
-                "Income per kg (USD)", 
-                min_value=0.0, 
-                value=round(5/140, 3),
-                step=0.001,
-                format="%.3f",
-                help="Revenue generated per kg of processed material"
-            )
+                if appliance_mode != "Several Appliances":
+                    income_per_kg = st.number_input(
+                        "Income per kg (USD)",
+                        key="input_income_per_kg",
+                        min_value=0.0,
+                        value=round(5/140, 3),
+                        step=0.001,
+                        format="%.3f",
+                        help="Revenue generated per kg of processed material"
+                    )
 
-        with col2:
-            st.markdown('<div class="section-title">Solar System Details</div>', unsafe_allow_html=True)
-            sun_hours = st.slider(
-                "Sun Hours Per Day (hrs)", 
-                min_value=1.0, 
-                max_value=12.0,
-                value=4.0, 
-                step=0.5,
-                help="Average daily peak sun hours at your location"
-            )
+            with col2:
+                st.markdown('<div class="section-title">Solar System Details</div>', unsafe_allow_html=True)
+                sun_hours = st.slider(
+                    "Sun Hours Per Day (hrs)",
+                    key="input_sun_hours",
+                    min_value=1.0, 
+                    max_value=12.0,
+                    value=4.0, 
+                    step=0.5,
+                    help="Average daily peak sun hours at your location"
+                )
+
+                irradiance_grid = get_irradiance_grid()
+                sun_profile_name = st.selectbox(
+                    "Monthly Sun Hours",
+                    ["Same every month", *(["From site coordinates"] if irradiance_grid else []), *sun_hour_catalog,
+                     "Custom"],
+                    key="input_sun_profile",
+                    help="Size for the rainy season by giving peak sun hours month by month"
+                )
+                size_for = st.selectbox(
+                    "Size the System For",
+                    list(design_month_options),
+                    key="input_size_for",
+                    help="Which month's sun hours the panels are sized for when sun hours vary by month"
+                )
+                custom_profile = st.data_editor(
+                    pd.DataFrame([[4.0] * 12], columns=month_names),
+                    hide_index=True,
+                    use_container_width=True,
+                    key="input_custom_profile"
+                )
+                st.caption("Custom monthly sun hours, used when Monthly Sun Hours is Custom.")
+                latitude = longitude = None
+                if irradiance_grid:
+                    lat_col, lon_col = st.columns(2)
+                    with lat_col:
+                        latitude = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=0.0,
+                                                   step=0.01, format="%.4f", key="input_latitude")
+                    with lon_col:
+                        longitude = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=0.0,
+                                                    step=0.01, format="%.4f", key="input_longitude")
+                    st.caption("Site coordinates, used when Monthly Sun Hours is From site coordinates.")
             
-            system_efficiency = st.slider(
-                "System Efficiency (%)", 
-                min_value=1, 
-                max_value=100, 
-                value=80,
-                help="Overall efficiency of the solar system"
-            )
+                system_efficiency = st.slider(
+                    "System Efficiency (%)",
+                    key="input_system_efficiency",
+                    min_value=1, 
+                    max_value=100, 
+                    value=80,
+                    help="Overall efficiency of the solar system"
+                )
             
-            # Changed from slider to number input for battery storage
-            battery_hours = st.number_input(
-                "Battery Storage (hrs)", 
-                min_value=0, 
-                max_value=24,
-                value=1,
-                help="Hours of battery backup required"
-            )
+                # Changed from slider to number input for battery storage
+                battery_hours = st.number_input(
+                    "Battery Storage (hrs)",
+                    key="input_battery_hours",
+                    min_value=0, 
+                    max_value=24,
+                    value=1,
+                    help="Hours of battery backup required"
+                )
             
-            daily_operating_cost = st.number_input(
-                "Daily Operating Cost (USD)", 
-                value=10.0, 
-                step=1.0,
-                help="Daily expenses like labor, rent, etc."
-            )
+                daily_operating_cost = st.number_input(
+                    "Daily Operating Cost (USD)",
+                    key="input_daily_operating_cost",
+                    value=10.0, 
+                    step=1.0,
+                    help="Daily expenses like labor, rent, etc."
+                )
 
-        # Financial inputs
-        st.markdown('<div class="section-title">Financing Options</div>', unsafe_allow_html=True)
-        col3, col4, col5, col6 = st.columns(4)
-
-        with col3:
-            loan_term_years = st.slider(
-                "Loan Term (Years)", 
-                min_value=1,
-                max_value=10,
-                value=3, 
-                step=1,
-                help="Duration of the loan repayment period"
-            )
+            # Financial inputs
+            st.markdown('<div class="section-title">Financing Options</div>', unsafe_allow_html=True)
+            col3, col4, col5, col6 = st.columns(4)
 
-        with col4:
-            interest_rate = st.slider(
-                "Interest Rate (p.a. %)", 
-                min_value=0.0,
-                max_value=30.0,
-                value=15.0, 
-                step=0.5,
-                help="Annual interest rate percentage for the loan"
-            ) / 100
-
-        with col5:
-            # Changed to percentage slider for deposit
-            deposit_percentage = st.slider(
-                "Deposit (% of total cost)", 
-                min_value=0, 
-                max_value=100, 
+            with col3:
+                loan_term_years = st.slider(
+                    "Loan Term (Years)",
+                    key="input_loan_term_years",
+                    min_value=1,
+                    max_value=10,
+                    value=3, 
+                    step=1,
+                    help="Duration of the loan repayment period"
+                )
+
+            with col4:
+                interest_rate = st.slider(
+                    "Interest Rate (p.a. %)",
+                    key="input_interest_rate",
+                    min_value=0.0,
+                    max_value=30.0,
+                    value=15.0, 
+                    step=0.5,
+                    help="Annual interest rate percentage for the loan"
+                ) / 100
+
+            with col5:
+                # Changed to percentage slider for deposit
+                deposit_percentage = st.slider(
+                    "Deposit (% of total cost)",
+                    key="input_deposit_percentage",
+                    min_value=0, 
+                    max_value=100, 
+                    value=0,
+                    step=5,
+                    help="Percentage of the total installed cost as deposit"
+                )
+
+            with col6:
+                install_increase = st.slider(
+                    "Import & Installation Cost Increase (%)",
+                    key="input_install_increase",
+                    min_value=0, 
+                    max_value=100,
+                    value=100, 
+                    step=10,
+                    help="Additional percentage cost for importing and installation"
+                )
+                install_multiplier = 1 + (install_increase / 100)
+
+            # Subsidy input
+            st.markdown('<div class="section-title">Subsidy & Grant Options</div>', unsafe_allow_html=True)
+            subsidy_percentage = st.slider(
+                "Subsidy Percentage (%)",
+                key="input_subsidy_percentage",
+                min_value=0,
+                max_value=100,
                 value=0,
                 step=5,
-                help="Percentage of the total installed cost as deposit"
+                help="Percentage of the total installed cost covered by subsidies"
             )
 
-        with col6:
-            install_increase = st.slider(
-                "Import & Installation Cost Increase (%)", 
-                min_value=0, 
-                max_value=100,
-                value=100, 
-                step=10,
-                help="Additional percentage cost for importing and installation"
-            )
-            install_multiplier = 1 + (install_increase / 100)
-
-        # Subsidy input
-        st.markdown('<div class="section-title">Subsidy & Grant Options</div>', unsafe_allow_html=True)
-        subsidy_percentage = st.slider(
-            "Subsidy Percentage (%)",
-            min_value=0,
-            max_value=100,
-            value=0,
-            step=5,
-            help="Percentage of the total installed cost covered by subsidies"
-        )
+            # Currency selection
+            if not use_location:
+                st.markdown('<div class="section-title">Currency Settings</div>', unsafe_allow_html=True)
+                # Set the index to USD by finding its position in the currencies list
+                usd_index = currencies.index("USD") if "USD" in currencies else 0
+                selected_currency = st.selectbox(
+                    "Select Currency:",
+                    currencies,
+                    key="input_selected_currency",
+                    index=usd_index
+                )
 
-        # Currency selection
-        st.markdown('<div class="section-title">Currency Settings</div>', unsafe_allow_html=True)
-        use_location = st.checkbox(
-            "Use my location to set currency automatically", 
-            value=False,
-            help="Automatically detect your country and currency"
-        )
+            calculate_btn = False
+            if not live:
+                calculate_btn = st.form_submit_button(
+                    "🚀 Calculate System Requirements", 
+                    use_container_width=True,
+                    type="primary"
+                )
 
-        # Get the current selected currency from session state
-        selected_currency = st.session_state.selected_currency
-        
-        if use_location:
-            user_country, detected_currency = get_user_currency()
-            if detected_currency in currencies:
-                selected_currency = detected_currency
-                st.success(f"Detected location: {user_country} - Using {detected_currency}")
-            else:
-                st.warning(f"Detected currency {detected_currency} not supported. Using USD instead.")
-                selected_currency = "USD"
+    # Update the session state with the selected currency
+    st.session_state.selected_currency = selected_currency
+
+    # Several appliances are sized as one equivalent load with their coincident peak
+    input_error = None
+    site_loads = None
+    peak_power = 0
+    if appliance_mode == "Several Appliances":
+        rows = site_table.fillna({"Appliance": "", "Speed (kg/hr)": 0, "Price (USD)": 0,
+                                  "Start Hour": site_table_defaults["Start Hour"],
+                                  "Income per kg (USD)": 0}).dropna()
+        site_loads = tuple(
+            Load(str(name) or f"Appliance {i + 1}", *(float(v) for v in values))
+            for i, (name, *values) in enumerate(rows.itertuples(index=False))
+            if values[0] > 0 and values[2] > 0
+        )
+        if site_loads:
+            site = site_row(site_loads)
+            power, processing_speed, price_usd = site["power"], site["processing_speed"], site["price_usd"]
+            runtime_per_day, income_per_kg, peak_power = (site["runtime_per_day"], site["income_per_kg"],
+                                                          site["peak_power"])
+            selected_appliance = " + ".join(load.name for load in site_loads)
         else:
-            # Set the index to USD by finding its position in the currencies list
-            usd_index = currencies.index("USD") if "USD" in currencies else 0
-            selected_currency = st.selectbox(
-                "Select Currency:", 
-                currencies,
-                index=usd_index
-            )
-        
-        # Update the session state with the selected currency
-        st.session_state.selected_currency = selected_currency
+            input_error = "Add at least one appliance with power and runtime."
+            selected_appliance = "Choose one"
+
+    # A monthly profile replaces the slider with the design month's sun hours and its share of the runtime
+    if sun_profile_name == "Same every month":
+        sun_profile = None
+    elif sun_profile_name == "From site coordinates":
+        site = irradiance_grid.lookup(latitude, longitude)
+        sun_profile = tuple(site.monthly[0].tolist()) if site.found[0] else None
+        if sun_profile is None:
+            input_error = f"No irradiance data within 25 km of {latitude:.4f}, {longitude:.4f}."
+    elif sun_profile_name == "Custom":
+        sun_profile = tuple(float(v) for v in custom_profile.iloc[0].fillna(0))
+    else:
+        sun_profile = sun_hour_catalog[sun_profile_name]
+    if sun_profile is not None and min(sun_profile) <= 0:
+        input_error = "Every month needs more than zero sun hours."
 
-    calculate_btn = st.button(
-        "🚀 Calculate System Requirements", 
-        use_container_width=True,
-        type="primary"
+    # With an input error the appliance fields may be missing; nothing below needs the scenario then
+    scenario = None if input_error else Scenario(
+        power=power,
+        processing_speed=processing_speed,
+        price_usd=price_usd,
+        system=selected_system,
+        runtime_per_day=runtime_per_day,
+        operating_days=operating_days,
+        income_per_kg=income_per_kg,
+        sun_hours=sun_hours,
+        system_efficiency=system_efficiency,
+        battery_hours=battery_hours,
+        daily_operating_cost=daily_operating_cost,
+        loan_term_years=loan_term_years,
+        interest_rate=interest_rate,
+        deposit_percentage=deposit_percentage,
+        install_multiplier=install_multiplier,
+        subsidy_percentage=subsidy_percentage,
+        peak_power=peak_power,
     )
+    if scenario is not None and sun_profile is not None:
+        scenario = monthly_scenario(scenario, sun_profile, *design_month_options[size_for])
+    sun_choice = (sun_profile, size_for) if sun_profile is not None else None
+    chosen = selected_appliance != "Choose one" and selected_system != "Choose one"
+
+    if input_error:
+        st.error(f"⚠️ {input_error}")
+    elif live:
+        if chosen:
+            # Live runs only join the history when saved
+            render_results(make_run(selected_appliance, scenario, selected_currency, sun_choice, site_loads))
+            if st.button("📌 Save to History", use_container_width=True):
+                record_run(selected_appliance, scenario, selected_currency, sun_choice, site_loads)
+                st.toast("Saved to history")
+            show_rate_note(selected_currency)
+        else:
+            st.info("Select an Appliance and System type to see live results.")
 
-    if calculate_btn:
-        if selected_appliance != "Choose one" and selected_system != "Choose one":
+    # The last result stays in the history while the inputs are changed
+    last_run = st.session_state.get("current_run")
+    if not live and last_run is not None and st.button(f"↩ Back to Last Result ({last_run.label})",
+                                                       use_container_width=True):
+        st.session_state.inputs_visible = False
+        st.session_state.calculated = True
+        st.rerun()
+
+    if calculate_btn and input_error is None:
+        if chosen:
             st.session_state.inputs_visible = False
             st.session_state.calculated = True
-            st.session_state.selected_appliance = selected_appliance
-            st.session_state.selected_system = selected_system
-            st.session_state.runtime_per_day = runtime_per_day
-            st.session_state.operating_days = operating_days
-            st.session_state.income_per_kg = income_per_kg
-            st.session_state.sun_hours = sun_hours
-            st.session_state.system_efficiency = system_efficiency
-            st.session_state.battery_hours = battery_hours
-            st.session_state.daily_operating_cost = daily_operating_cost
-            st.session_state.loan_term_years = loan_term_years
-            st.session_state.interest_rate = interest_rate
-            st.session_state.deposit_percentage = deposit_percentage
-            st.session_state.install_multiplier = install_multiplier
-            st.session_state.subsidy_percentage = subsidy_percentage
             st.session_state.selected_currency = selected_currency
-            
-            # Store appliance-specific values
-            if appliance_mode == "Pick from Database":
-                st.session_state.power = power_map[selected_appliance]
-                st.session_state.price_usd = price_map_usd[selected_appliance]
-                st.session_state.processing_speed = processing_speed_map[selected_appliance]
-            else:
-                st.session_state.power = power
-                st.session_state.price_usd = price_usd
-                st.session_state.processing_speed = processing_speed
-                
+            st.session_state.current_run = record_run(
+                selected_appliance, scenario, selected_currency, sun_choice, site_loads
+            )
             st.rerun()
         else:
             st.error("⚠️ Please select both an Appliance and System type before calculating.")
 
-# ... (the rest of the code remains the same)
+# --- RISK SIMULATION ---
+# Label, unit and input step for each input the risk tab can vary
+risk_labels = {
+    "sun_hours": ("Sun Hours", "hrs/day", 0.1),
+    "runtime_per_day": ("Runtime Per Day", "hrs", 0.5),
+    "operating_days": ("Operating Days", "days/year", 1.0),
+    "income_per_kg": ("Income per kg", "USD", 0.001),
+    "daily_operating_cost": ("Daily Operating Cost", "USD", 1.0),
+}
+risk_shapes = {"Triangular": "triangular", "Uniform": "uniform", "Normal": "normal"}
 
-# --- RESULTS SECTION ---
-if not st.session_state.inputs_visible and st.session_state.get("calculated", False):
-    # Get values from session state
-    selected_appliance = st.session_state.selected_appliance
-    selected_system = st.session_state.selected_system
-    runtime_per_day = st.session_state.runtime_per_day
-    operating_days = st.session_state.operating_days
-    income_per_kg = st.session_state.income_per_kg
-    sun_hours = st.session_state.sun_hours
-    system_efficiency = st.session_state.system_efficiency
-    battery_hours = st.session_state.battery_hours
-    daily_operating_cost = st.session_state.daily_operating_cost
-    loan_term_years = st.session_state.loan_term_years
-    interest_rate = st.session_state.interest_rate
-    deposit_percentage = st.session_state.deposit_percentage
-    install_multiplier = st.session_state.install_multiplier
-    subsidy_percentage = st.session_state.subsidy_percentage
-    selected_currency = st.session_state.selected_currency
-    
-    # Get appliance-specific values
-    power = st.session_state.power
-    price_usd = st.session_state.price_usd
-    processing_speed = st.session_state.processing_speed
+@st.cache_data(max_entries=32, show_spinner=False)
+def run_risk(scenario, distributions, samples, seed):
+    # Seeded, so every session asking for the same simulation shares one summary
+    return simulate(scenario, distributions, samples, seed)
 
-    # Get exchange rate but don't convert yet
-    rate = rates.get(selected_currency, 1)
+def render_risk(scenario, rate, selected_currency):
+    st.subheader("Viability Risk")
+    st.caption("Give a low and high estimate for the inputs you are unsure of. "
+               "The calculation is repeated for every random draw between them.")
+    with st.form("risk_form", border=False):
+        shape = st.selectbox(
+            "Distribution",
+            list(risk_shapes),
+            key="risk_shape",
+            help="Triangular and Normal favour your original estimate; Uniform treats the whole range as equally likely"
+        )
+        ranges = {}
+        for name, (label, unit, step) in risk_labels.items():
+            point = float(getattr(scenario, name))
+            low_col, high_col = st.columns(2)
+            # No keys: the defaults follow the scenario when the inputs change
+            low = low_col.number_input(f"{label} low ({unit})", value=round(point * 0.8, 3), step=step)
+            high = high_col.number_input(f"{label} high ({unit})", value=round(point * 1.2, 3), step=step)
+            ranges[name] = (low, high)
+        samples_col, seed_col = st.columns(2)
+        samples = samples_col.select_slider(
+            "Samples", [10_000, 50_000, 100_000, 250_000], value=100_000, key="risk_samples"
+        )
+        seed = seed_col.number_input("Random Seed", min_value=0, value=42, step=1, key="risk_seed",
+                                     help="The same seed always gives the same result")
+        if st.form_submit_button("🎲 Run Simulation", use_container_width=True):
+            distributions = {
+                name: Distribution(risk_shapes[shape], min(low, high), float(getattr(scenario, name)), max(low, high))
+                for name, (low, high) in ranges.items()
+            }
+            st.session_state.risk_request = (scenario, distributions, samples, int(seed))
 
-    # Calculations - all in USD
-    specific_efficiency = processing_speed / power
-    energy_required_per_day = runtime_per_day * power
-    energy_production = energy_required_per_day / (system_efficiency / 100)
-    production_per_day = specific_efficiency * energy_required_per_day
-    income_per_hour = income_per_kg * processing_speed
-    income_per_day = income_per_kg * production_per_day
-    gross_income_per_year = income_per_day * operating_days
-    net_income_per_day = income_per_day - daily_operating_cost
-    panel_energy_per_day = panel_wattage_kw * sun_hours 
-    panels_required = math.ceil(energy_production / panel_energy_per_day)
-    solar_panel_cost = panels_required * panel_cost  # USD
-    recommended_solar_size = math.ceil((energy_production / sun_hours) * 2) / 2
-    battery_capacity = recommended_solar_size * battery_hours
-
-    # Initialize both costs to 0 in USD
-    inverter_cost = 0
-    controller_cost = 0
-
-    if selected_system == "AC":
-        inverter_cost = recommended_solar_size * 100   # USD
-    elif selected_system == "DC":
-        controller_cost = recommended_solar_size * 50  # USD
-        
-    # Battery cost in USD
-    battery_cost = battery_capacity * 300  # USD
+    request = st.session_state.get("risk_request")
+    if request is None or request[0] != scenario:
+        st.info("Set the ranges above and run the simulation to see how likely the business is to be viable.")
+        return
 
-    # Cost calculations in USD
-    fob_subtotal_usd = price_usd + solar_panel_cost + inverter_cost + controller_cost + battery_cost
-    total_with_import_usd = fob_subtotal_usd * install_multiplier
-    
-    # Apply subsidy
-    subsidy_amount = total_with_import_usd * (subsidy_percentage / 100)
-    total_after_subsidy = total_with_import_usd - subsidy_amount
-    
-    # Calculate deposit amount based on percentage
-    deposit_amount = total_after_subsidy * (deposit_percentage / 100)
-    loan_principal_usd = total_after_subsidy - deposit_amount
+    _, distributions, samples, seed = request
+    summary = run_risk(scenario, distributions, samples, seed)
+    p5, p25, p50, p75, p95 = (value * rate for value in summary.surplus_percentiles)
+    median_payback = summary.payback_percentiles[percentiles.index(50)]
+    st.markdown("---")
+    metric_grid([
+        ("Probability Viable", f"{round(summary.probability_viable * 100, 1)}", "%",
+         "Share of draws where net income covers the loan repayments"),
+        ("Median Daily Surplus", f"{round(p50, 1)}", selected_currency),
+        ("Daily Surplus P5 - P95", f"{round(p5, 1)} to {round(p95, 1)}", selected_currency,
+         "Nine in ten draws fall inside this band"),
+        ("Median Payback", f"{round(median_payback, 1)}" if summary.probability_payback else "n/a", "years",
+         "Over the draws that pay back"),
+    ], columns=4)
 
-    # Loan calculations in USD
-    months = loan_term_years * 12
-    monthly_rate = interest_rate / 12
+    st.subheader("Percentile Bands")
+    st.dataframe(
+        pd.DataFrame({
+            "Percentile": [f"P{p}" for p in percentiles],
+            f"Daily Surplus ({selected_currency})": [round(value * rate, 1) for value in summary.surplus_percentiles],
+            "Payback (years)": [round(value, 1) for value in summary.payback_percentiles],
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
 
-    if monthly_rate > 0 and loan_principal_usd > 0:
-        monthly_repayment_usd = (loan_principal_usd * monthly_rate) / (1 - (1 + monthly_rate)**(-months))
-    else:
-        monthly_repayment_usd = 0
+    if summary.payback_counts:
+        st.subheader("Payback Distribution")
+        edges = summary.payback_edges
+        st.bar_chart(
+            pd.DataFrame({
+                "Payback (years)": [round((a + b) / 2, 2) for a, b in zip(edges, edges[1:])],
+                "Draws": summary.payback_counts,
+            }),
+            x="Payback (years)",
+            y="Draws"
+        )
+    st.caption(f"{summary.samples:,} samples, seed {summary.seed}. "
+               f"{round(summary.probability_payback * 100, 1)}% of draws pay back the investment.")
 
-    total_repayment_usd = months * monthly_repayment_usd
-    total_interest_paid_usd = total_repayment_usd - loan_principal_usd
-    annual_repayment_usd = monthly_repayment_usd * 12
-    daily_repayment_usd = annual_repayment_usd / 365
+# --- SENSITIVITY ---
+sensitivity_labels = {
+    "sun_hours": "Sun Hours",
+    "system_efficiency": "System Efficiency",
+    "battery_hours": "Battery Storage",
+    "runtime_per_day": "Runtime Per Day",
+    "operating_days": "Operating Days",
+    "income_per_kg": "Income per kg",
+    "daily_operating_cost": "Daily Operating Cost",
+    "interest_rate": "Interest Rate",
+    "loan_term_years": "Loan Term",
+    "deposit_percentage": "Deposit",
+    "subsidy_percentage": "Subsidy",
+    "install_multiplier": "Import & Installation",
+}
+output_labels = {
+    "daily_surplus": "Daily Surplus",
+    "net_revenue_repayment_percentage": "% of Net Revenue",
+    "payback_years": "Payback Period",
+}
+
+def setting_text(name, value):
+    # Input values as the expander shows them
+    if name == "interest_rate":
+        return f"{value * 100:.1f}%"
+    if name == "install_multiplier":
+        return f"{(value - 1) * 100:.0f}%"
+    if name in ("system_efficiency", "deposit_percentage", "subsidy_percentage"):
+        return f"{value:.0f}%"
+    return f"{value:g}"
+
+def render_sensitivity(scenario, rate, selected_currency):
+    st.subheader("Sensitivity Analysis")
+    col1, col2 = st.columns(2)
+    with col1:
+        step_pct = st.slider("Change Each Input by ± (%)", min_value=1, max_value=50, value=10, key="sensitivity_step")
+    with col2:
+        output = st.radio(
+            "Show the Effect On",
+            list(output_labels),
+            format_func=output_labels.get,
+            horizontal=True,
+            key="sensitivity_output"
+        )
 
-    if income_per_day > 0:
-        repayment_percentage = (daily_repayment_usd / income_per_day) * 100
+    # One batched evaluation per base scenario and step, cached
+    analysis = sensitivity(scenario, step_pct / 100)
+    i = outputs.index(output)
+    scale = rate if output == "daily_surplus" else 1
+    unit = {"daily_surplus": selected_currency, "net_revenue_repayment_percentage": "%"}.get(output, "years")
+    base = analysis.base[i] * scale
+    if pd.isna(base):
+        st.info("Payback is not available for your inputs because the business is not viable. "
+                "Choose another output to see what moves viability.")
+        return
+
+    rows = []
+    for swing in analysis.swings:
+        for direction, setting, values in (("Input down", swing.low_input, swing.low),
+                                           ("Input up", swing.high_input, swing.high)):
+            rows.append({
+                "Input": sensitivity_labels[swing.input],
+                "Direction": direction,
+                "Setting": setting_text(swing.input, setting),
+                "Value": values[i] * scale,
+                "Change": values[i] * scale - base,
+            })
+    df = pd.DataFrame(rows)
+    order = df.assign(swing=df["Change"].abs()).groupby("Input", sort=False)["swing"].max().sort_values(ascending=False)
+
+    chart = alt.Chart(df.dropna()).mark_bar(opacity=0.85).encode(
+        x=alt.X("Change:Q", stack=None, title=f"Change in {output_labels[output]} ({unit})"),
+        y=alt.Y("Input:N", sort=list(order.index), title=None),
+        color=alt.Color("Direction:N", scale=alt.Scale(domain=["Input down", "Input up"], range=["#e74c3c", "#4CAF50"])),
+        tooltip=["Input", "Direction", "Setting", alt.Tooltip("Value:Q", format=",.2f")],
+    )
+    st.altair_chart(chart, use_container_width=True)
+    st.caption(
+        f"Each bar moves one input by ±{step_pct}% with the others at your values "
+        f"(deposit and subsidy by ±{step_pct} percentage points). "
+        f"Base {output_labels[output]}: {round(base, 1)} {unit}."
+        + (" Missing bars mean the business stops being viable." if df["Value"].isna().any() else "")
+    )
+
+# --- FINANCING HEATMAPS ---
+heatmap_metrics = {"Daily Surplus": "daily_surplus", "Payback Period": "payback_years", "Viable?": "viable_business"}
+
+def financing_heatmap(grid, metric, x_title, y_title, x_scale, y_scale, marker, rate, selected_currency):
+    # One rect per grid cell, plus a cross at the current inputs
+    x = grid.x_values * x_scale
+    y = grid.y_values * y_scale
+    dx = x[1] - x[0] if len(x) > 1 else 1
+    dy = y[1] - y[0] if len(y) > 1 else 1
+    cx, cy = (a.ravel() for a in np.meshgrid(x, y))
+    values = getattr(grid, heatmap_metrics[metric]).ravel()
+    df = pd.DataFrame({"x": cx - dx / 2, "x2": cx + dx / 2, "y": cy - dy / 2, "y2": cy + dy / 2,
+                       x_title: cx.round(2), y_title: cy.round(2)})
+
+    if metric == "Daily Surplus":
+        df[metric] = (values * rate).round(2)
+        color = alt.Color(f"{metric}:Q", title=selected_currency,
+                          scale=alt.Scale(scheme="redyellowgreen", domainMid=0))
+    elif metric == "Payback Period":
+        df[metric] = values.round(2)
+        df = df.dropna()
+        color = alt.Color(f"{metric}:Q", title="years", scale=alt.Scale(scheme="viridis", reverse=True))
     else:
-        repayment_percentage = 0
-    
-    # New metric: % of Daily Net Revenue Used for Repayment
-    if net_income_per_day > 0:
-        net_revenue_repayment_percentage = (daily_repayment_usd / net_income_per_day) * 100
+        df[metric] = np.where(values, "Yes", "No")
+        color = alt.Color(f"{metric}:N", title="Viable", scale=alt.Scale(domain=["Yes", "No"], range=["#4CAF50", "#f44336"]))
+
+    cells = alt.Chart(df).mark_rect().encode(
+        x=alt.X("x:Q", title=x_title, scale=alt.Scale(domain=[x[0] - dx / 2, x[-1] + dx / 2], nice=False)),
+        x2="x2",
+        y=alt.Y("y:Q", title=y_title, scale=alt.Scale(domain=[y[0] - dy / 2, y[-1] + dy / 2], nice=False)),
+        y2="y2",
+        color=color,
+        tooltip=[x_title, y_title, metric],
+    )
+    current = alt.Chart(pd.DataFrame({"x": [marker[0]], "y": [marker[1]]})).mark_point(
+        shape="cross", size=200, color="black", filled=True
+    ).encode(x="x:Q", y="y:Q")
+    st.altair_chart(cells + current, use_container_width=True)
+
+def render_financing(scenario, rate, selected_currency):
+    st.subheader("Financing Options")
+    col1, col2 = st.columns(2)
+    with col1:
+        metric = st.radio("Show", list(heatmap_metrics), horizontal=True, key="heatmap_metric")
+    with col2:
+        cells = st.select_slider("Grid Resolution (cells per axis)", [25, 50, 100], value=50, key="heatmap_cells")
+
+    # Sizing and costs are worked out once; only the loan and viability formulas run per cell
+    term_grid = financing_grid(scenario, "loan_term_years", np.linspace(1, 10, cells),
+                               "interest_rate", np.linspace(0, 0.3, cells))
+    equity_grid = financing_grid(scenario, "deposit_percentage", np.linspace(0, 100, cells),
+                                 "subsidy_percentage", np.linspace(0, 100, cells))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown('<div class="section-title">Loan Term × Interest Rate</div>', unsafe_allow_html=True)
+        financing_heatmap(term_grid, metric, "Loan Term (years)", "Interest Rate (%)", 1, 100,
+                          (scenario.loan_term_years, scenario.interest_rate * 100), rate, selected_currency)
+    with col2:
+        st.markdown('<div class="section-title">Deposit × Subsidy</div>', unsafe_allow_html=True)
+        financing_heatmap(equity_grid, metric, "Deposit (%)", "Subsidy (%)", 1, 1,
+                          (scenario.deposit_percentage, scenario.subsidy_percentage), rate, selected_currency)
+
+    caption = "The cross marks your current inputs. Loan terms are rounded to whole months."
+    if metric == "Payback Period":
+        caption += " Blank cells are not viable."
+    st.caption(caption)
+
+# --- OPTIMIZER ---
+optimizer_objectives = {"Lowest Cost": "cost", "Fastest Payback": "payback"}
+
+def apply_configuration(run, best):
+    # The optimized configuration becomes a new run and is shown; the run it came from stays in the history
+    st.session_state.current_run = record_run(run.label, best, run.currency, run.sun_profile, run.site_loads)
+    st.session_state.inputs_visible = False
+    st.session_state.calculated = True
+
+def render_optimizer(scenario, rate, selected_currency, run):
+    st.subheader("Find a Viable Configuration")
+    st.caption("Searches runtime, battery storage, loan term, deposit and system type within your limits, "
+               "keeping the machine, prices and other inputs as entered.")
+    with st.form("optimizer_form", border=False):
+        objective = st.radio("Goal", list(optimizer_objectives), horizontal=True, key="optimizer_objective")
+        col1, col2 = st.columns(2)
+        with col1:
+            runtime = st.slider("Runtime Per Day (hrs)", 1.0, 24.0, (1.0, 24.0), step=0.5, key="optimizer_runtime")
+            battery = st.slider("Battery Storage (hrs)", 0, 24, (int(scenario.battery_hours), 24),
+                                help="More storage only adds cost, so the lowest value is used")
+            systems = st.multiselect("System Type", ["AC", "DC"], default=["AC", "DC"], key="optimizer_systems")
+        with col2:
+            term = st.slider("Loan Term (Years)", 1, 10, (1, 10), key="optimizer_term")
+            deposit = st.slider("Deposit (% of total cost)", 0, 100, (0, 100), step=5, key="optimizer_deposit")
+        if st.form_submit_button("🎯 Find Best Configuration", use_container_width=True):
+            if systems:
+                bounds = Bounds(runtime, battery, term, deposit, tuple(systems))
+                st.session_state.optimizer_request = (scenario, optimizer_objectives[objective], bounds)
+            else:
+                st.error("⚠️ Please select at least one system type.")
+
+    request = st.session_state.get("optimizer_request")
+    if request is None or request[0] != scenario:
+        return
+    search = optimize(*request)
+    st.markdown("---")
+    if search.best is None:
+        st.warning("No configuration within these limits is viable. Try a longer runtime, a longer loan term "
+                   "or a larger deposit.")
     else:
-        net_revenue_repayment_percentage = 0
-    
-    # Business viability - fixed logic
-    # Business is viable if no loan is needed (deposit is 100%) OR net income covers repayments
-    if deposit_percentage == 100 or (net_income_per_day > 0 and daily_repayment_usd > 0 and net_income_per_day >= daily_repayment_usd):
-        viable_business = True
-        viability_text = "Yes ✅" 
+        best, result = search.best, search.result
+        metric_grid([
+            ("System Type", best.system, ""),
+            ("Runtime Per Day", f"{best.runtime_per_day}", "hours"),
+            ("Battery Storage", f"{best.battery_hours}", "hours"),
+            ("Loan Term", f"{best.loan_term_years}", "years"),
+            ("Deposit", f"{best.deposit_percentage:g}", "%"),
+        ], columns=5)
+        metric_grid([
+            ("Total After Subsidy", f"{round(result.total_after_subsidy * rate, 1)}", selected_currency),
+            ("Payback Period", f"{round(result.payback_years, 1)}", "years"),
+            ("Daily Surplus", f"{round(result.daily_surplus * rate, 1)}", selected_currency),
+        ], columns=3)
+        if st.button("Use This Configuration", key="optimizer_apply"):
+            apply_configuration(run, best)
+            st.rerun()
+    st.caption(f"Evaluated {search.evaluations:,} of {search.combinations:,} combinations "
+               f"in {search.seconds * 1000:.1f} ms.")
+
+# --- AMORTIZATION SCHEDULE ---
+def render_schedule(scenario, result, rate, selected_currency):
+    st.subheader("Amortization Schedule")
+    if result.loan_principal_usd <= 0:
+        st.info("There is no loan to repay: the deposit and subsidy cover the full cost.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        grace_months = st.number_input("Grace Period (months)", min_value=0, max_value=result.months - 1, value=0,
+                                       key="schedule_grace", help="Months at the start before repayments begin")
+        capitalize = st.radio("During the Grace Period", ["Pay interest only", "Add interest to the loan"],
+                              key="schedule_grace_type") == "Add interest to the loan"
+    with col2:
+        start_month = st.selectbox("First Repayment Month", range(1, 13), format_func=lambda m: month_names[m - 1],
+                                   key="schedule_start_month")
+        seasonal = st.toggle("Seasonal repayments", key="schedule_seasonal",
+                             help="Pay more in the months the mill earns more")
+    with col3:
+        page_size = st.select_slider("Rows per Page", [12, 24, 60, 120], value=12, key="schedule_page_size")
+
+    weights = None
+    if seasonal:
+        st.caption("Relative repayment size for each month (1 = average):")
+        edited = st.data_editor(
+            pd.DataFrame([[1.0] * 12], columns=month_names),
+            hide_index=True,
+            use_container_width=True,
+            key="schedule_weights"
+        )
+        weights = edited.iloc[0].fillna(0).clip(lower=0).tolist()
+
+    try:
+        schedule = amortization_schedule(result.loan_principal_usd, scenario.interest_rate, result.months,
+                                         grace_months, capitalize, weights, start_month)
+    except ValueError as e:
+        st.error(f"⚠️ {e}")
+        return
+
+    metric_grid([
+        ("Repayment (weight 1)" if seasonal else "Monthly Repayment", f"{round(schedule.level_payment * rate, 1)}",
+         selected_currency),
+        ("Total Repaid", f"{round(schedule.payment.sum() * rate, 1)}", selected_currency),
+        ("Total Interest", f"{round(schedule.interest.sum() * rate, 1)}", selected_currency),
+    ], columns=3)
+    if grace_months == 0 and not seasonal and scenario.interest_rate > 0:
+        if abs(schedule.level_payment - result.monthly_repayment_usd) <= 1e-9 * result.monthly_repayment_usd:
+            st.caption("✓ Matches the monthly repayment on the Financials tab.")
+        else:
+            st.warning("Schedule payment differs from the monthly repayment on the Financials tab.")
+
+    st.line_chart(pd.DataFrame({"Month": schedule.month, f"Balance ({selected_currency})": schedule.balance * rate}),
+                  x="Month", height=220)
+
+    # Only the rows on the current page go to the browser
+    pages = -(-len(schedule.month) // page_size)
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="schedule_page")
+    rows = slice((page - 1) * page_size, page * page_size)
+    st.dataframe(
+        pd.DataFrame({
+            "Month": schedule.month[rows],
+            "Calendar Month": [month_names[m - 1] for m in schedule.calendar_month[rows]],
+            f"Payment ({selected_currency})": (schedule.payment[rows] * rate).round(2),
+            f"Interest ({selected_currency})": (schedule.interest[rows] * rate).round(2),
+            f"Principal ({selected_currency})": (schedule.principal[rows] * rate).round(2),
+            f"Balance ({selected_currency})": (schedule.balance[rows] * rate).round(2),
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+# --- HOURLY DISPATCH ---
+@st.cache_data(max_entries=32, show_spinner=False)
+def run_dispatch(scenario, result, start_hour, variability, depth_of_discharge, round_trip_efficiency,
+                 monthly_sun_hours, site_loads=None):
+    # One site with hourly flows kept for the charts; the weather is seeded, so sessions can share it
+    load_profile = None
+    if site_loads:
+        arrays = load_arrays(site_loads)
+        load_profile = daily_load(arrays["start_hour"], arrays["runtime_per_day"], arrays["power"])
+    return dispatch_scenario(scenario, result, start_hour=start_hour, variability=variability,
+                             depth_of_discharge=depth_of_discharge, round_trip_efficiency=round_trip_efficiency,
+                             hourly=True, monthly_sun_hours=monthly_sun_hours, load_profile=load_profile)
+
+def render_dispatch(scenario, result, monthly_sun_hours=None, site_loads=None):
+    st.subheader("Hour-by-Hour Operation")
+    st.caption("Simulates every hour of a year: solar output, the machine running in its operating window and "
+               "the battery charging and discharging in between.")
+    col1, col2 = st.columns(2)
+    with col1:
+        if site_loads:
+            start_hour = 8
+            st.caption("Each appliance runs from its own start hour.")
+        else:
+            start_hour = st.slider("Machine Starts At (hour of day)", 0, 23, 8, key="dispatch_start_hour")
+        variability = st.slider("Day-to-Day Sunshine Variation (%)", 0, 60, 30, step=5, key="dispatch_variability",
+                                help="How much cloudy and clear days differ from the average sun hours")
+    with col2:
+        depth_of_discharge = st.slider("Usable Battery Capacity (%)", 50, 100, 80, step=5,
+                                       key="dispatch_depth_of_discharge",
+                                       help="Depth of discharge: how much of the battery can be drawn")
+        round_trip_efficiency = st.slider("Battery Round-Trip Efficiency (%)", 70, 100, 90,
+                                          key="dispatch_round_trip_efficiency")
+
+    year = run_dispatch(scenario, result, start_hour, variability / 100, depth_of_discharge / 100,
+                        round_trip_efficiency / 100, monthly_sun_hours, site_loads)
+    hourly = year.hourly
+    unmet_hours = int(year.unmet_hours[0])
+    required = float(year.required_battery_kwh[0])
+    metric_grid([
+        ("Unmet Load Hours", f"{unmet_hours:,}", f"of {int(year.operating_hours[0]):,} hrs",
+         "Operating hours when solar and battery could not cover the machine in full"),
+        ("Load Served", f"{round(float(year.load_served_pct[0]), 1)}", "%"),
+        ("Curtailed Solar", f"{round(float(year.curtailed_kwh[0]), 1)}", "kWh/year",
+         "Solar output with nowhere to go because the battery was full"),
+        ("Battery Needed", f"{round(required, 1)}", "kWh",
+         f"Nameplate capacity that would have met every hour. Sized battery: {result.battery_capacity} kWh"),
+    ], columns=4)
+    if unmet_hours == 0:
+        st.success("✓ The sized system runs the machine in every scheduled hour.")
+    elif result.recommended_solar_size > 0:
+        st.warning(f"The machine falls short in {unmet_hours:,} hours. A battery of about {round(required, 1)} kWh "
+                   f"({round(required / result.recommended_solar_size, 1)} battery hours) would cover them.")
+
+    st.markdown("---")
+    st.subheader("A Week of Operation")
+    week = st.slider("Week of the Year", 1, 52, 1, key="dispatch_week")
+    hours = slice((week - 1) * 168, week * 168)
+    st.line_chart(
+        pd.DataFrame({
+            "Hour": np.arange(hours.start, hours.stop) - hours.start,
+            "Solar (kWh)": hourly.pv[hours, 0],
+            "Machine (kWh)": hourly.load[hours, 0],
+            "Battery Charge (kWh)": hourly.soc[hours, 0],
+        }),
+        x="Hour",
+        height=260
+    )
+
+    st.subheader("Unmet Load by Month")
+    # Month of every hour
+    month = day_month[np.arange(len(hourly.unmet)) // 24]
+    unmet_by_month = np.bincount(month, weights=hourly.unmet[:, 0], minlength=12)
+    st.bar_chart(pd.DataFrame({"Month": month_names, "Unmet Load (kWh)": unmet_by_month.round(1)}),
+                 x="Month", y="Unmet Load (kWh)", sort=False)
+    st.caption("The battery starts the year full. Solar output follows the sun between 6am and 6pm"
+               f"{' with your monthly sun hours' if monthly_sun_hours else ''}, and operating days are spread "
+               "evenly through the year.")
+
+# --- MONTHLY SUN HOURS ---
+def render_monthly(scenario, result, sun_profile, rate, selected_currency):
+    st.subheader("Month by Month")
+    if sun_profile is None:
+        st.info("Choose a monthly sun-hour profile in the inputs to size for the rainy season and see "
+                "production and income month by month.")
+        return
+
+    profile, size_for = sun_profile
+    monthly = evaluate_monthly(scenario._asdict(), profile, *design_month_options[size_for])
+    share = monthly["monthly_runtime_share"][0]
+    short = int((share < 1).sum())
+    metric_grid([
+        ("Design Sun Hours", f"{round(float(monthly['design_sun_hours'][0]), 2)}", "hrs/day",
+         f"Sun hours the panels are sized for: {size_for.lower()}"),
+        ("Months Short", f"{short}", "of 12", "Months when the panels cannot run the machine for the full runtime"),
+        ("Annual Net Profit", f"{round(float(monthly['annual_net_profit'][0]) * rate, 1)}", selected_currency,
+         "Sum of the monthly net income"),
+        ("Payback Period", f"{round(float(monthly['payback_years'][0]), 1)}"
+         if np.isfinite(monthly["payback_years"][0]) else "n/a", "years"),
+    ], columns=4)
+
+    st.dataframe(
+        pd.DataFrame({
+            "Month": month_names,
+            "Sun Hours": monthly["monthly_sun_hours"][0],
+            "Panels Needed": monthly["monthly_panels_required"][0],
+            "Runtime Covered (%)": (share * 100).round(1),
+            "Production (kg)": monthly["monthly_production_kg"][0].round(0),
+            f"Income ({selected_currency})": (monthly["monthly_income"][0] * rate).round(1),
+            f"Net Income ({selected_currency})": (monthly["monthly_net_income"][0] * rate).round(1),
+            f"After Repayment ({selected_currency})": (monthly["monthly_surplus"][0] * rate).round(1),
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+    st.bar_chart(
+        pd.DataFrame({"Month": month_names,
+                      f"After Repayment ({selected_currency})": (monthly["monthly_surplus"][0] * rate).round(1)}),
+        x="Month",
+        sort=False
+    )
+    st.caption(f"The system has {result.panels_required} panels. Operating days are spread over the months by "
+               "their length. The other tabs use the same yearly income: the array covers "
+               f"{round(float(monthly['runtime_share'][0]) * 100, 1)}% of the runtime over the year.")
+
+# --- COMPONENT SELECTION ---
+component_objectives = {"Lowest Upfront Cost": "cost", f"Best Value Over {value_horizon_years} Years": "value"}
+
+def render_components(scenario, result, rate, selected_currency):
+    st.subheader("Bill of Materials")
+    catalog = get_components()
+    converter = "Inverter" if scenario.system == "AC" else "Controller"
+    col1, col2 = st.columns(2)
+    with col1:
+        goal = st.radio("Rank By", list(component_objectives), horizontal=True, key="components_objective",
+                        help="Best value counts replacements, so longer-lasting parts can win")
+    with col2:
+        top = st.slider("Options Shown", 1, 25, 10, key="components_top")
+    bills = select_components(scenario, catalog, component_objectives[goal], top)
+    if not bills:
+        st.warning(f"No combination of catalog parts fits this system. Check the panel, battery and "
+                   f"{converter.lower()} unit limits and voltages.")
+        return
+
+    results = [evaluate_bill(scenario, bill) for bill in bills]
+    flat_equipment = result.solar_panel_cost + result.inverter_cost + result.controller_cost + result.battery_cost
+    metric_grid([
+        ("Equipment Cost", f"{round(bills[0].equipment_cost * rate, 1)}", selected_currency,
+         f"Panels, batteries and {converter.lower()}s of the top option, before import and installation"),
+        ("Flat-Rate Estimate", f"{round(flat_equipment * rate, 1)}", selected_currency,
+         "The same equipment at the calculator's flat prices"),
+        ("Total After Subsidy", f"{round(results[0].total_after_subsidy * rate, 1)}", selected_currency),
+        ("Payback Period", f"{round(results[0].payback_years, 1)}" if results[0].payback_years else "n/a", "years"),
+    ], columns=4)
+    st.dataframe(
+        pd.DataFrame({
+            "Panels": [f"{bill.panels} × {bill.panel}" for bill in bills],
+            "Array (kWp)": [round(bill.array_kw, 2) for bill in bills],
+            "Batteries": [f"{bill.batteries} × {bill.battery}" if bill.batteries else "None" for bill in bills],
+            "Usable Storage (kWh)": [round(bill.storage_kwh, 2) for bill in bills],
+            f"{converter}s": [f"{bill.converters} × {bill.converter}" if bill.converters else "None"
+                              for bill in bills],
+            f"Equipment ({selected_currency})": [round(bill.equipment_cost * rate, 1) for bill in bills],
+            f"Per Year ({selected_currency})": [round(bill.annual_cost * rate, 1) for bill in bills],
+            f"Total After Subsidy ({selected_currency})": [round(r.total_after_subsidy * rate, 1) for r in results],
+            "Viable": ["Yes" if r.viable_business else "No" for r in results],
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption(f"Every panel × battery × {converter.lower()} combination in the {len(catalog)}-part catalog is "
+               f"sized for this system and ranked. Per Year spreads each part's price, and its replacements, over "
+               f"{value_horizon_years} years. Batteries are sized for {round(result.battery_capacity, 2)} kWh usable.")
+
+# --- LIFETIME CASH FLOW ---
+@st.cache_data(max_entries=32, show_spinner=False)
+def run_lifetime(scenario, years, discount_rate, degradation, inflation, battery_life_years):
+    return evaluate_lifetime(columns_from_scenarios([scenario]), years=years, discount_rate=discount_rate,
+                             degradation=degradation, inflation=inflation, battery_life_years=battery_life_years)
+
+def render_lifetime(scenario, rate, selected_currency):
+    st.subheader("Lifetime Cash Flow")
+    st.caption("Projects every year of the system's life: panels losing output, income and costs rising with "
+               "inflation, batteries and the inverter or controller bought again as they wear out, and the loan "
+               "repaid month by month.")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        years = st.slider("Lifetime (years)", 10, 25, 20, key="lifetime_years")
+        discount_rate = st.number_input("Discount Rate (%)", min_value=0.0, max_value=50.0, value=10.0, step=0.5,
+                                        key="lifetime_discount_rate",
+                                        help="The return the money could earn elsewhere")
+    with col2:
+        degradation = st.number_input("Panel Degradation (%/year)", min_value=0.0, max_value=5.0, value=0.5,
+                                      step=0.1, key="lifetime_degradation")
+        inflation = st.number_input("Inflation (%/year)", min_value=0.0, max_value=50.0, value=5.0, step=0.5,
+                                    key="lifetime_inflation", help="Applied to income, operating costs and replacements")
+    with col3:
+        battery_life_years = st.slider("Battery Life (years)", 2, 15, 5, key="lifetime_battery_life")
+
+    out = run_lifetime(scenario, years, discount_rate / 100, degradation / 100, inflation / 100, battery_life_years)
+    irr = out["irr"][0]
+    equity_irr = out["equity_irr"][0]
+    payback = out["discounted_payback_years"][0]
+    metric_grid([
+        ("Net Present Value", f"{round(out['npv'][0] * rate, 1)}", selected_currency,
+         f"All the project's cash flows discounted at {discount_rate}%; above zero beats that return"),
+        ("Internal Rate of Return", f"{round(irr * 100, 1)}" if np.isfinite(irr) else "n/a", "%",
+         "The discount rate at which the net present value is zero"),
+        ("Discounted Payback", f"{round(payback, 1)}" if np.isfinite(payback) else "n/a", "years",
+         "Years until the discounted cash flows cover the cost"),
+        ("Owner's Return", f"{round(equity_irr * 100, 1)}" if np.isfinite(equity_irr) else "n/a", "%",
+         "Return on the deposit after the loan repayments; n/a with no deposit"),
+    ], columns=4)
+
+    project = out["project_cash_flows"][0] * rate
+    equity = out["equity_cash_flows"][0] * rate
+    st.line_chart(
+        pd.DataFrame({
+            "Year": np.arange(years + 1),
+            f"Project ({selected_currency})": np.cumsum(project).round(1),
+            f"Owner ({selected_currency})": np.cumsum(equity).round(1),
+        }),
+        x="Year",
+        height=260
+    )
+    with st.expander("Yearly cash flows"):
+        st.dataframe(
+            pd.DataFrame({
+                "Year": np.arange(years + 1),
+                f"Project ({selected_currency})": project.round(1),
+                f"Owner ({selected_currency})": equity.round(1),
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+    st.caption(f"Cumulative cash, undiscounted. The project pays the whole cost up front; the owner pays the "
+               f"deposit and then the loan. IRR found in {int(out['irr_iterations'][0])} steps.")
+
+# --- SCENARIO HISTORY ---
+# Rows of the comparison table: label, result key and whether it is money
+comparison_rows = [
+    ("Solar Size (kWp)", "recommended_solar_size", False),
+    ("Battery (kWh)", "battery_capacity", False),
+    ("Total After Subsidy", "total_after_subsidy", True),
+    ("Monthly Repayment", "monthly_repayment_usd", True),
+    ("Daily Net Income", "net_income_per_day", True),
+    ("Daily Surplus", "daily_surplus", True),
+    ("Repayment Share (%)", "net_revenue_repayment_percentage", False),
+    ("Payback (years)", "payback_years", False),
+]
+
+def record_run(label, scenario, currency, sun_profile=None, site_loads=None):
+    # Adds the run to the session history and, the first time, to the local scenario store
+    run = st.session_state.history.add(label, scenario, currency, sun_profile, site_loads)
+    if run.id > st.session_state.get("stored_run_id", 0):
+        st.session_state.stored_run_id = run.id
+        try:
+            get_store().add_scenarios([label], [scenario], currency=currency, rate=rates.get(currency, 1))
+        except (OSError, sqlite3.Error) as e:
+            st.toast(f"⚠️ Could not save to the scenario store: {e}")
+    return run
+
+def run_name(run):
+    return f"#{run.id} {run.label}" if run.id else f"{run.label} (unsaved)"
+
+def update_pins():
+    history = st.session_state.history
+    pins = st.session_state.history_pins
+    for run in history.pinned():
+        if run.id not in pins:
+            history.unpin(run.id)
+    for run_id in pins:
+        try:
+            history.pin(run_id)
+        except ValueError as e:
+            st.toast(f"⚠️ {e}")
+
+def render_history(run, rate):
+    history = st.session_state.history
+    st.subheader("Compare Runs")
+    runs = history.runs()
+    if not runs:
+        st.info("Calculated runs are kept here. Save live results to the history to compare them.")
+        return
+
+    st.dataframe(
+        pd.DataFrame({
+            "Run": [run_name(r) for r in runs],
+            "Time": [datetime.fromtimestamp(r.created).strftime("%H:%M:%S") for r in runs],
+            "System": [r.scenario.system for r in runs],
+            "Solar (kWp)": [r.headline.recommended_solar_size for r in runs],
+            f"Total After Subsidy ({run.currency})": [round(r.headline.total_after_subsidy * rate, 1) for r in runs],
+            f"Daily Surplus ({run.currency})": [round(r.headline.daily_surplus * rate, 1) for r in runs],
+            "Payback (years)": [round(r.headline.payback_years, 1) if r.headline.payback_years is not None else None
+                                for r in runs],
+            "Pinned": [history.is_pinned(r.id) for r in runs],
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+    by_id = {r.id: r for r in runs}
+    # The history holds the pins; the widget is reset to them on every run
+    st.session_state.history_pins = [r.id for r in history.pinned()]
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.multiselect(
+            "Pinned Runs",
+            list(by_id),
+            format_func=lambda run_id: run_name(by_id[run_id]),
+            max_selections=max_pinned,
+            key="history_pins",
+            on_change=update_pins,
+            help="Pinned runs stay until unpinned; the others drop out oldest first"
+        )
+    with col2:
+        open_id = st.selectbox("Run", list(by_id), format_func=lambda run_id: run_name(by_id[run_id]),
+                               key="history_open")
+        if st.button("Show This Run", use_container_width=True):
+            st.session_state.current_run = by_id[open_id]
+            st.session_state.inputs_visible = False
+            st.session_state.calculated = True
+            st.rerun()
+
+    # The shown run and every pinned one, evaluated together
+    compared = [run] + [r for r in history.pinned() if r.id != run.id]
+    out = compare(compared)
+    table = {"": ["System", "Runtime (hrs)", "Battery Storage (hrs)", "Loan Term (years)", "Deposit (%)"]
+             + [f"{label} ({run.currency})" if money else label for label, _, money in comparison_rows]}
+    for i, r in enumerate(compared):
+        inputs = r.scenario
+        values = [inputs.system, round(inputs.runtime_per_day, 2), inputs.battery_hours, inputs.loan_term_years,
+                  inputs.deposit_percentage]
+        for _, key, money in comparison_rows:
+            value = float(out[key][i]) * (rate if money else 1)
+            values.append(round(value, 1) if np.isfinite(value) else "n/a")
+        table[run_name(r) + (" (shown)" if r is run else "")] = [str(v) for v in values]
+    st.dataframe(pd.DataFrame(table), hide_index=True, use_container_width=True)
+    st.caption(f"The shown run and the pinned ones, in {run.currency} at today's rate. Besides the pinned runs "
+               f"the last {max_runs} are kept.")
+
+# --- RESULTS SECTION ---
+def render_results(run):
+    selected_appliance, scenario, selected_currency = run.label, run.scenario, run.currency
+    sun_profile, site_loads = run.sun_profile, run.site_loads
+    (power, processing_speed, price_usd, selected_system, runtime_per_day, operating_days,
+     income_per_kg, sun_hours, system_efficiency, battery_hours, daily_operating_cost,
+     loan_term_years, interest_rate, deposit_percentage, install_multiplier,
+     subsidy_percentage, peak_power, runtime_share) = scenario
+    if site_loads:
+        # A site's equivalent load is rarely a round number; show it rounded
+        power, processing_speed, runtime_per_day = round(power, 2), round(processing_speed, 1), round(runtime_per_day, 2)
+
+    # Get exchange rate but don't convert yet
+    rate = rates.get(selected_currency, 1)
+
+    # Calculations - all in USD; only nodes whose inputs changed are redone.
+    # money holds the display-currency values.
+    if "result_graph" not in st.session_state:
+        st.session_state.result_graph = ResultGraph()
+    result, money = st.session_state.result_graph.update(scenario, rate)
+    if result.viable_business:
+        viability_text = "Yes ✅"
         viability_class = "success-box"
     else:
-        viable_business = False
         viability_text = "No ❌"
         viability_class = "error-box"
 
-    # Display results in tabs
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "💵 Financials", "⚡ Technical", "📈 Viability"])
+    # Display results in tabs; only the open tab is built on each rerun
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11, tab12, tab13, tab14 = st.tabs(
+        ["📊 Overview", "💵 Financials", "⚡ Technical", "📈 Viability", "🎲 Risk", "🌪️ Sensitivity", "🏦 Financing",
+         "🎯 Optimizer", "📅 Schedule", "🔋 Hourly", "🌦️ Monthly", "🧩 Components", "💰 Lifetime", "🗂️ Compare"],
+        key="results_tab",
+        on_change="rerun"
+    )
 
-    with tab1:
-        st.subheader("Key Metrics")
-        
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            metric_card(
-                "Solar Size", 
-                f"{recommended_solar_size}", 
-                "kWp",
-                "Total solar capacity needed"
-            )
-        with col2:
-            metric_card(
-                "Panels Required", 
-                f"{panels_required}", 
-                "panels",
-                "Number of solar panels needed"
-            )
-        with col3:
-            metric_card(
-                "Daily Production", 
-                f"{round(production_per_day, 1)}", 
-                "kg/day",
-                "Estimated daily processing output"
-            )
-        with col4:
-            metric_card(
-                "Daily Net Income", 
-                f"{round(net_income_per_day * rate, 1)}", 
-                selected_currency,
-                "Income after operating costs"
-            )
-        
-        st.markdown("---")
-        st.subheader("System Overview")
-        st.markdown(f"""
-        <div class="summary-card">
-            <p><b>Machine Details:</b> {selected_appliance} ({power}kW {selected_system} system)</p>
-            <p><b>Daily Operation:</b> {runtime_per_day} hours/day, {operating_days} days/year</p>
-            <p><b>Solar Requirements:</b> {panels_required} x 500W panels ({recommended_solar_size} kWp system)</p>
-            <p><b>Battery Storage:</b> {battery_capacity} kWh ({battery_hours} hours backup)</p>
-            <p><b>Location:</b> {sun_hours} peak sun hours per day</p>
-            <p><b>System Efficiency:</b> {system_efficiency}%</p>
-        </div>
-        """, unsafe_allow_html=True)
-
-    with tab2:
-        st.subheader("Cost Breakdown")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            metric_card(
-                "Machine Cost", 
-                f"{round(price_usd * rate, 1)}", 
-                selected_currency
-            )
-            metric_card(
-                "Solar Panel Cost", 
-                f"{round(solar_panel_cost * rate, 1)}", 
-                selected_currency
-            )
-            metric_card(
-                "Battery Cost", 
-                f"{round(battery_cost * rate, 1)}", 
-                selected_currency
-            )
-            
-        with col2:
+    if tab1.open:
+        with tab1:
+            st.subheader("Key Metrics")
+            metric_grid([
+                ("Solar Size", f"{result.recommended_solar_size}", "kWp", "Total solar capacity needed"),
+                ("Panels Required", f"{result.panels_required}", "panels", "Number of solar panels needed"),
+                ("Daily Production", f"{round(result.production_per_day, 1)}", "kg/day", "Estimated daily processing output"),
+                ("Daily Net Income", f"{round(money.net_income_per_day, 1)}", selected_currency, "Income after operating costs"),
+            ], columns=4)
+
+            st.markdown("---")
+            st.subheader("System Overview")
+            st.markdown(f"""
+            <div class="summary-card">
+                <p><b>Machine Details:</b> {selected_appliance} ({power}kW {selected_system} system)</p>
+                <p><b>Daily Operation:</b> {runtime_per_day} hours/day, {operating_days} days/year</p>
+                <p><b>Solar Requirements:</b> {result.panels_required} x 500W panels ({result.recommended_solar_size} kWp system)</p>
+                <p><b>Battery Storage:</b> {result.battery_capacity} kWh ({battery_hours} hours backup)</p>
+                <p><b>Location:</b> {round(sun_hours, 2)} peak sun hours per day{f" (sized for the {sun_profile[1].lower()})" if sun_profile else ""}</p>
+                <p><b>System Efficiency:</b> {system_efficiency}%</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+    if tab2.open:
+        with tab2:
+            st.subheader("Cost Breakdown")
             if selected_system == "AC":
-                metric_card(
-                    "Inverter Cost", 
-                    f"{round(inverter_cost * rate, 1)}", 
-                    selected_currency
-                )
+                conversion_card = ("Inverter Cost", f"{round(money.inverter_cost, 1)}", selected_currency)
             else:
-                metric_card(
-                    "Controller Cost", 
-                    f"{round(controller_cost * rate, 1)}", 
-                    selected_currency
+                conversion_card = ("Controller Cost", f"{round(money.controller_cost, 1)}", selected_currency)
+            # Listed row by row: machine, panels and battery on the left
+            metric_grid([
+                ("Machine Cost", f"{round(money.price_usd, 1)}", selected_currency),
+                conversion_card,
+                ("Solar Panel Cost", f"{round(money.solar_panel_cost, 1)}", selected_currency),
+                ("Import & Installation", f"{round(money.import_install_usd, 1)}", selected_currency),
+                ("Battery Cost", f"{round(money.battery_cost, 1)}", selected_currency),
+            ], columns=2)
+
+            st.markdown("---")
+            st.subheader("Total Costs")
+            metric_grid([
+                ("FOB Subtotal", f"{round(money.fob_subtotal_usd, 1)}", selected_currency),
+                ("Installed Cost", f"{round(money.total_with_import_usd, 1)}", selected_currency),
+                ("Subsidy Amount", f"{round(money.subsidy_amount, 1)}", selected_currency),
+            ], columns=3)
+
+            st.markdown("---")
+            st.subheader("Final Costs After Subsidy")
+            metric_grid([
+                ("Total After Subsidy", f"{round(money.total_after_subsidy, 1)}", selected_currency),
+                ("Deposit Amount", f"{round(money.deposit_amount, 1)}", selected_currency),
+                ("Loan Amount", f"{round(money.loan_principal_usd, 1)}", selected_currency),
+            ], columns=3)
+
+            st.markdown("---")
+            st.subheader("Loan Details")
+            metric_grid([
+                ("Annual Repayment", f"{round(money.annual_repayment_usd,1)}", selected_currency),
+                ("Monthly Repayment", f"{round(money.monthly_repayment_usd, 1)}", selected_currency),
+                ("Daily Repayment", f"{round(money.daily_repayment_usd, 1)}", selected_currency),
+                ("Total Interest", f"{round(money.total_interest_paid_usd, 1)}", selected_currency),
+            ], columns=4)
+
+            st.markdown("---")
+            st.subheader("Repayment Analysis")
+            metric_grid([
+                ("% of Gross Revenue", f"{round(result.repayment_percentage, 1)}", "%"),
+                ("% of Net Revenue", f"{round(result.net_revenue_repayment_percentage, 1)}", "%"),
+            ], columns=2)
+
+    if tab3.open:
+        with tab3:
+            st.subheader("Technical Specifications")
+            metric_grid([
+                ("Machine Power", f"{power}", "kW"),
+                ("Daily Energy Required", f"{round(result.energy_required_per_day, 1)}", "kWh/day"),
+                ("Daily Energy Production", f"{round(result.energy_production, 1)}", "kWh/day"),
+            ], columns=3)
+
+            st.markdown("---")
+            st.subheader("Performance Metrics")
+            metric_grid([
+                ("Processing Speed", f"{processing_speed}", "kg/hour"),
+                ("Specific Efficiency", f"{round(result.specific_efficiency, 2)}", "kg/kWh"),
+                ("Battery Backup", f"{battery_hours}", "hours"),
+            ], columns=3)
+
+            st.markdown("---")
+            st.subheader("Solar System Details")
+            metric_grid([
+                ("Panel Wattage", f"{panel_wattage_kw*1000}", "W"),
+                ("Sun Hours", f"{sun_hours}", "hours/day"),
+                ("System Efficiency", f"{system_efficiency}", "%"),
+            ], columns=3)
+
+            if site_loads:
+                st.markdown("---")
+                st.subheader("Site Loads")
+                arrays = load_arrays(site_loads)
+                metric_grid([
+                    ("Appliances", f"{len(site_loads)}", "running"),
+                    ("Coincident Peak", f"{round(peak_power, 2)}", "kW",
+                     "Most load running at once; an AC inverter is sized for at least this"),
+                    ("Operating Hours", f"{runtime_per_day}", "hours/day", "Hours when any appliance runs"),
+                    ("Average Load", f"{power}", "kW", "Daily energy spread over the operating hours"),
+                ], columns=4)
+                st.bar_chart(
+                    pd.DataFrame({
+                        "Hour": np.arange(24),
+                        "Load (kWh)": daily_load(arrays["start_hour"], arrays["runtime_per_day"],
+                                                 arrays["power"])[:, 0].round(2),
+                    }),
+                    x="Hour",
+                    y="Load (kWh)",
+                    height=220
                 )
-            metric_card(
-                "Import & Installation", 
-                f"{round((fob_subtotal_usd * (install_multiplier - 1)) * rate, 1)}", 
-                selected_currency
-            )
-        
-        st.markdown("---")
-        st.subheader("Total Costs")
-        
-        col3, col4, col5 = st.columns(3)
-        with col3:
-            metric_card(
-                "FOB Subtotal", 
-                f"{round(fob_subtotal_usd * rate, 1)}", 
-                selected_currency
-            )
-        with col4:
-            metric_card(
-                "Installed Cost", 
-                f"{round(total_with_import_usd * rate, 1)}", 
-                selected_currency
-            )
-        with col5:
-            metric_card(
-                "Subsidy Amount", 
-                f"{round(subsidy_amount * rate, 1)}", 
-                selected_currency
-            )
-        
-        st.markdown("---")
-        st.subheader("Final Costs After Subsidy")
-        
-        col6, col7, col8 = st.columns(3)
-        with col6:
-            metric_card(
-                "Total After Subsidy", 
-                f"{round(total_after_subsidy * rate, 1)}", 
-                selected_currency
-            )
-        with col7:
-            metric_card(
-                "Deposit Amount", 
-                f"{round(deposit_amount * rate, 1)}", 
-                selected_currency
-            )
-        with col8:
-            metric_card(
-                "Loan Amount", 
-                f"{round(loan_principal_usd * rate, 1)}", 
-                selected_currency
-            )
-        
-        st.markdown("---")
-        st.subheader("Loan Details")
-        
-        col75, col9, col10, col11  = st.columns(4)
-        with col75:
-            metric_card(
-                "Annual Repayment",
-                f"{round(annual_repayment_usd*rate,1)}",
-                selected_currency
-            )
-        with col9:
-            metric_card(
-                "Monthly Repayment", 
-                f"{round(monthly_repayment_usd * rate, 1)}", 
-                selected_currency
-            )
-        with col10:
-            metric_card(
-                "Daily Repayment", 
-                f"{round(daily_repayment_usd * rate, 1)}", 
-                selected_currency
-            )
-        with col11:
-            metric_card(
-                "Total Interest", 
-                f"{round(total_interest_paid_usd * rate, 1)}", 
-                selected_currency
-            )
-        
-        st.markdown("---")
-        st.subheader("Repayment Analysis")
-        
-        col12, col13 = st.columns(2)
-        with col12:
-            metric_card(
-                "% of Gross Revenue", 
-                f"{round(repayment_percentage, 1)}", 
-                "%"
-            )
-        with col13:
-            metric_card(
-                "% of Net Revenue", 
-                f"{round(net_revenue_repayment_percentage, 1)}", 
-                "%"
-            )
+                st.caption("Machine Power and Processing Speed below are the site's averages over its operating "
+                           "hours; production and income are the sums over its appliances.")
 
-    with tab3:
-        st.subheader("Technical Specifications")
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            metric_card(
-                "Machine Power", 
-                f"{power}", 
-                "kW"
-            )
-        with col2:
-            metric_card(
-                "Daily Energy Required", 
-                f"{round(energy_required_per_day, 1)}", 
-                "kWh/day"
-            )
-        with col3:
-            metric_card(
-                "Daily Energy Production", 
-                f"{round(energy_production, 1)}", 
-                "kWh/day"
-            )
-        
-        st.markdown("---")
-        st.subheader("Performance Metrics")
-        
-        col4, col5, col6 = st.columns(3)
-        with col4:
-            metric_card(
-                "Processing Speed", 
-                f"{processing_speed}", 
-                "kg/hour"
-            )
-        with col5:
-            metric_card(
-                "Specific Efficiency", 
-                f"{round(specific_efficiency, 2)}", 
-                "kg/kWh"
-            )
-        with col6:
-            metric_card(
-                "Battery Backup", 
-                f"{battery_hours}", 
-                "hours"
-            )
+            st.markdown("---")
+            st.subheader("Detailed Calculations")
+            df_tech = pd.DataFrame([{
+                "Parameter": "Machine Power",
+                "Value": f"{power}",
+                "Unit": "kW"
+            }, {
+                "Parameter": "Daily Runtime",
+                "Value": runtime_per_day,
+                "Unit": "hours"
+            }, {
+                "Parameter": "Energy Required",
+                "Value": round(result.energy_required_per_day, 2),
+                "Unit": "kWh/day"
+            }, {
+                "Parameter": "System Efficiency",
+                "Value": system_efficiency,
+                "Unit": "%"
+            }, {
+                "Parameter": "Energy Production Needed",
+                "Value": round(result.energy_production, 2),
+                "Unit": "kWh/day"
+            }, {
+                "Parameter": "Sun Hours Available",
+                "Value": sun_hours,
+                "Unit": "hours"
+            }, {
+                "Parameter": "Solar System Size",
+                "Value": result.recommended_solar_size,
+                "Unit": "kWp"
+            }, {
+                "Parameter": "Panel Wattage",
+                "Value": panel_wattage_kw*1000,
+                "Unit": "W"
+            }, {
+                "Parameter": "Panels Required",
+                "Value": result.panels_required,
+                "Unit": "panels"
+            }, {
+                "Parameter": "Production Rate",
+                "Value": processing_speed,
+                "Unit": "kg/hour"
+            }, {
+                "Parameter": "Daily Production",
+                "Value": round(result.production_per_day, 2),
+                "Unit": "kg/day"
+            }, {
+                "Parameter": "Battery Storage",
+                "Value": result.battery_capacity,
+                "Unit": "kWh"
+            }])
         
-        st.markdown("---")
-        st.subheader("Solar System Details")
-        
-        col7, col8, col9 = st.columns(3)
-        with col7:
-            metric_card(
-                "Panel Wattage", 
-                f"{panel_wattage_kw*1000}", 
-                "W"
-            )
-        with col8:
-            metric_card(
-                "Sun Hours", 
-                f"{sun_hours}", 
-                "hours/day"
+            st.dataframe(
+                df_tech, 
+                hide_index=True, 
+                use_container_width=True,
+                column_config={
+                    "Parameter": st.column_config.Column(width="medium"),
+                    "Value": st.column_config.Column(width="small"),
+                    "Unit": st.column_config.Column(width="small")
+                }
             )
-        with col9:
-            metric_card(
-                "System Efficiency", 
-                f"{system_efficiency}", 
-                "%"
-            )
-        
-        st.markdown("---")
-        st.subheader("Detailed Calculations")
-        
-        df_tech = pd.DataFrame([{
-            "Parameter": "Machine Power",
-            "Value": f"{power}",
-            "Unit": "kW"
-        }, {
-            "Parameter": "Daily Runtime",
-            "Value": runtime_per_day,
-            "Unit": "hours"
-        }, {
-            "Parameter": "Energy Required",
-            "Value": round(energy_required_per_day, 2),
-            "Unit": "kWh/day"
-        }, {
-            "Parameter": "System Efficiency",
-            "Value": system_efficiency,
-            "Unit": "%"
-        }, {
-            "Parameter": "Energy Production Needed",
-            "Value": round(energy_production, 2),
-            "Unit": "kWh/day"
-        }, {
-            "Parameter": "Sun Hours Available",
-            "Value": sun_hours,
-            "Unit": "hours"
-        }, {
-            "Parameter": "Solar System Size",
-            "Value": recommended_solar_size,
-            "Unit": "kWp"
-        }, {
-            "Parameter": "Panel Wattage",
-            "Value": panel_wattage_kw*1000,
-            "Unit": "W"
-        }, {
-            "Parameter": "Panels Required",
-            "Value": panels_required,
-            "Unit": "panels"
-        }, {
-            "Parameter": "Production Rate",
-            "Value": processing_speed,
-            "Unit": "kg/hour"
-        }, {
-            "Parameter": "Daily Production",
-            "Value": round(production_per_day, 2),
-            "Unit": "kg/day"
-        }, {
-            "Parameter": "Battery Storage",
-            "Value": battery_capacity,
-            "Unit": "kWh"
-        }])
-        
-        st.dataframe(
-            df_tech, 
-            hide_index=True, 
-            use_container_width=True,
-            column_config={
-                "Parameter": st.column_config.Column(width="medium"),
-                "Value": st.column_config.Column(width="small"),
-                "Unit": st.column_config.Column(width="small")
-            }
-        )
 
-    with tab4:
-        st.subheader("Business Viability Analysis")
-        
-        st.markdown(f"""
-        <div class="{viability_class}">
-            <h3>Viable Business? {viability_text}</h3>
-            <p>Net Income: {round(net_income_per_day * rate, 1)} {selected_currency}/day</p>
-            <p>Loan Repayment: {round(daily_repayment_usd * rate, 1)} {selected_currency}/day</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("---")
-        st.subheader("Income vs. Repayments")
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            metric_card(
-                "Daily Gross Income", 
-                f"{round(income_per_day * rate, 1)}", 
-                selected_currency
-            )
-        with col2:
-            metric_card(
-                "Daily Operating Cost", 
-                f"{round(daily_operating_cost * rate, 1)}", 
-                selected_currency
-            )
-        with col3:
-            metric_card(
-                "Daily Net Income", 
-                f"{round(net_income_per_day * rate, 1)}", 
-                selected_currency
-            )
-        
-        st.markdown("---")
-        st.subheader("Loan Repayment Details")
-        
-        col4, col5, col6 = st.columns(3)
-        with col4:
-            metric_card(
-                "Daily Loan Repayment", 
-                f"{round(daily_repayment_usd * rate, 1)}", 
-                selected_currency
-            )
-        with col5:
-            metric_card(
-                "% of Gross Revenue", 
-                f"{round(repayment_percentage, 1)}", 
-                "%"
-            )
-        with col6:
-            metric_card(
-                "% of Net Revenue", 
-                f"{round(net_revenue_repayment_percentage, 1)}", 
-                "%"
-            )
-        
-        st.markdown("---")
-        st.subheader("Financial Ratios")
-        
-        col7, col8 = st.columns(2)
-        with col7:
-            if viable_business and net_income_per_day > daily_repayment_usd:
-                surplus = net_income_per_day - daily_repayment_usd
-                metric_card(
-                    "Daily Surplus", 
-                    f"{round(surplus * rate, 1)}", 
-                    selected_currency
-                )
-        with col8:
-            metric_card(
-                "Annual Net Profit", 
-                f"{round(net_income_per_day * operating_days * rate, 1)}", 
-                selected_currency
-            )
-        
-        st.markdown("---")
-        st.subheader("Payback Analysis")
-        
-        if viable_business:
-            payback_years = total_after_subsidy / (net_income_per_day * operating_days)
+    if tab4.open:
+        with tab4:
+            st.subheader("Business Viability Analysis")
+
             st.markdown(f"""
-            <div class="summary-card">
-                <p><b>Your Total Investment:</b> {round(total_after_subsidy * rate, 1)} {selected_currency}</p>
-                <p><b>Annual Net Profit:</b> {round(net_income_per_day * operating_days * rate, 1)} {selected_currency}</p>
-                <p><b>Simple Payback Period:</b> {round(payback_years, 1)} years</p>
+            <div class="{viability_class}">
+                <h3>Viable Business? {viability_text}</h3>
+                <p>Net Income: {round(money.net_income_per_day, 1)} {selected_currency}/day</p>
+                <p>Loan Repayment: {round(money.daily_repayment_usd, 1)} {selected_currency}/day</p>
             </div>
             """, unsafe_allow_html=True)
+
+            st.markdown("---")
+            st.subheader("Income vs. Repayments")
+            metric_grid([
+                ("Daily Gross Income", f"{round(money.income_per_day, 1)}", selected_currency),
+                ("Daily Operating Cost", f"{round(money.daily_operating_cost, 1)}", selected_currency),
+                ("Daily Net Income", f"{round(money.net_income_per_day, 1)}", selected_currency),
+            ], columns=3)
+
+            st.markdown("---")
+            st.subheader("Loan Repayment Details")
+            metric_grid([
+                ("Daily Loan Repayment", f"{round(money.daily_repayment_usd, 1)}", selected_currency),
+                ("% of Gross Revenue", f"{round(result.repayment_percentage, 1)}", "%"),
+                ("% of Net Revenue", f"{round(result.net_revenue_repayment_percentage, 1)}", "%"),
+            ], columns=3)
+
+            st.markdown("---")
+            st.subheader("Financial Ratios")
+            surplus_card = None
+            if result.viable_business and result.net_income_per_day > result.daily_repayment_usd:
+                surplus_card = ("Daily Surplus", f"{round(money.daily_surplus, 1)}", selected_currency)
+            metric_grid([
+                surplus_card,
+                ("Annual Net Profit", f"{round(money.annual_net_profit, 1)}", selected_currency),
+            ], columns=2)
+
+            st.markdown("---")
+            st.subheader("Payback Analysis")
+
+            if result.payback_years is not None:
+                st.markdown(f"""
+                <div class="summary-card">
+                    <p><b>Your Total Investment:</b> {round(money.total_after_subsidy, 1)} {selected_currency}</p>
+                    <p><b>Annual Net Profit:</b> {round(money.annual_net_profit, 1)} {selected_currency}</p>
+                    <p><b>Simple Payback Period:</b> {round(result.payback_years, 1)} years</p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.warning("Payback analysis not available - business is not viable")
+
+    if tab5.open:
+        with tab5:
+            render_risk(scenario, rate, selected_currency)
+
+    if tab6.open:
+        with tab6:
+            render_sensitivity(scenario, rate, selected_currency)
+
+    if tab7.open:
+        with tab7:
+            render_financing(scenario, rate, selected_currency)
+
+    if tab8.open:
+        with tab8:
+            render_optimizer(scenario, rate, selected_currency, run)
+
+    if tab9.open:
+        with tab9:
+            render_schedule(scenario, result, rate, selected_currency)
+
+    if tab10.open:
+        with tab10:
+            render_dispatch(scenario, result, sun_profile[0] if sun_profile else None, site_loads)
+
+    if tab11.open:
+        with tab11:
+            render_monthly(scenario, result, sun_profile, rate, selected_currency)
+
+    if tab12.open:
+        with tab12:
+            render_components(scenario, result, rate, selected_currency)
+
+    if tab13.open:
+        with tab13:
+            render_lifetime(scenario, rate, selected_currency)
+
+    if tab14.open:
+        with tab14:
+            render_history(run, rate)
+
+def show_rate_note(selected_currency):
+    # Show exchange rate disclaimer if using fallback rates
+    if selected_currency != "USD":
+        rate = rates.get(selected_currency, 1)
+        if rates_fetched_at is None:
+            st.warning(f"⚠️ Using sample exchange rates (1 USD = {rate:.2f} {selected_currency}). For accurate results, please verify current rates.")
         else:
-            st.warning("Payback analysis not available - business is not viable")
+            rates_date = datetime.fromtimestamp(rates_fetched_at).strftime("%Y-%m-%d %H:%M")
+            st.caption(f"💱 Exchange rate used: 1 USD = {rate:.2f} {selected_currency} (as of {rates_date})")
+
+if st.session_state.inputs_visible:
+    input_section()
+
+if not st.session_state.inputs_visible and st.session_state.get("calculated", False):
+    render_results(st.session_state.current_run)
 
     # Add a button to show inputs again
     if st.button("↻ Modify Inputs", use_container_width=True):
@@ -1015,9 +1755,4 @@ if not st.session_state.inputs_visible and st.session_state.get("calculated", Fa
         st.session_state.calculated = False
         st.rerun()
 
-    # Show exchange rate disclaimer if using fallback rates
-    if selected_currency != "USD":
-        if rates == common_currencies:
-            st.warning(f"⚠️ Using sample exchange rates (1 USD = {rate:.2f} {selected_currency}). For accurate results, please verify current rates.")
-        else:
-            st.caption(f"💱 Exchange rate used: 1 USD = {rate:.2f} {selected_currency}")
\ No newline at end of file
+    show_rate_note(st.session_state.current_run.currency)
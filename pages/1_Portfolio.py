@@ -0,0 +1,175 @@
+import contextlib
+import os
+import sqlite3
+import tempfile
+
+import pandas as pd
+import streamlit as st
+
+from solarcalc.irradiance import IrradianceGrid
+from solarcalc.portfolio import input_defaults, month_columns, required_columns, run_portfolio, template_frame
+from solarcalc.schedule import schedule_page
+from solarcalc.seasonal import design_month_options
+from solarcalc.store import get_store
+
+st.set_page_config(
+    page_title="Portfolio - Solar Productive Use Calculator",
+    page_icon="☀️",
+    layout="wide"
+)
+
+
+def discard_output(path):
+    # A results file belongs to one session's latest run; one already gone needs nothing
+    with contextlib.suppress(OSError):
+        os.remove(path)
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_loans(path):
+    # Only the loan columns of the evaluated rows; schedules are built a page at a time
+    import pyarrow.csv as pa_csv
+
+    table = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(
+        include_columns=["status", "loan_principal_usd", "interest_rate_pct", "loan_term_months"]
+    )).to_pandas()
+    ok = (table["status"] == "ok").to_numpy()
+    return {
+        "row": (table.index[ok] + 1).to_numpy(),
+        "principal": table["loan_principal_usd"].to_numpy()[ok],
+        "interest_rate": table["interest_rate_pct"].to_numpy()[ok] / 100,
+        "months": table["loan_term_months"].to_numpy()[ok].astype(int),
+    }
+
+
+@st.cache_resource
+def get_irradiance_grid():
+    # Memory-mapped once per process; None when no dataset is installed
+    try:
+        return IrradianceGrid()
+    except (OSError, ValueError):
+        return None
+
+
+st.title("📁 Portfolio Upload")
+st.markdown(
+    "Upload a CSV or Parquet file with one row per site or appliance. "
+    f"Required columns: `{'`, `'.join(required_columns)}`. "
+    "Other input columns fall back to the calculator defaults. "
+    "Interest rate and install increase are percentages, like the sliders. All results are in USD. "
+    f"Add `{month_columns[0]}` to `{month_columns[-1]}` to size each site for its monthly sun hours"
+    + (", or `latitude` and `longitude` to look them up in the local irradiance dataset." if get_irradiance_grid()
+       else ".")
+    + " For sites running several appliances, give one row per appliance with a `site` column and optional "
+    "`start_hour`; each site's rows must be consecutive and it is sized for its combined load."
+)
+
+with st.expander("Input columns"):
+    st.dataframe(template_frame(), hide_index=True, use_container_width=True)
+    st.download_button(
+        "Download template CSV",
+        template_frame().to_csv(index=False),
+        file_name="portfolio_template.csv",
+        mime="text/csv"
+    )
+    st.caption(", ".join(input_defaults))
+
+uploaded = st.file_uploader("Portfolio file", type=["csv", "parquet"])
+chunksize = st.number_input("Rows per chunk", min_value=1_000, max_value=500_000, value=50_000, step=10_000)
+size_for = st.selectbox("Size Monthly Profiles For", list(design_month_options),
+                        help="Only used when the file has monthly sun-hour columns")
+use_coordinates = get_irradiance_grid() is not None and st.checkbox(
+    "Look up sun hours by coordinates",
+    value=True,
+    help="Rows with latitude and longitude and no monthly sun hours use the nearest cell of the irradiance dataset"
+)
+dispatch = st.checkbox(
+    "Simulate hourly dispatch",
+    help="Adds unmet-load hours, curtailment and the battery each site really needs. "
+         "Takes about half a second per thousand rows."
+)
+lifetime = None
+if st.checkbox("Project lifetime cash flows", help="Adds NPV, IRR and discounted payback for every site"):
+    col1, col2 = st.columns(2)
+    with col1:
+        years = st.slider("Lifetime (years)", 10, 25, 20, key="portfolio_lifetime_years")
+    with col2:
+        discount_rate = st.number_input("Discount Rate (%)", min_value=0.0, max_value=50.0, value=10.0, step=0.5,
+                                        key="portfolio_discount_rate")
+    lifetime = {"years": years, "discount_rate": discount_rate / 100}
+save = st.checkbox("Save results to the scenario store",
+                   help="Adds the evaluated rows to the Saved Scenarios page, under the file name")
+
+if uploaded is not None and st.button("🚀 Run Portfolio", use_container_width=True, type="primary"):
+    file_format = "parquet" if uploaded.name.lower().endswith(".parquet") else "csv"
+    progress = st.progress(0.0, text="Starting...")
+
+    def on_progress(fraction, rows):
+        progress.progress(fraction, text=f"{rows:,} rows processed")
+
+    # Results are spooled to disk chunk by chunk instead of being held in memory.
+    # Only the latest successful run's file is kept; it replaces the previous one.
+    output = tempfile.NamedTemporaryFile(prefix="portfolio_", suffix=".csv", delete=False)
+    try:
+        with output:
+            rows, valid_rows = run_portfolio(uploaded, file_format, output, int(chunksize), on_progress, dispatch,
+                                             design_month_options[size_for],
+                                             get_irradiance_grid() if use_coordinates else None, lifetime,
+                                             get_store() if save else None, uploaded.name)
+    except (ValueError, sqlite3.Error) as e:
+        discard_output(output.name)
+        st.error(f"⚠️ {e}")
+    except BaseException:
+        discard_output(output.name)
+        raise
+    else:
+        progress.progress(1.0, text=f"Done: {rows:,} rows")
+        previous = st.session_state.get("portfolio_output")
+        st.session_state.portfolio_output = output.name
+        st.session_state.portfolio_summary = (uploaded.name, rows, valid_rows)
+        if previous is not None:
+            discard_output(previous)
+
+if "portfolio_output" in st.session_state:
+    name, rows, valid_rows = st.session_state.portfolio_summary
+    st.success(f"{name}: {valid_rows:,} of {rows:,} rows evaluated")
+    if valid_rows < rows:
+        st.warning(f"{rows - valid_rows:,} rows had missing or invalid inputs and are marked 'invalid'.")
+    with open(st.session_state.portfolio_output, "rb") as f:
+        st.download_button(
+            "⬇️ Download results CSV",
+            f,
+            file_name=name.rsplit(".", 1)[0] + "_results.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+
+    st.markdown("---")
+    st.subheader("📅 Amortization Schedules")
+    loans = load_loans(st.session_state.portfolio_output)
+    total_rows = int(loans["months"].sum())
+    if total_rows == 0:
+        st.info("No evaluated rows to show schedules for.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.select_slider("Rows per Page", [12, 60, 120, 600], value=120, key="schedule_page_size")
+        pages = -(-total_rows // page_size)
+        with col2:
+            page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key="schedule_page")
+        # Only the loans on this page are amortized
+        columns, _ = schedule_page(loans["principal"], loans["interest_rate"], loans["months"], page - 1, page_size)
+        st.dataframe(
+            pd.DataFrame({
+                "Row": loans["row"][columns["loan"].astype(int)],
+                "Month": columns["month"].astype(int),
+                "Payment (USD)": columns["payment"].round(2),
+                "Interest (USD)": columns["interest"].round(2),
+                "Principal (USD)": columns["principal"].round(2),
+                "Balance (USD)": columns["balance"].round(2),
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+        st.caption(f"{total_rows:,} monthly rows across {len(loans['months']):,} loans. "
+                   "Row is the row number in the results file.")
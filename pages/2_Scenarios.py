@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from solarcalc.store import get_store
+
+st.set_page_config(
+    page_title="Saved Scenarios - Solar Productive Use Calculator",
+    page_icon="☀️",
+    layout="wide"
+)
+
+st.title("🗄️ Saved Scenarios")
+st.markdown(
+    "Every calculated scenario and every portfolio row saved to the store, newest first. "
+    "Money is shown in the currency each scenario was calculated in."
+)
+
+store = get_store()
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    system = st.selectbox("System Type", ["Any", "AC", "DC"], key="store_system")
+    viable_only = st.checkbox("Viable only", key="store_viable")
+with col2:
+    min_power = st.number_input("Min Power (kW)", min_value=0.0, value=0.0, step=0.5, key="store_min_power")
+    max_power = st.number_input("Max Power (kW)", min_value=0.0, value=0.0, step=0.5, key="store_max_power",
+                                help="0 for no limit")
+with col3:
+    max_payback = st.number_input("Max Payback (years)", min_value=0.0, value=0.0, step=0.5, key="store_max_payback",
+                                  help="0 for no limit; only viable scenarios have a payback")
+    currency = st.text_input("Currency", key="store_currency", placeholder="Any, e.g. KES").strip().upper()
+with col4:
+    source = st.selectbox("Source", ["Any", *store.sources()], key="store_source",
+                          help='"app" for calculations, otherwise the portfolio file')
+    page_size = st.select_slider("Rows per Page", [25, 50, 100, 250], value=50, key="store_page_size")
+
+filters = {
+    "system": None if system == "Any" else system,
+    "viable": True if viable_only else None,
+    "min_power": min_power or None,
+    "max_power": max_power or None,
+    "max_payback": max_payback or None,
+    "currency": currency or None,
+    "source": None if source == "Any" else source,
+}
+
+# Pages are keyed by the last id shown; the ids each page started before are kept to go back
+if st.session_state.get("store_filters") != filters:
+    st.session_state.store_filters = filters
+    st.session_state.store_cursors = [None]
+cursors = st.session_state.store_cursors
+page = store.query(cursors[-1], page_size, **filters)
+
+if not page.rows:
+    st.info("No saved scenarios match these filters.")
+else:
+    rows = pd.DataFrame(page.rows)
+    st.dataframe(
+        pd.DataFrame({
+            "ID": rows["id"],
+            "Saved": [datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M") for t in rows["created"]],
+            "Source": rows["source"],
+            "Label": rows["label"],
+            "System": rows["system"],
+            "Power (kW)": rows["power"].round(2),
+            "Solar (kWp)": rows["recommended_solar_size"],
+            "Battery (kWh)": rows["battery_capacity"].round(2),
+            "Total After Subsidy": (rows["total_after_subsidy"] * rows["rate"]).round(1),
+            "Daily Surplus": (rows["daily_surplus"] * rows["rate"]).round(1),
+            "Currency": rows["currency"],
+            "Viable": rows["viable_business"],
+            "Payback (years)": rows["payback_years"].astype(float).round(1),
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+col1, col2, col3 = st.columns([1, 1, 2])
+with col1:
+    if st.button("← Newer", use_container_width=True, disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+with col2:
+    if st.button("Older →", use_container_width=True, disabled=page.next_before is None):
+        cursors.append(page.next_before)
+        st.rerun()
+with col3:
+    if st.checkbox("Count matches", key="store_count", help="Counting can take a moment on very large stores"):
+        st.caption(f"Page {len(cursors)}: {store.count(**filters):,} matching of {len(store):,} saved scenarios")
+    else:
+        st.caption(f"Page {len(cursors)}")
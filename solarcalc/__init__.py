@@ -0,0 +1,4 @@
+"""Calculation code behind the Solar Productive Use Calculator app."""
+from solarcalc.engine import Result, Scenario, evaluate
+
+__all__ = ["Result", "Scenario", "evaluate"]
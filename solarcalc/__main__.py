@@ -0,0 +1,5 @@
+import sys
+
+from solarcalc.cli import main
+
+sys.exit(main())
@@ -0,0 +1,244 @@
+"""Local JSON HTTP API for the calculator: ``python -m solarcalc.api``.
+
+Scenarios are JSON objects with the same fields and units as the CLI and
+the portfolio files. Results are in USD.
+
+    GET  /health                 status and response-cache counters
+    POST /v1/evaluate            one scenario -> every result field
+    POST /v1/sizing              one scenario -> the sizing fields only
+    POST /v1/costs, /v1/capital, /v1/loan, /v1/viability   likewise
+    POST /v1/bulk                a list of scenarios (or {"scenarios": [...]})
+
+Encoded responses are cached per scenario, keyed on a SHA-256 of the
+normalized ``Scenario``. Two requests that differ only in key order,
+spelling of numbers or omitted defaults therefore share an entry, and a hit
+skips both the calculation and the JSON encoding. Single-scenario responses
+carry the hash as their ETag. A bulk request assembles its body from the
+same per-scenario entries. Connections are handled by a fixed pool of
+worker threads, and nothing outside the standard library and the engine is
+imported.
+"""
+import argparse
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from solarcalc import engine
+from solarcalc.inputs import to_scenario
+
+# Result fields returned by each single-scenario endpoint; None means all of them
+views = {
+    "evaluate": None,
+    "sizing": engine.Sizing._fields,
+    "costs": engine.Costs._fields,
+    "capital": engine.Capital._fields,
+    "loan": engine.Loan._fields,
+    "viability": engine.Viability._fields,
+}
+
+
+def input_hash(scenario):
+    """Hex SHA-256 of a normalized ``Scenario``."""
+    canonical = json.dumps(list(scenario), separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU of encoded responses with hit and miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class Calculator:
+    """The API without the HTTP: validates input and returns encoded JSON."""
+
+    def __init__(self, cache_size=65536, max_bulk=10_000):
+        self.cache = ResponseCache(cache_size)
+        self.max_bulk = max_bulk
+
+    def encode(self, values, view="evaluate"):
+        """``(input_hash, body)`` for one scenario mapping; ``ValueError`` if it is invalid or cannot be evaluated."""
+        if not isinstance(values, dict):
+            raise ValueError("expected a JSON object")
+        scenario = engine.normalize(to_scenario(values))
+        key = input_hash(scenario)
+        body = self.cache.get((view, key))
+        if body is None:
+            try:
+                result = engine.evaluate(scenario)
+            except ArithmeticError as e:
+                # Inputs that pass validation but still break the arithmetic, e.g. an interest rate of -100%
+                raise ValueError(f"cannot evaluate this scenario: {e}") from None
+            fields = views[view]
+            data = result._asdict() if fields is None else {name: getattr(result, name) for name in fields}
+            body = json.dumps(data).encode()
+            self.cache.put((view, key), body)
+        return key, body
+
+    def bulk(self, data):
+        """Body for ``/v1/bulk``; invalid scenarios get an ``error`` entry in place of results."""
+        items = data.get("scenarios") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError('expected a list of scenarios or {"scenarios": [...]}')
+        if len(items) > self.max_bulk:
+            raise ValueError(f"at most {self.max_bulk} scenarios per request")
+        parts = []
+        errors = 0
+        for number, item in enumerate(items, 1):
+            try:
+                parts.append(self.encode(item)[1])
+            except ValueError as e:
+                parts.append(json.dumps({"error": f"scenario {number}: {e}"}).encode())
+                errors += 1
+        head = json.dumps({"count": len(items), "errors": errors})[:-1].encode()
+        return head + b', "results": [' + b", ".join(parts) + b"]}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "solarcalc"
+    timeout = 30                  # idle keep-alive connections give their worker back
+    disable_nagle_algorithm = True  # headers and body go out as two writes
+    max_body = 16 * 1024 * 1024
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", f'"{etag}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send(status, json.dumps({"error": message}).encode())
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.max_body:
+            raise OverflowError(f"request body over {self.max_body} bytes")
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0].rstrip("/") == "/health":
+            calculator = self.server.calculator
+            body = {"status": "ok", "workers": self.server.workers, "cache": calculator.cache.stats()}
+            self._send(200, json.dumps(body).encode())
+        else:
+            self._send_error(404, f"no such endpoint: {self.path}")
+
+    def do_POST(self):
+        route = self.path.split("?", 1)[0].rstrip("/")
+        prefix, _, name = route.rpartition("/")
+        if prefix != "/v1" or (name != "bulk" and name not in views):
+            self.close_connection = True
+            self._send_error(404, f"no such endpoint: {self.path}")
+            return
+        try:
+            data = self._read_json()
+        except OverflowError as e:
+            self.close_connection = True
+            self._send_error(413, str(e))
+            return
+        except ValueError as e:
+            self._send_error(400, f"invalid JSON: {e}")
+            return
+
+        calculator = self.server.calculator
+        try:
+            if name == "bulk":
+                self._send(200, calculator.bulk(data))
+            else:
+                key, body = calculator.encode(data, name)
+                self._send(200, body, etag=key)
+        except ValueError as e:
+            self._send_error(400, str(e))
+
+
+class PooledHTTPServer(HTTPServer):
+    """``HTTPServer`` that hands each connection to a fixed pool of worker threads."""
+
+    request_queue_size = 128
+
+    def __init__(self, address, handler=Handler, workers=8, calculator=None):
+        super().__init__(address, handler)
+        self.workers = workers
+        self.calculator = calculator or Calculator()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="solarcalc-api")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m solarcalc.api",
+                                     description="Serve the calculator as JSON over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--workers", type=int, default=8, help="worker threads (default: 8)")
+    parser.add_argument("--cache-size", type=int, default=65536, help="cached responses kept (default: 65536)")
+    parser.add_argument("--max-bulk", type=int, default=10_000, help="scenarios per bulk request (default: 10000)")
+    parser.add_argument("--log", action="store_true", help="log every request to stderr")
+    args = parser.parse_args(argv)
+
+    Handler.quiet = not args.log
+    server = PooledHTTPServer((args.host, args.port), workers=args.workers,
+                              calculator=Calculator(args.cache_size, args.max_bulk))
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port} with {args.workers} workers", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+"""Columnar version of ``solarcalc.engine.evaluate``.
+
+``evaluate_batch`` takes a mapping of ``Scenario`` field names to arrays (a
+dict of lists, a dict of NumPy arrays or a pandas DataFrame all work) and
+returns a dict of NumPy arrays keyed by ``Result`` field names. Every value
+matches the scalar engine bit for bit.
+"""
+import numpy as np
+
+from solarcalc.engine import (
+    Result,
+    Scenario,
+    battery_cost_per_kwh,
+    controller_cost_per_kw,
+    inverter_cost_per_kw,
+    panel_cost,
+    panel_wattage_kw,
+)
+
+result_fields = Result._fields
+scenario_fields = Scenario._fields
+required_fields = [f for f in scenario_fields if f not in Scenario._field_defaults]
+
+
+def columns_from_scenarios(scenarios):
+    """Turn a list of ``Scenario`` tuples into the column mapping ``evaluate_batch`` takes."""
+    if not scenarios:
+        return {f: np.empty(0) for f in scenario_fields}
+    return {f: np.asarray(col) for f, col in zip(scenario_fields, zip(*scenarios))}
+
+
+def _column(data, name, n):
+    if name in data:
+        col = data[name]
+    else:
+        col = Scenario._field_defaults[name]
+    if name == "system":
+        return np.broadcast_to(np.asarray(col, dtype=str), n)
+    return np.broadcast_to(np.asarray(col, dtype=float), n)
+
+
+def _batch_length(data):
+    for name in scenario_fields:
+        if name in data and np.ndim(data[name]) > 0:
+            return len(data[name])
+    return 1
+
+
+def _discount_factors(monthly_rate, months):
+    """``(1 + monthly_rate) ** -months`` computed the way the scalar engine does.
+
+    NumPy's vectorised ``power`` can differ from the C library in the last
+    bit, so each distinct (rate, term) pair goes through Python's float
+    ``**`` once and is broadcast back. Loan terms and slider rates only take
+    a handful of values, so this is a loop over pairs, not over scenarios.
+    """
+    if monthly_rate.size == 0:
+        return np.empty(0)
+    rates, rate_idx = np.unique(monthly_rate, return_inverse=True)
+    terms, term_idx = np.unique(months, return_inverse=True)
+    keys, inverse = np.unique(rate_idx * len(terms) + term_idx, return_inverse=True)
+    rates = rates[keys // len(terms)].tolist()
+    terms = terms[keys % len(terms)].tolist()
+    factors = np.array([(1 + r)**(-m) for r, m in zip(rates, terms)])
+    return factors[inverse]
+
+
+def viability_columns(income_per_day, net_income_per_day, operating_days, daily_repayment_usd, deposit_percentage,
+                      total_after_subsidy):
+    """The viability outputs from daily income and repayments, as arrays."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        repayment_percentage = np.where(income_per_day > 0, (daily_repayment_usd / income_per_day) * 100, 0.0)
+        net_revenue_repayment_percentage = np.where(
+            net_income_per_day > 0, (daily_repayment_usd / net_income_per_day) * 100, 0.0
+        )
+        viable_business = (deposit_percentage == 100) | (
+            (net_income_per_day > 0) & (daily_repayment_usd > 0) & (net_income_per_day >= daily_repayment_usd)
+        )
+        annual_net_profit = net_income_per_day * operating_days
+        payback_years = np.where(
+            viable_business & (annual_net_profit > 0), total_after_subsidy / annual_net_profit, np.nan
+        )
+    return {
+        "repayment_percentage": repayment_percentage,
+        "net_revenue_repayment_percentage": net_revenue_repayment_percentage,
+        "viable_business": viable_business,
+        "daily_surplus": net_income_per_day - daily_repayment_usd,
+        "annual_net_profit": annual_net_profit,
+        "payback_years": payback_years,
+    }
+
+
+def evaluate_batch(data):
+    """Evaluate many scenarios in one pass.
+
+    Missing optional columns take the ``Scenario`` defaults and scalars are
+    broadcast. ``payback_years`` is NaN where the scalar engine returns None.
+    """
+    missing = [f for f in required_fields if f not in data]
+    if missing:
+        raise KeyError(f"Missing required scenario columns: {', '.join(missing)}")
+
+    n = _batch_length(data)
+    c = {name: _column(data, name, n) for name in scenario_fields}
+    power = c["power"]
+    processing_speed = c["processing_speed"]
+    system = c["system"]
+
+    # Sizing
+    specific_efficiency = processing_speed / power
+    energy_required_per_day = c["runtime_per_day"] * power
+    energy_production = energy_required_per_day / (c["system_efficiency"] / 100)
+    production_per_day = specific_efficiency * energy_required_per_day
+    income_per_hour = c["income_per_kg"] * processing_speed
+    income_per_day = c["income_per_kg"] * production_per_day * c["runtime_share"]
+    gross_income_per_year = income_per_day * c["operating_days"]
+    net_income_per_day = income_per_day - c["daily_operating_cost"]
+    panel_energy_per_day = panel_wattage_kw * c["sun_hours"]
+    panels_required = np.ceil(energy_production / panel_energy_per_day).astype(np.int64)
+    solar_panel_cost = panels_required * panel_cost
+    recommended_solar_size = np.ceil((energy_production / c["sun_hours"]) * 2) / 2
+    battery_capacity = recommended_solar_size * c["battery_hours"]
+
+    # Costs
+    is_ac = system == "AC"
+    is_dc = system == "DC"
+    inverter_cost = np.where(is_ac, np.maximum(recommended_solar_size, c["peak_power"]) * inverter_cost_per_kw, 0.0)
+    controller_cost = np.where(is_dc, recommended_solar_size * controller_cost_per_kw, 0.0)
+    battery_cost = battery_capacity * battery_cost_per_kwh
+
+    fob_subtotal_usd = c["price_usd"] + solar_panel_cost + inverter_cost + controller_cost + battery_cost
+    total_with_import_usd = fob_subtotal_usd * c["install_multiplier"]
+    import_install_usd = fob_subtotal_usd * (c["install_multiplier"] - 1)
+
+    # Subsidy and deposit
+    subsidy_amount = total_with_import_usd * (c["subsidy_percentage"] / 100)
+    total_after_subsidy = total_with_import_usd - subsidy_amount
+    deposit_amount = total_after_subsidy * (c["deposit_percentage"] / 100)
+    loan_principal_usd = total_after_subsidy - deposit_amount
+
+    # Loan
+    months = (c["loan_term_years"] * 12).astype(np.int64)
+    monthly_rate = c["interest_rate"] / 12
+    has_loan = (monthly_rate > 0) & (loan_principal_usd > 0)
+    monthly_repayment_usd = np.zeros(n)
+    if has_loan.any():
+        factors = _discount_factors(monthly_rate[has_loan], months[has_loan].astype(float))
+        monthly_repayment_usd[has_loan] = (loan_principal_usd[has_loan] * monthly_rate[has_loan]) / (1 - factors)
+    total_repayment_usd = months * monthly_repayment_usd
+    total_interest_paid_usd = total_repayment_usd - loan_principal_usd
+    annual_repayment_usd = monthly_repayment_usd * 12
+    daily_repayment_usd = annual_repayment_usd / 365
+
+    # Viability
+    viability = viability_columns(income_per_day, net_income_per_day, c["operating_days"], daily_repayment_usd,
+                                  c["deposit_percentage"], total_after_subsidy)
+
+    return {
+        "specific_efficiency": specific_efficiency,
+        "energy_required_per_day": energy_required_per_day,
+        "energy_production": energy_production,
+        "production_per_day": production_per_day,
+        "income_per_hour": income_per_hour,
+        "income_per_day": income_per_day,
+        "gross_income_per_year": gross_income_per_year,
+        "net_income_per_day": net_income_per_day,
+        "panels_required": panels_required,
+        "solar_panel_cost": solar_panel_cost,
+        "recommended_solar_size": recommended_solar_size,
+        "battery_capacity": battery_capacity,
+        "inverter_cost": inverter_cost,
+        "controller_cost": controller_cost,
+        "battery_cost": battery_cost,
+        "fob_subtotal_usd": fob_subtotal_usd,
+        "import_install_usd": import_install_usd,
+        "total_with_import_usd": total_with_import_usd,
+        "subsidy_amount": subsidy_amount,
+        "total_after_subsidy": total_after_subsidy,
+        "deposit_amount": deposit_amount,
+        "loan_principal_usd": loan_principal_usd,
+        "months": months,
+        "monthly_repayment_usd": monthly_repayment_usd,
+        "total_repayment_usd": total_repayment_usd,
+        "total_interest_paid_usd": total_interest_paid_usd,
+        "annual_repayment_usd": annual_repayment_usd,
+        "daily_repayment_usd": daily_repayment_usd,
+        **viability,
+    }
@@ -0,0 +1,205 @@
+"""Yearly cash flows over a system's life, with NPV, IRR and discounted payback.
+
+Simple payback divides the cost by one year's net income. Here each year
+of a ``years``-long life is projected instead, year 0 being the purchase:
+
+* Panels lose ``degradation`` of their output a year. The array is sized up
+  to the next half kWp, so it keeps covering the full runtime until
+  degradation eats that margin; after that income falls with the share of
+  the runtime it covers, as in ``solarcalc.seasonal``.
+* Income and operating costs rise with ``inflation`` from year 2.
+* The battery, and the inverter or controller, are bought again (at
+  today's installed price, inflated) every ``battery_life_years`` and
+  ``converter_life_years``, except in the last year.
+* The project flows start with ``-total_after_subsidy``; NPV, IRR and the
+  discounted payback come from these. The owner's flows start with the
+  deposit instead and pay the loan month by month, giving ``equity_npv``
+  and ``equity_irr``.
+
+The IRR of every scenario is found at once. NPV is a polynomial in
+``x = 1 / (1 + r)``, so each scenario's root is bracketed in ``x``
+(non-negative rates first) and Newton steps on the polynomial are taken
+while they stay inside the bracket and shrink faster than bisection would,
+with bisection otherwise, so every scenario converges. Scenarios drop out
+as they do, and the number of steps each took is reported.
+"""
+import numpy as np
+
+from solarcalc.batch import evaluate_batch
+from solarcalc.components import default_lifetimes
+from solarcalc.engine import Scenario
+
+irr_tolerance = 1e-12
+irr_max_iterations = 100
+# Largest x = 1 / (1 + r) searched, i.e. rates down to -99%
+max_discount_factor = 100.0
+
+
+def _polynomial(flows, x):
+    """``sum(flows[:, t] * x**t)`` and its derivative in ``x`` for each row, by Horner's rule."""
+    value = flows[:, -1].copy()
+    slope = np.zeros_like(value)
+    for t in range(flows.shape[1] - 2, -1, -1):
+        slope = slope * x + value
+        value = value * x + flows[:, t]
+    return value, slope
+
+
+def irr(flows, tolerance=irr_tolerance, max_iterations=irr_max_iterations):
+    """Internal rate of return of each row of ``flows`` (years 0, 1, ...), and the steps taken.
+
+    Returns ``(rate, iterations)``. The rate is NaN when the flows start
+    with nothing spent or NPV never changes sign between -99% and an
+    unbounded rate; where flows change sign more than once there can be
+    several rates, and the one at or above 0 is preferred.
+    """
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+    n = len(flows)
+    first = flows[:, 0]
+    at_zero = flows.sum(axis=1)
+    at_max, _ = _polynomial(flows, np.full(n, max_discount_factor))
+    # Bracket in x: (0, 1] holds rates of 0 and up, [1, max] the negative ones
+    positive = (first < 0) & (at_zero >= 0)
+    negative = (first < 0) & ~positive & (at_max >= 0)
+    low = np.where(positive, 0.0, 1.0)
+    high = np.where(positive, 1.0, max_discount_factor)
+    # Start at 10% and -10%
+    x = np.where(positive, 1 / 1.1, 1 / 0.9)
+    last_step = high - low
+    iterations = np.zeros(n, dtype=np.int64)
+    done = ~(positive | negative)
+    # NPV is below zero at the low end of every bracket and at or above zero at the high end
+    active = np.flatnonzero(~done)
+    for _ in range(max_iterations):
+        if not len(active):
+            break
+        at = x[active]
+        value, slope = _polynomial(flows[active], at)
+        iterations[active] += 1
+        below = value < 0
+        low[active] = np.where(below, at, low[active])
+        high[active] = np.where(below, high[active], at)
+        # Newton while it stays in the bracket and shrinks faster than bisection would
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = value / slope
+        inside = np.isfinite(newton) & (at - newton > low[active]) & (at - newton < high[active])
+        fast = np.abs(2 * value) <= np.abs(last_step[active] * slope)
+        step = np.where(inside & fast, newton, at - (low[active] + high[active]) / 2)
+        last_step[active] = step
+        x[active] = np.where(value == 0, at, at - step)
+        converged = (value == 0) | (np.abs(step) <= tolerance * np.maximum(at, 1.0))
+        active = active[~converged]
+    with np.errstate(divide="ignore"):
+        rate = np.where(done, np.nan, 1 / x - 1)
+    # Rows still going after max_iterations have no rate
+    rate[active] = np.nan
+    return rate, iterations
+
+
+def npv(flows, discount_rate):
+    """Net present value of each row of ``flows`` at ``discount_rate`` (a scalar or one per row)."""
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+    rate = np.asarray(discount_rate, dtype=float).reshape(-1, 1)
+    return (flows / (1 + rate) ** np.arange(flows.shape[1])).sum(axis=1)
+
+
+def discounted_payback(flows, discount_rate):
+    """Years until the discounted flows add up to zero, interpolated within the year; NaN if they never do."""
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+    rate = np.asarray(discount_rate, dtype=float).reshape(-1, 1)
+    discounted = flows / (1 + rate) ** np.arange(flows.shape[1])
+    total = np.cumsum(discounted, axis=1)
+    paid = total >= 0
+    # First year the running total reaches zero, and how far into it
+    year = np.argmax(paid, axis=1)
+    rows = np.arange(len(flows))
+    short = -total[rows, np.maximum(year - 1, 0)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payback = np.where(year > 0, year - 1 + short / discounted[rows, year], 0.0)
+    return np.where(paid.any(axis=1), payback, np.nan)
+
+
+def cash_flows(data, results, years=20, degradation=0.005, inflation=0.05,
+               battery_life_years=default_lifetimes["battery"], converter_life_years=default_lifetimes["inverter"]):
+    """Yearly project and owner cash flows in USD, each shape ``(scenarios, years + 1)``.
+
+    ``data`` holds the ``Scenario`` columns and ``results`` their
+    ``evaluate_batch`` output. The options are scalars or one per scenario.
+    Returns ``(project, equity)``.
+    """
+    if not 1 <= years <= 50:
+        raise ValueError(f"years must be 1-50, got {years!r}")
+    n = len(results["recommended_solar_size"])
+    column = {name: np.broadcast_to(np.asarray(data.get(name, Scenario._field_defaults[name]), dtype=float), n)
+              for name in ("operating_days", "daily_operating_cost", "sun_hours", "install_multiplier",
+                           "system_efficiency")}
+    degradation, inflation, battery_life_years, converter_life_years = (
+        np.broadcast_to(np.asarray(v, dtype=float), n)[:, None]
+        for v in (degradation, inflation, battery_life_years, converter_life_years)
+    )
+    if (battery_life_years <= 0).any() or (converter_life_years <= 0).any():
+        raise ValueError("Battery and converter lifetimes must be positive")
+    t = np.arange(1, years + 1)
+
+    # Share of the runtime the degraded array still covers
+    energy_production = results["energy_production"][:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covered = (results["recommended_solar_size"][:, None] * column["sun_hours"][:, None]
+                   * (1 - degradation) ** (t - 1) / energy_production)
+    share = np.where(energy_production > 0, np.minimum(covered, 1.0), 1.0)
+    escalation = (1 + inflation) ** (t - 1)
+    operating_days = column["operating_days"][:, None]
+    income = results["income_per_day"][:, None] * share * operating_days * escalation
+    operating_cost = column["daily_operating_cost"][:, None] * operating_days * escalation
+
+    # Replacements at today's installed price, inflated, never in the last year
+    install = column["install_multiplier"][:, None]
+    converter_cost = (results["inverter_cost"] + results["controller_cost"])[:, None]
+    replace_battery = (t % np.rint(battery_life_years) == 0) & (t < years)
+    replace_converter = (t % np.rint(converter_life_years) == 0) & (t < years)
+    replacements = (replace_battery * results["battery_cost"][:, None]
+                    + replace_converter * converter_cost) * install * (1 + inflation) ** t
+
+    operating = income - operating_cost - replacements
+    project = np.concatenate([-results["total_after_subsidy"][:, None], operating], axis=1)
+    # The loan is paid monthly from the first month
+    months = results["months"][:, None]
+    months_paid = np.clip(months - 12 * (t - 1), 0, 12)
+    repayments = results["monthly_repayment_usd"][:, None] * months_paid
+    equity = np.concatenate([-results["deposit_amount"][:, None], operating - repayments], axis=1)
+    return project, equity
+
+
+def lifetime_columns(data, results, years=20, discount_rate=0.10, **options):
+    """NPV, IRR and discounted payback over ``years`` for evaluated scenarios.
+
+    ``options`` go to ``cash_flows``. Returns ``npv``, ``irr``,
+    ``irr_iterations``, ``discounted_payback_years``, ``equity_npv``,
+    ``equity_irr``, ``lifetime_net_cash`` (undiscounted project total) and
+    the ``project_cash_flows`` and ``equity_cash_flows`` themselves. Rates
+    are fractions; NaN where there is none.
+    """
+    project, equity = cash_flows(data, results, years, **options)
+    n = len(project)
+    rate = np.broadcast_to(np.asarray(discount_rate, dtype=float), n)
+    project_irr, iterations = irr(project)
+    equity_irr, equity_iterations = irr(equity)
+    return {
+        "npv": npv(project, rate),
+        "irr": project_irr,
+        "irr_iterations": iterations,
+        "discounted_payback_years": discounted_payback(project, rate),
+        "equity_npv": npv(equity, rate),
+        "equity_irr": equity_irr,
+        "equity_irr_iterations": equity_iterations,
+        "lifetime_net_cash": project.sum(axis=1),
+        "project_cash_flows": project,
+        "equity_cash_flows": equity,
+    }
+
+
+def evaluate_lifetime(data, **options):
+    """``evaluate_batch`` plus the ``lifetime_columns``; ``options`` as for ``lifetime_columns``."""
+    results = evaluate_batch(data)
+    results.update(lifetime_columns(data, results, **options))
+    return results
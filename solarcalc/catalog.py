@@ -0,0 +1,229 @@
+"""Appliance catalog in a local SQLite database.
+
+"Pick from Database" and ``--appliance`` presets read from here. The
+catalog is one SQLite file with an ``appliances`` table, indexed on
+category, power and price for the picker's filters. Names are unique and
+case-insensitive, and whole-number speeds and prices come back as ints.
+An FTS5 table over name and category answers type-ahead searches by word
+prefix ("rice hul" finds "Rice Huller 5kW"), so searches
+stay in the low milliseconds with tens of thousands of rows. The file is
+opened read-only on the first query and the connection is shared by every
+session in the process. Without a catalog file the built-in mills are
+served from memory.
+
+Build a catalog from a CSV with ``name``, ``category``, ``power`` (kW),
+``processing_speed`` (kg/hr) and ``price_usd`` columns:
+
+    python -m solarcalc.catalog build appliances.csv
+    python -m solarcalc.catalog search "rice hul" --max-power 5
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import threading
+from functools import lru_cache
+from typing import NamedTuple
+
+
+class Appliance(NamedTuple):
+    name: str
+    category: str
+    power: float  # kW
+    processing_speed: float  # kg/hr
+    price_usd: float
+
+
+builtin_appliances = [
+    Appliance("Mill 2kW", "Mill", 2.0, 100, 600),
+    Appliance("Mill 3kW", "Mill", 3.0, 150, 800),
+]
+schema = """
+CREATE TABLE appliances (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    category TEXT NOT NULL COLLATE NOCASE,
+    power REAL NOT NULL,
+    processing_speed NUMERIC NOT NULL,
+    price_usd NUMERIC NOT NULL
+);
+CREATE INDEX appliances_category ON appliances (category, power);
+CREATE INDEX appliances_power ON appliances (power);
+CREATE INDEX appliances_price ON appliances (price_usd);
+"""
+fts_schema = """
+CREATE VIRTUAL TABLE appliances_fts USING fts5(name, category, content='appliances', content_rowid='id');
+INSERT INTO appliances_fts (appliances_fts) VALUES ('rebuild');
+"""
+columns = Appliance._fields
+
+default_catalog_path = os.environ.get(
+    "SOLAR_APPLIANCE_CATALOG",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "solar_calculator", "appliances.sqlite")
+)
+
+
+def _fill(conn, appliances):
+    conn.executescript(schema)
+    conn.executemany(f"INSERT INTO appliances ({', '.join(columns)}) VALUES (?, ?, ?, ?, ?)", appliances)
+    try:
+        conn.executescript(fts_schema)
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: searches fall back to LIKE
+        pass
+
+
+def validate(row):
+    """An ``Appliance`` from a mapping of column name to text or number; ``ValueError`` if it is unusable."""
+    missing = [name for name in columns if row.get(name) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)} for {row.get('name') or 'unnamed appliance'}")
+    try:
+        power, processing_speed, price_usd = (float(row[name]) for name in columns[2:])
+    except ValueError:
+        raise ValueError(f"power, processing_speed and price_usd must be numbers for {row['name']}") from None
+    if not power > 0 or processing_speed < 0 or price_usd < 0:
+        raise ValueError(f"power must be positive and speed and price non-negative for {row['name']}")
+    return Appliance(str(row["name"]).strip(), str(row["category"]).strip(), power, processing_speed, price_usd)
+
+
+def build_catalog(path, appliances):
+    """Write a new catalog file at ``path`` from ``Appliance`` rows, replacing any existing one.
+
+    The file is built next to ``path`` and moved into place, so open
+    catalogs keep reading the old file. Returns the number of rows.
+    """
+    appliances = list(appliances)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        with conn:
+            _fill(conn, appliances)
+        conn.execute("ANALYZE")
+    except sqlite3.IntegrityError as e:
+        conn.close()
+        os.remove(tmp)
+        raise ValueError(f"Duplicate appliance names: {e}") from None
+    conn.close()
+    os.replace(tmp, path)
+    return len(appliances)
+
+
+def read_csv(path):
+    """``Appliance`` rows from a CSV file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [validate(row) for row in csv.DictReader(f)]
+
+
+class ApplianceCatalog:
+    """Read-only queries against a catalog file, or the built-in mills when there is none."""
+
+    def __init__(self, path=default_catalog_path):
+        self.path = path
+        self._conn = None
+        self._fts = False
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                if os.path.exists(self.path):
+                    conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+                else:
+                    conn = sqlite3.connect(":memory:", check_same_thread=False)
+                    _fill(conn, builtin_appliances)
+                self._fts = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'appliances_fts'"
+                ).fetchone() is not None
+                self._conn = conn
+            return self._conn
+
+    def _query(self, sql, params=()):
+        conn = self._connection()
+        with self._lock:
+            return conn.execute(sql, params).fetchall()
+
+    def get(self, name):
+        """The appliance called ``name`` (any case), or None."""
+        rows = self._query(f"SELECT {', '.join(columns)} FROM appliances WHERE name = ?", (str(name).strip(),))
+        return Appliance(*rows[0]) if rows else None
+
+    def categories(self):
+        return [row[0] for row in self._query("SELECT DISTINCT category FROM appliances ORDER BY category")]
+
+    def search(self, text="", category=None, min_power=None, max_power=None, max_price=None, limit=100):
+        """Appliances matching every word of ``text`` and the filters, by name, at most ``limit``.
+
+        Words match the start of any word in the name or category; without
+        FTS5 they match anywhere in the name.
+        """
+        where, params = [], []
+        words = str(text).split()
+        self._connection()
+        if words and self._fts:
+            where.append("id IN (SELECT rowid FROM appliances_fts WHERE appliances_fts MATCH ?)")
+            params.append(" ".join('"{}"*'.format(word.replace('"', '""')) for word in words))
+        else:
+            for word in words:
+                where.append("name LIKE ? ESCAPE '\\'")
+                params.append("%{}%".format(word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")))
+        for clause, value in (("category = ?", category), ("power >= ?", min_power), ("power <= ?", max_power),
+                              ("price_usd <= ?", max_price)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        sql = f"SELECT {', '.join(columns)} FROM appliances"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self._query(sql + " ORDER BY name LIMIT ?", (*params, limit))
+        return [Appliance(*row) for row in rows]
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM appliances")[0][0]
+
+
+@lru_cache(maxsize=None)
+def get_catalog(path=default_catalog_path):
+    """The process-wide catalog for ``path``; nothing is read until the first query."""
+    return ApplianceCatalog(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m solarcalc.catalog",
+                                     description="Build or search the appliance catalog.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write the catalog from a CSV")
+    build.add_argument("input", help="CSV with name, category, power, processing_speed and price_usd")
+    build.add_argument("output", nargs="?", default=default_catalog_path,
+                       help=f"catalog file to write (default: {default_catalog_path})")
+    search = commands.add_parser("search", help="list matching appliances")
+    search.add_argument("text", nargs="?", default="")
+    search.add_argument("--catalog", default=default_catalog_path, help="catalog file")
+    search.add_argument("--category")
+    search.add_argument("--max-power", type=float, help="kW")
+    search.add_argument("--max-price", type=float, help="USD")
+    search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            rows = build_catalog(args.output, read_csv(args.input))
+            print(f"{args.output}: {rows:,} appliances")
+        else:
+            found = ApplianceCatalog(args.catalog).search(args.text, args.category, max_power=args.max_power,
+                                                          max_price=args.max_price, limit=args.limit)
+            for item in found:
+                print(f"{item.name}\t{item.category}\t{item.power:g} kW\t{item.processing_speed:g} kg/hr\t"
+                      f"{item.price_usd:g} USD")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
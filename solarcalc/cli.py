@@ -0,0 +1,133 @@
+"""Command-line calculator: ``python -m solarcalc``.
+
+Reads scenarios from flags, a JSON string or a JSON / JSON Lines file and
+prints the results in USD. Inputs use the same names and units as the
+portfolio files. Only the standard library and the plain-Python engine are
+imported, so a run starts in a few tens of milliseconds; pandas is imported
+only for ``--format csv`` and ``--format table``.
+
+    python -m solarcalc --appliance "Mill 2kW" --system AC
+    python -m solarcalc --json '{"power": 3, "processing_speed": 150, "price_usd": 800, "system": "DC"}'
+    python -m solarcalc --input sites.jsonl --format csv --output results.csv
+"""
+import argparse
+import json
+import sys
+
+from solarcalc.engine import evaluate
+from solarcalc.inputs import input_defaults, to_scenario
+
+formats = ("json", "jsonl", "text", "csv", "table")
+preset_fields = ("power", "processing_speed", "price_usd")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m solarcalc",
+        description="Size a solar system for a productive-use appliance and check loan viability.",
+        epilog="Flags override the same field in every scenario read from --json or --input. "
+               "--appliance presets come from the appliance catalog: see python -m solarcalc.catalog search.",
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--json", metavar="TEXT", help="scenario object, or a list of them, as JSON")
+    source.add_argument("--input", metavar="PATH", help="JSON or JSON Lines file of scenarios ('-' for stdin)")
+    parser.add_argument("--format", choices=formats, default="json", help="output format (default: json)")
+    parser.add_argument("--output", metavar="PATH", help="write results here instead of stdout")
+
+    fields = parser.add_argument_group("scenario fields", "interest_rate and install_increase are percentages")
+    for name, default in input_defaults.items():
+        if name in ("appliance", "system"):
+            kind = str
+        elif name in ("operating_days", "loan_term_years"):
+            kind = int
+        else:
+            kind = float
+        if name in preset_fields:
+            shown = "required unless --appliance is in the catalog"
+        elif default is None:
+            shown = "required"
+        else:
+            shown = f"default {default}" if default != "" else "preset or label"
+        fields.add_argument(f"--{name.replace('_', '-')}", dest=name, type=kind, metavar=kind.__name__.upper(),
+                            help=shown)
+    return parser
+
+
+def read_scenarios(args):
+    """Input mappings from ``--json`` / ``--input``, or one empty mapping."""
+    if args.json is not None:
+        text = args.json
+    elif args.input == "-":
+        text = sys.stdin.read()
+    elif args.input is not None:
+        with open(args.input, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        return [{}]
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # JSON Lines: one object per non-blank line
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise ValueError("expected a JSON object or a list of objects")
+    return data
+
+
+def evaluate_inputs(items, overrides):
+    """One output row per input mapping: the appliance name, if any, then every ``Result`` field."""
+    rows = []
+    for number, item in enumerate(items, 1):
+        values = dict(item, **overrides)
+        try:
+            result = evaluate(to_scenario(values))
+        except ValueError as e:
+            raise ValueError(f"scenario {number}: {e}") from None
+        rows.append(dict(appliance=values.get("appliance", ""), **result._asdict()))
+    if not any(row["appliance"] for row in rows):
+        for row in rows:
+            del row["appliance"]
+    return rows
+
+
+def write_rows(rows, output_format, out):
+    if output_format == "json":
+        json.dump(rows[0] if len(rows) == 1 else rows, out, indent=2)
+        out.write("\n")
+    elif output_format == "jsonl":
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+    elif output_format == "text":
+        for number, row in enumerate(rows):
+            if number:
+                out.write("\n")
+            for name, value in row.items():
+                out.write(f"{name:<34} {value}\n")
+    else:
+        import pandas as pd
+
+        df = pd.DataFrame(rows)
+        if output_format == "csv":
+            df.to_csv(out, index=False)
+        else:
+            out.write(df.to_string(index=False) + "\n")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    overrides = {name: getattr(args, name) for name in input_defaults if getattr(args, name) is not None}
+    try:
+        rows = evaluate_inputs(read_scenarios(args), overrides)
+    except (OSError, ValueError) as e:
+        parser.exit(2, f"{parser.prog}: error: {e}\n")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            write_rows(rows, args.format, out)
+    else:
+        write_rows(rows, args.format, sys.stdout)
+    return 0
@@ -0,0 +1,309 @@
+"""Bills of materials from a component price catalog.
+
+The engine prices every system with one 500 W panel and flat per-kW and
+per-kWh rates. ``select_components`` instead sizes the scenario with each
+panel, battery and inverter (AC) or charge controller (DC) in a catalog
+and ranks every feasible combination:
+
+* panels: enough of the model to meet the daily energy production
+* batteries: enough modules for the engine's battery capacity as usable
+  energy, after depth of discharge
+* inverters cover the larger of the array and the appliance; controllers
+  cover the array
+* a combination is feasible when no part needs more than its
+  ``max_units`` in parallel and the battery and converter voltages match
+  (0 means any voltage)
+
+Quantities depend only on the panel (array size) and on each part alone,
+so the cost of every combination is a broadcast sum of three small arrays.
+Panels are taken in chunks to bound memory, keeping a running top list, so
+a catalog of a few hundred of each kind ranks in well under a second.
+Rankings are cached per normalized scenario.
+
+"cost" ranks by equipment cost. "value" ranks by equipment cost per year
+over ``value_horizon_years``, buying each part again when its lifetime runs
+out, so long-lived batteries can win over cheap ones.
+
+A catalog is a CSV with ``kind`` (panel, battery, inverter or controller),
+``name``, ``rating`` (kW, or kWh for batteries) and ``price_usd`` columns,
+and optionally ``voltage``, ``depth_of_discharge``, ``lifetime_years`` and
+``max_units``.
+"""
+import csv
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from solarcalc.engine import (
+    Costs,
+    Result,
+    Sizing,
+    apply_subsidy,
+    assess_viability,
+    finance_loan,
+    normalize,
+    size_system,
+)
+
+kinds = ("panel", "battery", "inverter", "controller")
+value_horizon_years = 20
+chunk_elements = 1_000_000
+objectives = ("cost", "value")
+# Lifetime (years) for catalog rows that leave it blank
+default_lifetimes = {"panel": 25, "battery": 5, "inverter": 10, "controller": 10}
+
+# Typical parts for a small productive-use system. The prices are rough
+# guides, not quotes; load a supplier catalog for real sizing.
+builtin_components = [
+    ("panel", "Mono 300W", 0.30, 33, 0, 1.0, 25, 0),
+    ("panel", "Mono 450W", 0.45, 46, 0, 1.0, 25, 0),
+    ("panel", "Mono 500W", 0.50, 50, 0, 1.0, 25, 0),
+    ("panel", "Bifacial 550W", 0.55, 62, 0, 1.0, 25, 0),
+    ("battery", "Lead-acid 12V 200Ah", 2.4, 330, 12, 0.5, 4, 8),
+    ("battery", "Lead-acid 24V 200Ah", 4.8, 640, 24, 0.5, 4, 8),
+    ("battery", "LFP 24V 100Ah", 2.56, 700, 24, 0.9, 10, 8),
+    ("battery", "LFP 48V 100Ah", 5.12, 1350, 48, 0.9, 10, 8),
+    ("inverter", "Inverter 1kW 12V", 1.0, 120, 12, 1.0, 10, 2),
+    ("inverter", "Inverter 3kW 24V", 3.0, 300, 24, 1.0, 10, 3),
+    ("inverter", "Inverter 5kW 48V", 5.0, 480, 48, 1.0, 10, 6),
+    ("controller", "MPPT 1kW 12V", 1.0, 60, 12, 1.0, 10, 4),
+    ("controller", "MPPT 2.5kW 24V", 2.5, 130, 24, 1.0, 10, 4),
+    ("controller", "MPPT 5kW 48V", 5.0, 230, 48, 1.0, 10, 6),
+]
+component_fields = ("kind", "name", "rating", "price_usd", "voltage", "depth_of_discharge", "lifetime_years",
+                    "max_units")
+
+default_components_path = os.environ.get(
+    "SOLAR_COMPONENT_CATALOG",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "solar_calculator", "components.csv")
+)
+
+
+class Parts(NamedTuple):
+    """One kind of component as arrays; ``max_units`` is inf where unlimited."""
+    name: np.ndarray
+    rating: np.ndarray
+    price_usd: np.ndarray
+    voltage: np.ndarray
+    depth_of_discharge: np.ndarray
+    lifetime_years: np.ndarray
+    max_units: np.ndarray
+
+
+class Bill(NamedTuple):
+    """One bill of materials; costs in USD, ``annual_cost`` per year of service."""
+    panel: str
+    panels: int
+    array_kw: float
+    battery: str
+    batteries: int
+    storage_kwh: float
+    converter: str
+    converters: int
+    panel_cost: float
+    battery_cost: float
+    converter_cost: float
+    equipment_cost: float
+    annual_cost: float
+
+
+# Stand-in when the catalog has no parts of the kind the system needs: never any units, no cost
+no_converter = Parts(np.array(["None"], dtype=object), np.full(1, np.inf), np.zeros(1), np.zeros(1), np.ones(1),
+                     np.ones(1), np.full(1, np.inf))
+
+
+class ComponentCatalog:
+    """Component rows grouped by kind, as ``Parts`` arrays."""
+
+    def __init__(self, rows):
+        rows = [validate(row) for row in rows]
+        self.parts = {}
+        for kind in kinds:
+            chosen = [row for row in rows if row[0] == kind]
+            columns = list(zip(*chosen)) if chosen else [()] * len(component_fields)
+            self.parts[kind] = Parts(
+                np.array(columns[1], dtype=object),
+                *(np.array(values, dtype=float) for values in columns[2:7]),
+                np.where(np.array(columns[7], dtype=float) > 0, np.array(columns[7], dtype=float), np.inf),
+            )
+        missing = [kind for kind in ("panel", "battery") if not len(self.parts[kind].name)]
+        if missing:
+            raise ValueError(f"The catalog has no {' or '.join(missing)} rows")
+
+    def __len__(self):
+        return sum(len(parts.name) for parts in self.parts.values())
+
+
+def validate(row):
+    """A component tuple in ``component_fields`` order from a tuple or mapping; ``ValueError`` if unusable."""
+    if not isinstance(row, dict):
+        row = dict(zip(component_fields, row))
+    kind = str(row.get("kind", "")).strip().lower()
+    if kind not in kinds:
+        raise ValueError(f"kind must be one of {', '.join(kinds)}, got {row.get('kind')!r}")
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError(f"Every {kind} needs a name")
+
+    def number(field, default):
+        value = row.get(field)
+        if value in (None, ""):
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{field} must be a number for {name}") from None
+
+    rating = number("rating", 0.0)
+    price = number("price_usd", -1.0)
+    depth = number("depth_of_discharge", 1.0)
+    lifetime = number("lifetime_years", default_lifetimes[kind])
+    if not rating > 0 or price < 0 or not 0 < depth <= 1 or not lifetime > 0:
+        raise ValueError(f"{name} needs a positive rating and lifetime, a price and a depth of discharge in (0, 1]")
+    return (kind, name, rating, price, number("voltage", 0.0), depth, lifetime, number("max_units", 0.0))
+
+
+def read_components(path):
+    """Component rows from a CSV file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [validate(row) for row in csv.DictReader(f)]
+
+
+@lru_cache(maxsize=None)
+def get_components(path=default_components_path):
+    """The process-wide catalog read from ``path``, or the built-in parts when there is no file."""
+    if os.path.exists(path):
+        return ComponentCatalog(read_components(path))
+    return ComponentCatalog(builtin_components)
+
+
+def _quantities(need, parts):
+    """Units of each part needed for ``need`` (any shape), with a trailing parts axis."""
+    need = np.asarray(need, dtype=float)[..., None]
+    return np.where(need > 0, np.ceil(need / (parts.rating * parts.depth_of_discharge)), 0.0)
+
+
+def _annual(parts, units):
+    return units * parts.price_usd * np.ceil(value_horizon_years / parts.lifetime_years) / value_horizon_years
+
+
+def _top(totals, offset, top, best):
+    """Merge the ``top`` smallest finite entries of ``totals`` (flattened, indices + ``offset``) into ``best``."""
+    flat = totals.ravel()
+    k = min(top, flat.size)
+    if k == 0:
+        return best
+    idx = np.argpartition(flat, k - 1)[:k]
+    idx = idx[np.isfinite(flat[idx])]
+    costs = np.concatenate([best[0], flat[idx]])
+    positions = np.concatenate([best[1], idx + offset])
+    order = np.lexsort((positions, costs))[:top]
+    return costs[order], positions[order]
+
+
+def _rank(catalog, s, objective, top):
+    sizing = size_system(s.power, s.processing_speed, s.runtime_per_day, s.system_efficiency, s.sun_hours,
+                         s.battery_hours)
+    panels = catalog.parts["panel"]
+    batteries = catalog.parts["battery"]
+    converters = catalog.parts["inverter" if s.system == "AC" else "controller"]
+
+    # Panels: count and array size per model
+    panel_units = np.ceil(sizing.energy_production / (panels.rating * s.sun_hours))
+    array_kw = panel_units * panels.rating
+    panel_ok = panel_units <= panels.max_units
+    # Batteries: modules for the engine's capacity as usable energy; no battery means no voltage to match
+    needs_battery = sizing.battery_capacity > 0
+    battery_units = _quantities(sizing.battery_capacity, batteries)
+    battery_ok = battery_units <= batteries.max_units
+    # Converters: sized per panel model, shape (panels, converters); an inverter also carries the coincident peak
+    converter_need = np.maximum(array_kw, max(s.power, s.peak_power)) if s.system == "AC" else array_kw
+    if not len(converters.name):
+        # A catalog without this kind prices it at zero, like the engine for other system types
+        converters = no_converter
+    converter_units = _quantities(converter_need, converters)
+    converter_ok = converter_units <= converters.max_units
+    voltage_ok = ((batteries.voltage[:, None] == converters.voltage) | (batteries.voltage[:, None] == 0)
+                  | (converters.voltage == 0) | (not needs_battery))
+
+    if objective == "cost":
+        panel_cost = panel_units * panels.price_usd
+        battery_cost = battery_units * batteries.price_usd
+        converter_cost = converter_units * converters.price_usd
+    else:
+        panel_cost = _annual(panels, panel_units)
+        battery_cost = _annual(batteries, battery_units)
+        converter_cost = _annual(converters, converter_units)
+    panel_cost = np.where(panel_ok, panel_cost, np.inf)
+    battery_cost = np.where(battery_ok, battery_cost, np.inf)
+    converter_cost = np.where(converter_ok, converter_cost, np.inf)
+    pair_cost = np.where(voltage_ok, battery_cost[:, None], np.inf)
+    if not needs_battery:
+        # Every battery costs nothing; keep one so the ranking is not the same system repeated
+        pair_cost[1:] = np.inf
+
+    nb, nc = pair_cost.shape
+    step = max(1, chunk_elements // max(nb * nc, 1))
+    best = (np.empty(0), np.empty(0, dtype=np.int64))
+    for start in range(0, len(panels.name), step):
+        rows = slice(start, start + step)
+        totals = (panel_cost[rows, None, None] + pair_cost[None, :, :]) + converter_cost[rows, None, :]
+        best = _top(totals, start * nb * nc, top, best)
+
+    bills = []
+    for position in best[1].tolist():
+        p, rest = divmod(position, nb * nc)
+        b, c = divmod(rest, nc)
+        units = (int(panel_units[p]), int(battery_units[b]), int(converter_units[p, c]))
+        costs = (units[0] * float(panels.price_usd[p]), units[1] * float(batteries.price_usd[b]),
+                 units[2] * float(converters.price_usd[c]))
+        annual = float(_annual(panels, panel_units)[p] + _annual(batteries, battery_units)[b]
+                       + _annual(converters, converter_units)[p, c])
+        bills.append(Bill(
+            panels.name[p], units[0], float(array_kw[p]),
+            batteries.name[b] if needs_battery else "None", units[1],
+            units[1] * float(batteries.rating[b] * batteries.depth_of_discharge[b]),
+            converters.name[c], units[2],
+            *costs, sum(costs), annual,
+        ))
+    return bills
+
+
+@lru_cache(maxsize=1024)
+def _rank_normalized(catalog, s, objective, top):
+    return tuple(_rank(catalog, s, objective, top))
+
+
+def select_components(s, catalog=None, objective="cost", top=10):
+    """The ``top`` cheapest feasible bills of materials for scenario ``s``, best first.
+
+    ``catalog`` defaults to ``get_components()``. Returns an empty list
+    when no combination is feasible.
+    """
+    if objective not in objectives:
+        raise ValueError(f"objective must be one of {', '.join(objectives)}")
+    return list(_rank_normalized(catalog or get_components(), normalize(s), objective, int(top)))
+
+
+cache_info = _rank_normalized.cache_info
+cache_clear = _rank_normalized.cache_clear
+
+
+def evaluate_bill(s, bill):
+    """``evaluate`` with the system built from ``bill`` instead of the engine's flat prices."""
+    sizing = size_system(s.power, s.processing_speed, s.runtime_per_day, s.system_efficiency, s.sun_hours,
+                         s.battery_hours)
+    sizing = Sizing(sizing.specific_efficiency, sizing.energy_required_per_day, sizing.energy_production,
+                    sizing.production_per_day, bill.panels, bill.panel_cost, bill.array_kw, bill.storage_kwh)
+    inverter_cost = bill.converter_cost if s.system == "AC" else 0
+    controller_cost = bill.converter_cost if s.system == "DC" else 0
+    fob_subtotal_usd = s.price_usd + bill.equipment_cost
+    costs = Costs(inverter_cost, controller_cost, bill.battery_cost, fob_subtotal_usd,
+                  fob_subtotal_usd * (s.install_multiplier - 1), fob_subtotal_usd * s.install_multiplier)
+    capital = apply_subsidy(s.subsidy_percentage, s.deposit_percentage, costs)
+    loan = finance_loan(s.loan_term_years, s.interest_rate, capital)
+    viability = assess_viability(s.income_per_kg, s.processing_speed, s.operating_days, s.daily_operating_cost,
+                                 s.deposit_percentage, s.runtime_share, sizing, capital, loan)
+    return Result(*sizing, *costs, *capital, *loan, *viability)
@@ -0,0 +1,275 @@
+"""Hour-by-hour simulation of PV output, mill load and battery charge for one year.
+
+Sizing works from one ``sun_hours`` figure and a battery of
+``recommended_solar_size * battery_hours``. ``simulate_dispatch`` checks
+that sizing against a year of 8760 hours instead:
+
+* PV output follows a half-sine between sunrise and sunset, scaled so each
+  day yields that day's sun hours. Days vary around the average with a
+  seeded gamma "clearness" factor whose mean over each month is exactly 1. With a
+  monthly sun-hour profile each day takes its month's sun hours.
+* The mill draws its rated power for ``runtime_per_day`` hours from
+  ``start_hour`` on ``operating_days`` days spread evenly over the year.
+* PV serves the load first. Surplus charges the battery and anything the
+  battery cannot take is curtailed. Shortfalls come out of the battery and
+  anything it cannot cover is unmet load.
+
+Every site is a column of ``(8760, sites)`` arrays, so PV, load and all the
+yearly totals are plain array arithmetic. Only the state of charge is a
+recursion, a running sum clipped to the battery at every hour. Clipped
+running sums compose, so for a few sites it is a prefix scan over the
+hours in log2(8760) = 14 array passes. For many sites a loop over the
+hours with each step vectorized across sites moves far less memory and is
+faster, so the recursion switches to that above ``scan_sites``. Sites go
+through in chunks of ``chunk_size`` to bound memory.
+
+The battery that would have met every hour follows from the same
+recursion without an upper limit: it is the deepest the battery is ever
+drawn below full.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from solarcalc.seasonal import day_month, month_days
+
+hours_per_day = 24
+days_per_year = 365
+hours_per_year = hours_per_day * days_per_year
+sunrise = 6.0
+sunset = 18.0
+# An hour counts as unmet when more than this much of its load (kWh) is not served
+unmet_tolerance = 1e-9
+scan_sites = 16
+chunk_size = 512
+
+
+class Hourly(NamedTuple):
+    """Hourly flows in kWh, shape ``(8760, sites)``; ``soc`` is the charge at the end of each hour."""
+    pv: np.ndarray
+    load: np.ndarray
+    soc: np.ndarray
+    unmet: np.ndarray
+    curtailed: np.ndarray
+
+
+class Dispatch(NamedTuple):
+    """Yearly totals per site (arrays of length ``sites``); energy in kWh.
+
+    ``battery_kwh`` and ``required_battery_kwh`` are nameplate capacity;
+    only ``depth_of_discharge`` of it is used. ``hourly`` is only filled in
+    when asked for.
+    """
+    pv_kwh: np.ndarray
+    load_kwh: np.ndarray
+    served_kwh: np.ndarray
+    unmet_kwh: np.ndarray
+    curtailed_kwh: np.ndarray
+    operating_hours: np.ndarray
+    unmet_hours: np.ndarray
+    load_served_pct: np.ndarray
+    battery_kwh: np.ndarray
+    required_battery_kwh: np.ndarray
+    hourly: Optional[Hourly] = None
+
+
+def pv_shape():
+    """Share of a day's PV energy in each hour: the half-sine integrated over the hour."""
+    h = np.arange(hours_per_day, dtype=float)
+    start = np.clip(h, sunrise, sunset)
+    end = np.clip(h + 1, sunrise, sunset)
+    angle = np.pi / (sunset - sunrise)
+    shape = np.cos(angle * (start - sunrise)) - np.cos(angle * (end - sunrise))
+    return shape / shape.sum()
+
+
+def load_shape(start_hour, runtime_per_day):
+    """Fraction of each hour the mill runs, shape ``(24, sites)``; runs past midnight wrap round."""
+    start = np.asarray(start_hour, dtype=float) % hours_per_day
+    end = start + np.clip(runtime_per_day, 0, hours_per_day)
+    h = np.arange(2 * hours_per_day, dtype=float)[:, None]
+    overlap = np.clip(np.minimum(h + 1, end) - np.maximum(h, start), 0, 1)
+    return overlap[:hours_per_day] + overlap[hours_per_day:]
+
+
+def operating_calendar(operating_days):
+    """Which days the mill runs, shape ``(365, sites)``, spread as evenly as whole days allow."""
+    days = np.clip(np.rint(operating_days), 0, days_per_year)
+    d = np.arange(days_per_year, dtype=float)[:, None]
+    return np.floor((d + 1) * days / days_per_year) > np.floor(d * days / days_per_year)
+
+
+def clearness(sites, variability, rng):
+    """Daily PV factors, shape ``(365, sites)``, gamma-distributed with coefficient of variation ``variability``.
+
+    Each site's factors are rescaled to average exactly 1 over every month,
+    so monthly PV energy matches the sun hours.
+    """
+    if variability <= 0:
+        return np.ones((days_per_year, sites))
+    k = 1 / variability**2
+    factors = rng.gamma(k, 1 / k, (days_per_year, sites))
+    monthly_mean = np.add.reduceat(factors, np.cumsum(month_days) - month_days, axis=0) / month_days[:, None]
+    return factors / monthly_mean[day_month]
+
+
+def _compose(a, low, high, d):
+    # Map t becomes "map t-d, then map t"; clip(clip(s + a1, l1, h1) + a2, l2, h2)
+    # is clip(s + a1 + a2, clip(l1 + a2, l2, h2), clip(h1 + a2, l2, h2))
+    a2, l2, h2 = a[d:], low[d:], high[d:]
+    new_a = a[:-d] + a2
+    new_low = np.clip(low[:-d] + a2, l2, h2)
+    new_high = np.clip(high[:-d] + a2, l2, h2)
+    a[d:], low[d:], high[d:] = new_a, new_low, new_high
+
+
+def clipped_cumsum(steps, start, low, high):
+    """``s[t] = clip(s[t-1] + steps[t], low, high)`` along axis 0, from ``s[-1] = start``.
+
+    ``steps`` has shape ``(hours, sites)``; ``start``, ``low`` and ``high``
+    are per site and ``high`` may be infinite.
+    """
+    hours, sites = steps.shape
+    start, low, high = (np.broadcast_to(np.asarray(v, dtype=float), (sites,)) for v in (start, low, high))
+    if sites <= scan_sites:
+        a = steps.astype(float)
+        lo = np.repeat(low[None, :], hours, axis=0)
+        hi = np.repeat(high[None, :], hours, axis=0)
+        d = 1
+        while d < hours:
+            _compose(a, lo, hi, d)
+            d *= 2
+        return np.clip(start + a, lo, hi)
+    out = np.empty(steps.shape)
+    s = start.copy()
+    for t in range(hours):
+        np.add(s, steps[t], out=s)
+        np.maximum(s, low, out=s)
+        np.minimum(s, high, out=s)
+        out[t] = s
+    return out
+
+
+def _dispatch_chunk(load_day, operating_days, solar_kwp, battery_kwh, sun_hours, system_efficiency, factors,
+                    depth_of_discharge, round_trip_efficiency, hourly):
+    sites = load_day.shape[1]
+    # Sun hours are per site, or per day and site with a monthly profile
+    daily_pv = factors * (sun_hours * solar_kwp * system_efficiency / 100)
+    calendar = operating_calendar(operating_days)
+    pv = (daily_pv[:, None, :] * pv_shape()[None, :, None]).reshape(hours_per_year, sites)
+    load = (calendar[:, None, :] * load_day[None, :, :]).reshape(hours_per_year, sites)
+
+    # Battery flows in stored kWh: charging loses and discharging costs the same share each way.
+    # Without hourly output the PV array is reused for the flows.
+    efficiency = np.sqrt(round_trip_efficiency)
+    usable = np.maximum(battery_kwh, 0) * depth_of_discharge
+    steps = np.subtract(pv, load, out=None if hourly else pv)
+    charging = steps > 0
+    np.multiply(steps, efficiency, out=steps, where=charging)
+    np.divide(steps, efficiency, out=steps, where=~charging)
+    soc = clipped_cumsum(steps, usable, 0.0, usable)
+
+    # Charge before clipping: below zero is unmet load, above the usable capacity is curtailed
+    before = np.empty_like(soc)
+    before[0] = usable
+    before[1:] = soc[:-1]
+    before += steps
+    shortfall = np.minimum(before, 0)
+    unmet_kwh = -shortfall.sum(axis=0) * efficiency
+    unmet_hours = (shortfall * efficiency < -unmet_tolerance).sum(axis=0)
+    excess = np.maximum(before - usable, 0, out=shortfall)
+    curtailed_kwh = excess.sum(axis=0) / efficiency
+
+    # How far below full the battery would ever go if it were big enough
+    deficit = clipped_cumsum(np.negative(steps), 0.0, 0.0, np.inf).max(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        required = np.where(deficit > 0, deficit / depth_of_discharge, 0.0)
+
+    load_kwh = calendar.sum(axis=0) * load_day.sum(axis=0)
+    totals = dict(
+        pv_kwh=daily_pv.sum(axis=0),
+        load_kwh=load_kwh,
+        served_kwh=load_kwh - unmet_kwh,
+        unmet_kwh=unmet_kwh,
+        curtailed_kwh=curtailed_kwh,
+        operating_hours=calendar.sum(axis=0) * (load_day > 0).sum(axis=0),
+        unmet_hours=unmet_hours,
+        required_battery_kwh=required,
+    )
+    if hourly:
+        unmet = np.minimum(before, 0) * -efficiency
+        curtailed = np.maximum(before - usable, 0) / efficiency
+        totals["hourly"] = Hourly(pv, load, soc + battery_kwh - usable, unmet, curtailed)
+    return totals
+
+
+def simulate_dispatch(power, runtime_per_day, operating_days, solar_kwp, battery_kwh, sun_hours,
+                      system_efficiency=80, start_hour=8.0, variability=0.3, depth_of_discharge=0.8,
+                      round_trip_efficiency=0.9, seed=42, hourly=False, monthly_sun_hours=None, load_profile=None):
+    """Simulate a year of hourly dispatch for one or more sites.
+
+    Site inputs may be scalars or equal-length arrays: ``power`` in kW,
+    ``solar_kwp`` and ``battery_kwh`` as sized (``recommended_solar_size``
+    and ``battery_capacity``), ``sun_hours`` the yearly average.
+    ``monthly_sun_hours``, shape ``(sites, 12)`` or ``(12,)``, replaces it
+    with a monthly profile. ``load_profile``, shape ``(24, sites)`` or
+    ``(24,)``, is the kWh drawn in each hour of an operating day; it
+    replaces ``power`` for ``runtime_per_day`` hours from ``start_hour``, for
+    sites with several loads.
+    ``system_efficiency`` (%) derates PV output as in sizing. The battery
+    starts the year full. ``variability`` is the day-to-day spread of PV
+    (0 for every day alike), drawn from a generator seeded with ``seed``.
+    ``hourly=True`` keeps the ``(8760, sites)`` flows, so only ask for it
+    for a handful of sites.
+    """
+    names = ("power", "runtime_per_day", "operating_days", "solar_kwp", "battery_kwh", "sun_hours",
+             "system_efficiency", "start_hour", "depth_of_discharge", "round_trip_efficiency")
+    values = (power, runtime_per_day, operating_days, solar_kwp, battery_kwh, sun_hours, system_efficiency,
+              start_hour, depth_of_discharge, round_trip_efficiency)
+    site = dict(zip(names, np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in values))))
+    if (site["round_trip_efficiency"] <= 0).any() or (site["round_trip_efficiency"] > 1).any():
+        raise ValueError("Round-trip efficiency must be above 0 and at most 1")
+    if (site["depth_of_discharge"] < 0).any() or (site["depth_of_discharge"] > 1).any():
+        raise ValueError("Depth of discharge must be between 0 and 1")
+    if variability < 0:
+        raise ValueError("Variability cannot be negative")
+    sites = len(site["power"])
+    if load_profile is None:
+        load_day = load_shape(site["start_hour"], site["runtime_per_day"]) * site["power"]
+    else:
+        load_day = np.broadcast_to(np.asarray(load_profile, dtype=float).reshape(hours_per_day, -1),
+                                   (hours_per_day, sites))
+    for name in ("power", "runtime_per_day", "start_hour"):
+        del site[name]
+    # One draw for every site up front, so the weather does not depend on the chunking
+    factors = clearness(sites, variability, np.random.default_rng(seed))
+    if monthly_sun_hours is not None:
+        profile = np.broadcast_to(np.asarray(monthly_sun_hours, dtype=float), (sites, 12))
+        site["sun_hours"] = profile[:, day_month].T
+
+    parts = []
+    # At least one pass, so an empty portfolio still gives empty arrays
+    for start in range(0, max(sites, 1), chunk_size):
+        rows = slice(start, start + chunk_size)
+        parts.append(_dispatch_chunk(load_day=load_day[:, rows], factors=factors[:, rows], hourly=hourly,
+                                     **{name: v[..., rows] for name, v in site.items()}))
+    fields = {name: np.concatenate([part[name] for part in parts]) for name in parts[0] if name != "hourly"}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fields["load_served_pct"] = np.where(fields["load_kwh"] > 0,
+                                             100 * fields["served_kwh"] / fields["load_kwh"], 100.0)
+    fields["battery_kwh"] = site["battery_kwh"].copy()
+    if hourly:
+        fields["hourly"] = Hourly(*(np.concatenate([part["hourly"][i] for part in parts], axis=1)
+                                    for i in range(len(Hourly._fields))))
+    return Dispatch(**fields)
+
+
+def dispatch_scenario(scenario, result, **options):
+    """``simulate_dispatch`` for one evaluated scenario, sized as the calculator sizes it.
+
+    ``options`` go to ``simulate_dispatch``.
+    """
+    return simulate_dispatch(
+        scenario.power, scenario.runtime_per_day, scenario.operating_days, result.recommended_solar_size,
+        result.battery_capacity, scenario.sun_hours, scenario.system_efficiency, **options
+    )
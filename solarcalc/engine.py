@@ -0,0 +1,302 @@
+"""Sizing and finance engine for the Solar Productive Use Calculator.
+
+Everything in here is plain Python: no Streamlit, no network, no pandas.
+``evaluate`` takes a ``Scenario`` and returns a ``Result`` with every derived
+value shown on the results tabs, all in USD. Currency conversion is left to
+the caller. ``evaluate_cached`` memoizes results process-wide, so every
+session asking for the same scenario shares one entry.
+"""
+import math
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Panel specs
+panel_wattage_kw = 0.5  # 500W
+panel_cost = 50
+
+# Balance-of-system prices (USD)
+inverter_cost_per_kw = 100    # AC systems
+controller_cost_per_kw = 50   # DC systems
+battery_cost_per_kwh = 300
+
+
+class Scenario(NamedTuple):
+    """Inputs collected by the input expander.
+
+    ``interest_rate`` is a fraction (0.15 for 15%) and ``install_multiplier``
+    is ``1 + install_increase / 100``, matching what the app stores in
+    session state. ``peak_power`` is the most load running at once when
+    several appliances share the system; an AC inverter is sized to carry it
+    when it is above the array size. 0 sizes the inverter to the array.
+    ``runtime_share`` is the share of the daily runtime the array covers
+    over a year, weighted by days; it is below 1 when ``sun_hours`` is a
+    design month sunnier than the worst, and scales the income.
+    """
+    power: float                    # kW
+    processing_speed: float         # kg/hour
+    price_usd: float
+    system: str                     # "AC" or "DC"
+    runtime_per_day: float = 4.0
+    operating_days: int = 250
+    income_per_kg: float = 0.036
+    sun_hours: float = 4.0
+    system_efficiency: float = 80
+    battery_hours: float = 1
+    daily_operating_cost: float = 10.0
+    loan_term_years: int = 3
+    interest_rate: float = 0.15
+    deposit_percentage: float = 0
+    install_multiplier: float = 2.0
+    subsidy_percentage: float = 0
+    peak_power: float = 0           # kW
+    runtime_share: float = 1.0
+
+
+class Sizing(NamedTuple):
+    specific_efficiency: float
+    energy_required_per_day: float
+    energy_production: float
+    production_per_day: float
+    panels_required: int
+    solar_panel_cost: float
+    recommended_solar_size: float
+    battery_capacity: float
+
+
+class Costs(NamedTuple):
+    inverter_cost: float
+    controller_cost: float
+    battery_cost: float
+    fob_subtotal_usd: float
+    import_install_usd: float
+    total_with_import_usd: float
+
+
+class Capital(NamedTuple):
+    subsidy_amount: float
+    total_after_subsidy: float
+    deposit_amount: float
+    loan_principal_usd: float
+
+
+class Loan(NamedTuple):
+    months: int
+    monthly_repayment_usd: float
+    total_repayment_usd: float
+    total_interest_paid_usd: float
+    annual_repayment_usd: float
+    daily_repayment_usd: float
+
+
+class Viability(NamedTuple):
+    income_per_hour: float
+    income_per_day: float
+    gross_income_per_year: float
+    net_income_per_day: float
+    repayment_percentage: float
+    net_revenue_repayment_percentage: float
+    viable_business: bool
+    daily_surplus: float
+    annual_net_profit: float
+    payback_years: Optional[float]
+
+
+class Result(NamedTuple):
+    """Derived values for one scenario, all money in USD.
+
+    The fields are those of ``Sizing``, ``Costs``, ``Capital``, ``Loan`` and
+    ``Viability`` in that order.
+    """
+    specific_efficiency: float
+    energy_required_per_day: float
+    energy_production: float
+    production_per_day: float
+    panels_required: int
+    solar_panel_cost: float
+    recommended_solar_size: float
+    battery_capacity: float
+    inverter_cost: float
+    controller_cost: float
+    battery_cost: float
+    fob_subtotal_usd: float
+    import_install_usd: float
+    total_with_import_usd: float
+    subsidy_amount: float
+    total_after_subsidy: float
+    deposit_amount: float
+    loan_principal_usd: float
+    months: int
+    monthly_repayment_usd: float
+    total_repayment_usd: float
+    total_interest_paid_usd: float
+    annual_repayment_usd: float
+    daily_repayment_usd: float
+    income_per_hour: float
+    income_per_day: float
+    gross_income_per_year: float
+    net_income_per_day: float
+    repayment_percentage: float
+    net_revenue_repayment_percentage: float
+    viable_business: bool
+    daily_surplus: float
+    annual_net_profit: float
+    payback_years: Optional[float]
+
+
+def size_system(power, processing_speed, runtime_per_day, system_efficiency, sun_hours, battery_hours):
+    """Energy demand, panel count, array size and battery capacity."""
+    specific_efficiency = processing_speed / power
+    energy_required_per_day = runtime_per_day * power
+    energy_production = energy_required_per_day / (system_efficiency / 100)
+    production_per_day = specific_efficiency * energy_required_per_day
+    panel_energy_per_day = panel_wattage_kw * sun_hours
+    panels_required = math.ceil(energy_production / panel_energy_per_day)
+    recommended_solar_size = math.ceil((energy_production / sun_hours) * 2) / 2
+    return Sizing(
+        specific_efficiency,
+        energy_required_per_day,
+        energy_production,
+        production_per_day,
+        panels_required,
+        panels_required * panel_cost,
+        recommended_solar_size,
+        recommended_solar_size * battery_hours,
+    )
+
+
+def cost_system(price_usd, system, install_multiplier, peak_power, sizing):
+    """Equipment costs before and after import and installation."""
+    inverter_cost = 0
+    controller_cost = 0
+    if system == "AC":
+        inverter_cost = max(sizing.recommended_solar_size, peak_power) * inverter_cost_per_kw
+    elif system == "DC":
+        controller_cost = sizing.recommended_solar_size * controller_cost_per_kw
+    battery_cost = sizing.battery_capacity * battery_cost_per_kwh
+
+    fob_subtotal_usd = price_usd + sizing.solar_panel_cost + inverter_cost + controller_cost + battery_cost
+    return Costs(
+        inverter_cost,
+        controller_cost,
+        battery_cost,
+        fob_subtotal_usd,
+        fob_subtotal_usd * (install_multiplier - 1),
+        fob_subtotal_usd * install_multiplier,
+    )
+
+
+def apply_subsidy(subsidy_percentage, deposit_percentage, costs):
+    """Subsidy, deposit and the amount left to borrow."""
+    subsidy_amount = costs.total_with_import_usd * (subsidy_percentage / 100)
+    total_after_subsidy = costs.total_with_import_usd - subsidy_amount
+    deposit_amount = total_after_subsidy * (deposit_percentage / 100)
+    return Capital(subsidy_amount, total_after_subsidy, deposit_amount, total_after_subsidy - deposit_amount)
+
+
+def finance_loan(loan_term_years, interest_rate, capital):
+    """Amortized repayments on the loan principal."""
+    loan_principal_usd = capital.loan_principal_usd
+    months = loan_term_years * 12
+    monthly_rate = interest_rate / 12
+    if monthly_rate > 0 and loan_principal_usd > 0:
+        monthly_repayment_usd = (loan_principal_usd * monthly_rate) / (1 - (1 + monthly_rate)**(-months))
+    else:
+        monthly_repayment_usd = 0
+    total_repayment_usd = months * monthly_repayment_usd
+    annual_repayment_usd = monthly_repayment_usd * 12
+    return Loan(
+        months,
+        monthly_repayment_usd,
+        total_repayment_usd,
+        total_repayment_usd - loan_principal_usd,
+        annual_repayment_usd,
+        annual_repayment_usd / 365,
+    )
+
+
+def assess_viability(income_per_kg, processing_speed, operating_days, daily_operating_cost, deposit_percentage,
+                     runtime_share, sizing, capital, loan):
+    """Income, repayment burden, the viability rule and simple payback."""
+    income_per_day = income_per_kg * sizing.production_per_day * runtime_share
+    net_income_per_day = income_per_day - daily_operating_cost
+    daily_repayment_usd = loan.daily_repayment_usd
+
+    if income_per_day > 0:
+        repayment_percentage = (daily_repayment_usd / income_per_day) * 100
+    else:
+        repayment_percentage = 0
+    if net_income_per_day > 0:
+        net_revenue_repayment_percentage = (daily_repayment_usd / net_income_per_day) * 100
+    else:
+        net_revenue_repayment_percentage = 0
+
+    # Business is viable if no loan is needed (deposit is 100%) OR net income covers repayments
+    viable_business = deposit_percentage == 100 or (
+        net_income_per_day > 0 and daily_repayment_usd > 0 and net_income_per_day >= daily_repayment_usd
+    )
+    annual_net_profit = net_income_per_day * operating_days
+    if viable_business and annual_net_profit > 0:
+        payback_years = capital.total_after_subsidy / annual_net_profit
+    else:
+        payback_years = None
+
+    return Viability(
+        income_per_kg * processing_speed,
+        income_per_day,
+        income_per_day * operating_days,
+        net_income_per_day,
+        repayment_percentage,
+        net_revenue_repayment_percentage,
+        viable_business,
+        net_income_per_day - daily_repayment_usd,
+        annual_net_profit,
+        payback_years,
+    )
+
+
+def evaluate(s):
+    """Run the full sizing, costing, loan and viability calculation."""
+    sizing = size_system(s.power, s.processing_speed, s.runtime_per_day, s.system_efficiency, s.sun_hours,
+                         s.battery_hours)
+    costs = cost_system(s.price_usd, s.system, s.install_multiplier, s.peak_power, sizing)
+    capital = apply_subsidy(s.subsidy_percentage, s.deposit_percentage, costs)
+    loan = finance_loan(s.loan_term_years, s.interest_rate, capital)
+    viability = assess_viability(s.income_per_kg, s.processing_speed, s.operating_days, s.daily_operating_cost,
+                                 s.deposit_percentage, s.runtime_share, sizing, capital, loan)
+    return Result(*sizing, *costs, *capital, *loan, *viability)
+
+
+# Fields that are whole numbers in the UI; everything else is a float
+_int_fields = {"operating_days", "loan_term_years"}
+
+
+def normalize(s):
+    """Canonical form of a scenario for use as a cache key.
+
+    Numbers are coerced to int or float and rounded to 9 decimals so that
+    ``0.15`` and ``15 / 100`` land on the same entry; the system type is
+    upper-cased.
+    """
+    values = []
+    for name, value in zip(Scenario._fields, s):
+        if name == "system":
+            values.append(str(value).strip().upper())
+        elif name in _int_fields:
+            values.append(int(value))
+        else:
+            values.append(round(float(value), 9))
+    return Scenario._make(values)
+
+
+@lru_cache(maxsize=4096)
+def _evaluate_normalized(s):
+    return evaluate(s)
+
+
+def evaluate_cached(s):
+    """``evaluate`` through a bounded LRU cache keyed on ``normalize(s)``."""
+    return _evaluate_normalized(normalize(s))
+
+
+cache_info = _evaluate_normalized.cache_info
+cache_clear = _evaluate_normalized.cache_clear
@@ -0,0 +1,108 @@
+"""Viability over grids of two financing inputs.
+
+Sizing and equipment costs do not depend on the loan term, interest rate,
+deposit or subsidy. ``financing_grid`` therefore works them out once with
+the scalar engine and runs only the subsidy, loan and viability formulas
+over the grid, in one vectorized pass. Grids are kept in a small LRU keyed
+on the normalized scenario and the two axes.
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from solarcalc import engine
+from solarcalc.batch import _discount_factors
+
+# Inputs a grid axis can vary; loan terms are rounded to whole months
+financing_inputs = ("loan_term_years", "interest_rate", "deposit_percentage", "subsidy_percentage")
+
+
+class FinancingGrid(NamedTuple):
+    """Outputs over ``y_values`` x ``x_values``; each array has shape ``(len(y_values), len(x_values))``.
+
+    Money is in USD and ``payback_years`` is NaN where the business is not
+    viable, as in ``evaluate_batch``.
+    """
+    x_name: str
+    x_values: np.ndarray
+    y_name: str
+    y_values: np.ndarray
+    viable_business: np.ndarray
+    daily_surplus: np.ndarray
+    monthly_repayment_usd: np.ndarray
+    net_revenue_repayment_percentage: np.ndarray
+    payback_years: np.ndarray
+
+
+def financing_grid(scenario, x_name, x_values, y_name, y_values):
+    """Evaluate ``scenario`` at every combination of ``x_values`` and ``y_values``."""
+    for name in (x_name, y_name):
+        if name not in financing_inputs:
+            raise ValueError(f"Cannot vary {name!r}; choose from {', '.join(financing_inputs)}")
+    if x_name == y_name:
+        raise ValueError("The two axes must vary different inputs")
+    return _financing_grid(
+        engine.normalize(scenario),
+        x_name, tuple(float(v) for v in x_values),
+        y_name, tuple(float(v) for v in y_values),
+    )
+
+
+@lru_cache(maxsize=32)
+def _financing_grid(s, x_name, x_values, y_name, y_values):
+    # Independent of financing: once per scenario
+    sizing = engine.size_system(s.power, s.processing_speed, s.runtime_per_day, s.system_efficiency, s.sun_hours,
+                                s.battery_hours)
+    costs = engine.cost_system(s.price_usd, s.system, s.install_multiplier, s.peak_power, sizing)
+    net_income_per_day = s.income_per_kg * sizing.production_per_day * s.runtime_share - s.daily_operating_cost
+
+    shape = (len(y_values), len(x_values))
+    inputs = {name: np.asarray(getattr(s, name), dtype=float) for name in financing_inputs}
+    inputs[x_name] = np.asarray(x_values)[None, :]
+    inputs[y_name] = np.asarray(y_values)[:, None]
+    f = {name: np.broadcast_to(values, shape) for name, values in inputs.items()}
+
+    # Subsidy and deposit
+    subsidy_amount = costs.total_with_import_usd * (f["subsidy_percentage"] / 100)
+    total_after_subsidy = costs.total_with_import_usd - subsidy_amount
+    deposit_amount = total_after_subsidy * (f["deposit_percentage"] / 100)
+    loan_principal_usd = total_after_subsidy - deposit_amount
+
+    # Loan
+    months = np.rint(f["loan_term_years"] * 12)
+    monthly_rate = f["interest_rate"] / 12
+    has_loan = (monthly_rate > 0) & (loan_principal_usd > 0)
+    monthly_repayment_usd = np.zeros(shape)
+    if has_loan.any():
+        factors = _discount_factors(monthly_rate[has_loan], months[has_loan])
+        monthly_repayment_usd[has_loan] = (loan_principal_usd[has_loan] * monthly_rate[has_loan]) / (1 - factors)
+    daily_repayment_usd = monthly_repayment_usd * 12 / 365
+
+    # Viability
+    viable_business = (f["deposit_percentage"] == 100) | (
+        (net_income_per_day > 0) & (daily_repayment_usd > 0) & (net_income_per_day >= daily_repayment_usd)
+    )
+    if net_income_per_day > 0:
+        net_revenue_repayment_percentage = (daily_repayment_usd / net_income_per_day) * 100
+    else:
+        net_revenue_repayment_percentage = np.zeros(shape)
+    annual_net_profit = net_income_per_day * s.operating_days
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payback_years = np.where(viable_business & (annual_net_profit > 0), total_after_subsidy / annual_net_profit,
+                                 np.nan)
+
+    grid = FinancingGrid(
+        x_name, np.asarray(x_values), y_name, np.asarray(y_values),
+        viable_business, net_income_per_day - daily_repayment_usd, monthly_repayment_usd,
+        net_revenue_repayment_percentage, payback_years,
+    )
+    # Cached grids are shared, so nobody gets to write to them
+    for values in grid:
+        if isinstance(values, np.ndarray):
+            values.setflags(write=False)
+    return grid
+
+
+cache_info = _financing_grid.cache_info
+cache_clear = _financing_grid.cache_clear
@@ -0,0 +1,126 @@
+"""Incremental recompute of the results as a dependency graph.
+
+Each node names the ``Scenario`` fields it reads and the nodes it depends
+on. ``ResultGraph.update`` walks the nodes in order and only re-derives a
+node whose own inputs or upstream outputs changed since the last update:
+changing the currency only redoes the ``display`` node, changing the
+interest rate only redoes ``loan``, ``viability`` and ``display``.
+
+Node outputs are also kept in small process-wide LRU caches, so sessions
+looking at the same scenario share the work. ``recomputes`` counts, per
+node, the updates in which the node was dirty; ``evaluations`` counts how
+often its function actually ran.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+from typing import NamedTuple
+
+from solarcalc import engine
+
+
+class Node(NamedTuple):
+    name: str
+    func: object
+    fields: tuple
+    upstream: tuple
+
+
+# Money shown on the results tabs, converted to the selected currency
+money_fields = (
+    "price_usd", "daily_operating_cost",
+    "solar_panel_cost", "inverter_cost", "controller_cost", "battery_cost",
+    "fob_subtotal_usd", "import_install_usd", "total_with_import_usd",
+    "subsidy_amount", "total_after_subsidy", "deposit_amount", "loan_principal_usd",
+    "monthly_repayment_usd", "total_repayment_usd", "total_interest_paid_usd",
+    "annual_repayment_usd", "daily_repayment_usd",
+    "income_per_hour", "income_per_day", "gross_income_per_year", "net_income_per_day",
+    "daily_surplus", "annual_net_profit",
+)
+Money = namedtuple("Money", money_fields)
+
+
+def to_currency(rate, price_usd, daily_operating_cost, sizing, costs, capital, loan, viability):
+    """Every money value multiplied by ``rate``."""
+    values = {"price_usd": price_usd, "daily_operating_cost": daily_operating_cost}
+    for part in (sizing, costs, capital, loan, viability):
+        values.update(part._asdict())
+    return Money._make(values[name] * rate for name in money_fields)
+
+
+nodes = (
+    Node("sizing", engine.size_system,
+         ("power", "processing_speed", "runtime_per_day", "system_efficiency", "sun_hours", "battery_hours"), ()),
+    Node("costs", engine.cost_system, ("price_usd", "system", "install_multiplier", "peak_power"), ("sizing",)),
+    Node("capital", engine.apply_subsidy, ("subsidy_percentage", "deposit_percentage"), ("costs",)),
+    Node("loan", engine.finance_loan, ("loan_term_years", "interest_rate"), ("capital",)),
+    Node("viability", engine.assess_viability,
+         ("income_per_kg", "processing_speed", "operating_days", "daily_operating_cost", "deposit_percentage",
+          "runtime_share"),
+         ("sizing", "capital", "loan")),
+    Node("display", to_currency,
+         ("rate", "price_usd", "daily_operating_cost"),
+         ("sizing", "costs", "capital", "loan", "viability")),
+)
+node_names = tuple(node.name for node in nodes)
+
+
+class _NodeCache:
+    """Small thread-safe LRU shared by every graph in the process."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+_caches = {name: _NodeCache(maxsize=2048) for name in node_names}
+
+
+class ResultGraph:
+    """Per-session view of the graph holding the last inputs and outputs of each node."""
+
+    def __init__(self):
+        self._keys = {}
+        self.values = {}
+        self.recomputes = dict.fromkeys(node_names, 0)
+        self.evaluations = dict.fromkeys(node_names, 0)
+        self.dirty = ()
+
+    def update(self, scenario, rate=1.0):
+        """Bring every node up to date; returns ``(Result, Money)``."""
+        inputs = engine.normalize(scenario)._asdict()
+        inputs["rate"] = float(rate)
+        dirty = []
+        for node in nodes:
+            key = (
+                tuple(inputs[f] for f in node.fields),
+                tuple(self.values[u] for u in node.upstream),
+            )
+            if self._keys.get(node.name) == key:
+                continue
+            dirty.append(node.name)
+            self.recomputes[node.name] += 1
+            value = _caches[node.name].get(key)
+            if value is None:
+                value = node.func(*key[0], *key[1])
+                self.evaluations[node.name] += 1
+                _caches[node.name].put(key, value)
+            self._keys[node.name] = key
+            self.values[node.name] = value
+        self.dirty = tuple(dirty)
+        v = self.values
+        result = engine.Result(*v["sizing"], *v["costs"], *v["capital"], *v["loan"], *v["viability"])
+        return result, v["display"]
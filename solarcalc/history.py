@@ -0,0 +1,112 @@
+"""Scenario history for one session: recent runs, pinned runs and comparisons.
+
+Every calculation becomes a ``Run``: an immutable record of the inputs as a
+``Scenario``, the display currency, the sun-profile and appliance choices
+and a few headline results. ``ScenarioHistory`` keeps the latest
+``max_runs`` in a deque that drops the oldest first. Pinned runs are held
+apart, up to ``max_pinned``, and are never dropped, so a session holds at
+most ``max_runs + max_pinned`` records of a few hundred bytes each however
+long it runs. ``compare`` evaluates any set of runs with one
+``evaluate_batch`` call.
+"""
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+from solarcalc.batch import columns_from_scenarios, evaluate_batch
+from solarcalc.engine import Scenario, evaluate_cached
+
+max_runs = 20
+max_pinned = 24
+
+
+class Headline(NamedTuple):
+    """The results shown in the history list; money in USD, payback None without an annual profit."""
+    recommended_solar_size: float
+    total_after_subsidy: float
+    daily_surplus: float
+    payback_years: Optional[float]
+    viable_business: bool
+
+
+class Run(NamedTuple):
+    id: int
+    label: str
+    scenario: Scenario
+    currency: str
+    headline: Headline
+    created: float                  # Unix time
+    sun_profile: Optional[tuple] = None
+    site_loads: Optional[tuple] = None
+
+
+def make_run(label, scenario, currency, sun_profile=None, site_loads=None, run_id=0):
+    """A ``Run`` for ``scenario`` with its headline results; id 0 marks one not in any history."""
+    result = evaluate_cached(scenario)
+    headline = Headline(result.recommended_solar_size, result.total_after_subsidy, result.daily_surplus,
+                        result.payback_years, result.viable_business)
+    return Run(run_id, label, scenario, currency, headline, time.time(), sun_profile, site_loads)
+
+
+class ScenarioHistory:
+    """Bounded history of one session's runs; the newest run comes first."""
+
+    def __init__(self, max_runs=max_runs, max_pinned=max_pinned):
+        self.max_pinned = max_pinned
+        self._recent = deque(maxlen=max_runs)
+        self._pinned = {}
+        self._next_id = 1
+
+    def add(self, label, scenario, currency, sun_profile=None, site_loads=None):
+        """Record a run and return it; the same inputs as the newest run return that run instead."""
+        if self._recent:
+            last = self._recent[-1]
+            if (last.label, last.scenario, last.currency, last.sun_profile, last.site_loads) == (
+                    label, scenario, currency, sun_profile, site_loads):
+                return last
+        run = make_run(label, scenario, currency, sun_profile, site_loads, self._next_id)
+        self._next_id += 1
+        self._recent.append(run)
+        return run
+
+    def get(self, run_id):
+        """The run with ``run_id`` if it is still held, else None."""
+        if run_id in self._pinned:
+            return self._pinned[run_id]
+        return next((run for run in self._recent if run.id == run_id), None)
+
+    def runs(self):
+        """Every run held, pinned or recent, newest first."""
+        held = {run.id: run for run in self._recent}
+        held.update(self._pinned)
+        return sorted(held.values(), key=lambda run: run.id, reverse=True)
+
+    def pinned(self):
+        """Pinned runs, newest first."""
+        return sorted(self._pinned.values(), key=lambda run: run.id, reverse=True)
+
+    def is_pinned(self, run_id):
+        return run_id in self._pinned
+
+    def pin(self, run_id):
+        """Keep a run until it is unpinned; ``ValueError`` when ``max_pinned`` are pinned or it is gone."""
+        if run_id in self._pinned:
+            return
+        run = self.get(run_id)
+        if run is None:
+            raise ValueError(f"Run {run_id} is no longer in the history")
+        if len(self._pinned) >= self.max_pinned:
+            raise ValueError(f"At most {self.max_pinned} runs can be pinned; unpin one first")
+        self._pinned[run_id] = run
+
+    def unpin(self, run_id):
+        """Let a run be dropped again; it goes at once if it is older than every recent run."""
+        self._pinned.pop(run_id, None)
+
+    def __len__(self):
+        return len(self.runs())
+
+
+def compare(runs):
+    """``evaluate_batch`` results for ``runs``, in the same order, from one batched call."""
+    return evaluate_batch(columns_from_scenarios([run.scenario for run in runs]))
@@ -0,0 +1,92 @@
+"""Scenario inputs in the units the app shows.
+
+Shared by the app, the portfolio page and the command line. Fields use the
+input expander's units: ``interest_rate`` and ``install_increase`` are
+percentages, like the sliders. Appliance presets come from the appliance
+catalog, which opens its SQLite file on the first lookup; otherwise this
+is plain Python, without numpy or pandas, so importing it stays cheap.
+"""
+import math
+
+from solarcalc.catalog import get_catalog
+from solarcalc.engine import Scenario
+
+# Input fields and the defaults used when a field is absent
+input_defaults = {
+    "appliance": "",
+    "power": None,
+    "processing_speed": None,
+    "price_usd": None,
+    "system": None,
+    "runtime_per_day": 4.0,
+    "operating_days": 250,
+    "income_per_kg": round(5/140, 3),
+    "sun_hours": 4.0,
+    "system_efficiency": 80,
+    "battery_hours": 1,
+    "daily_operating_cost": 10.0,
+    "loan_term_years": 3,
+    "interest_rate": 15.0,
+    "deposit_percentage": 0,
+    "install_increase": 100,
+    "subsidy_percentage": 0,
+}
+required_columns = [name for name, default in input_defaults.items() if default is None]
+
+_int_inputs = {"operating_days", "loan_term_years"}
+
+
+def to_scenario(values):
+    """Build a ``Scenario`` from a mapping in input units.
+
+    An ``appliance`` in the catalog fills in power, price and processing
+    speed unless they are given. Raises ``ValueError`` for missing fields, numbers that
+    cannot be parsed, fractional days or loan terms and scenarios the engine
+    cannot size or finance.
+    """
+    values = {name: value for name, value in values.items() if value is not None}
+    preset = get_catalog().get(values["appliance"]) if values.get("appliance") else None
+    if preset is not None:
+        values.setdefault("power", preset.power)
+        values.setdefault("price_usd", preset.price_usd)
+        values.setdefault("processing_speed", preset.processing_speed)
+
+    unknown = sorted(set(values) - set(input_defaults))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    missing = [name for name in required_columns if name not in values]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    fields = {}
+    for name, default in input_defaults.items():
+        if name in ("appliance", "system"):
+            continue
+        value = values.get(name, default)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number, got {value!r}") from None
+        if not math.isfinite(number):
+            raise ValueError(f"{name} must be a finite number, got {value!r}")
+        if name in _int_inputs:
+            # The batch path would use a fractional term as it is; don't let the two disagree
+            if not number.is_integer():
+                raise ValueError(f"{name} must be a whole number, got {value!r}")
+            number = int(number)
+        fields[name] = number
+    system = str(values["system"]).strip().upper()
+    if system not in ("AC", "DC"):
+        raise ValueError(f"system must be AC or DC, got {values['system']!r}")
+    # Cache keys round to 9 decimals, so smaller values would be divided by as zero
+    if min(round(fields[name], 9) for name in ("power", "sun_hours", "system_efficiency")) <= 0:
+        raise ValueError("power, sun_hours and system_efficiency must be greater than zero")
+    if fields["loan_term_years"] < 1:
+        raise ValueError(f"loan_term_years must be at least 1, got {fields['loan_term_years']!r}")
+    if fields["processing_speed"] < 0:
+        raise ValueError("processing_speed cannot be negative")
+
+    fields["system"] = system
+    fields["interest_rate"] = fields["interest_rate"] / 100
+    fields["install_multiplier"] = 1 + fields.pop("install_increase") / 100
+    return Scenario(**fields)
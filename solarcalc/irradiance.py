@@ -0,0 +1,290 @@
+"""Monthly sun hours by coordinates from a local gridded dataset.
+
+The dataset is one binary file, memory-mapped, so only the pages a lookup
+touches are read from disk:
+
+* a 64-byte header: magic, value scale, the centre of the south-west cell,
+  the cell size in degrees and the grid shape
+* the spatial index: one little-endian int32 per grid cell, row by row from
+  the south, holding the cell's record number or -1 where there is no data
+  (sea, gaps). A coordinate finds its cell by arithmetic, like a hash table
+  keyed on the rounded coordinates.
+* the records: twelve little-endian uint16 monthly peak sun hours per
+  cell with data, January first, in hundredths of an hour
+
+For a site inside a cell with data, that cell's centre is the nearest grid
+point. Sites in a cell without data search outward ring by ring and stop
+once no unsearched cell can be nearer than the best one found. All sites
+go through each step together as arrays, so thousands of sites take a few
+milliseconds.
+
+Build a dataset from a CSV export of any gridded source (one row per cell
+with ``latitude``, ``longitude`` and ``sun_hours_jan`` ... ``sun_hours_dec``
+or a yearly ``sun_hours``):
+
+    python -m solarcalc.irradiance build cells.csv irradiance.grid --resolution 0.1
+    python -m solarcalc.irradiance query irradiance.grid -1.29 36.82
+"""
+import argparse
+import math
+import os
+import sys
+from typing import NamedTuple
+
+import numpy as np
+
+from solarcalc.seasonal import design_sun_hours
+
+magic = b"SOLGRID1"
+header_dtype = np.dtype([
+    ("magic", "S8"),
+    ("scale", "<u4"),
+    ("months", "<u4"),
+    ("lat0", "<f8"),
+    ("lon0", "<f8"),
+    ("resolution", "<f8"),
+    ("nlat", "<u4"),
+    ("nlon", "<u4"),
+    ("points", "<u8"),
+    ("reserved", "V8"),
+])
+value_scale = 100
+earth_radius_km = 6371.0
+km_per_degree = earth_radius_km * math.pi / 180
+
+default_grid_path = os.environ.get(
+    "SOLAR_IRRADIANCE_GRID",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "solar_calculator", "irradiance.grid")
+)
+
+
+class SiteResource(NamedTuple):
+    """Lookup results, one row per site.
+
+    ``monthly`` is ``(sites, 12)`` peak sun hours and ``sun_hours`` their
+    day-weighted yearly average; both are NaN and ``distance_km`` is
+    infinite where ``found`` is False. ``distance_km`` is from the site to
+    the centre of the grid cell used.
+    """
+    monthly: np.ndarray
+    sun_hours: np.ndarray
+    distance_km: np.ndarray
+    found: np.ndarray
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between points given in degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * earth_radius_km * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def write_grid(path, lat0, lon0, resolution, values):
+    """Write a dataset; ``values`` is ``(nlat, nlon, 12)`` sun hours, NaN where there is no data.
+
+    ``lat0`` and ``lon0`` are the centre of cell ``[0, 0]``, the south-west
+    corner. The file is written next to ``path`` and moved into place.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim != 3 or values.shape[2] != 12:
+        raise ValueError("values must have shape (nlat, nlon, 12)")
+    if resolution <= 0:
+        raise ValueError("resolution must be positive")
+    nlat, nlon, _ = values.shape
+    present = np.isfinite(values).all(axis=2) & (values >= 0).all(axis=2)
+    index = np.full(nlat * nlon, -1, dtype="<i4")
+    index[present.ravel()] = np.arange(int(present.sum()), dtype="<i4")
+    records = np.clip(np.rint(values[present] * value_scale), 0, np.iinfo(np.uint16).max).astype("<u2")
+
+    header = np.zeros(1, dtype=header_dtype)
+    header[0] = (magic, value_scale, 12, lat0, lon0, resolution, nlat, nlon, len(records), b"")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.tobytes())
+        f.write(index.tobytes())
+        f.write(records.tobytes())
+    os.replace(tmp, path)
+    return len(records)
+
+
+def grid_from_points(latitude, longitude, monthly, resolution):
+    """Snap point values onto a grid: ``(lat0, lon0, values)`` for ``write_grid``.
+
+    Points falling in the same cell are averaged.
+    """
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    monthly = np.asarray(monthly, dtype=float)
+    lat0 = round(latitude.min() / resolution) * resolution
+    lon0 = round(longitude.min() / resolution) * resolution
+    i = np.rint((latitude - lat0) / resolution).astype(np.int64)
+    j = np.rint((longitude - lon0) / resolution).astype(np.int64)
+    nlat, nlon = int(i.max()) + 1, int(j.max()) + 1
+    cell = i * nlon + j
+    totals = np.zeros((nlat * nlon, 12))
+    counts = np.zeros(nlat * nlon)
+    np.add.at(totals, cell, monthly)
+    np.add.at(counts, cell, 1)
+    with np.errstate(invalid="ignore"):
+        values = (totals / counts[:, None]).reshape(nlat, nlon, 12)
+    return lat0, lon0, values
+
+
+class IrradianceGrid:
+    """Read-only, memory-mapped view of a dataset written by ``write_grid``."""
+
+    def __init__(self, path=default_grid_path):
+        self.path = path
+        self._file = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(self._file) < header_dtype.itemsize:
+            raise ValueError(f"{path} is not an irradiance grid")
+        header = self._file[:header_dtype.itemsize].view(header_dtype)[0]
+        if header["magic"] != magic or header["months"] != 12:
+            raise ValueError(f"{path} is not an irradiance grid")
+        self.lat0 = float(header["lat0"])
+        self.lon0 = float(header["lon0"])
+        self.resolution = float(header["resolution"])
+        self.shape = (int(header["nlat"]), int(header["nlon"]))
+        self.points = int(header["points"])
+        self.scale = int(header["scale"])
+
+        cells = self.shape[0] * self.shape[1]
+        start = header_dtype.itemsize
+        end = start + 4 * cells
+        if len(self._file) != end + 24 * self.points:
+            raise ValueError(f"{path} is truncated or has the wrong size")
+        self._index = self._file[start:end].view("<i4").reshape(self.shape)
+        self._records = self._file[end:].view("<u2").reshape(self.points, 12)
+
+    def bounds(self):
+        """``(south, west, north, east)`` edges of the grid in degrees."""
+        half = self.resolution / 2
+        return (self.lat0 - half, self.lon0 - half,
+                self.lat0 + (self.shape[0] - 0.5) * self.resolution,
+                self.lon0 + (self.shape[1] - 0.5) * self.resolution)
+
+    def _search(self, lat, lon, i, j, max_distance_km):
+        """Nearest record within ``max_distance_km`` of each site: ``(record, distance_km)``."""
+        n = len(lat)
+        record = np.full(n, -1, dtype=np.int64)
+        distance = np.full(n, np.inf)
+        # Smallest distance across one cell, east-west at the site's latitude or north-south
+        cell_km = self.resolution * km_per_degree * np.maximum(np.cos(np.radians(np.abs(lat) + self.resolution)), 0.01)
+        pending = np.arange(n)
+        rings = int(max_distance_km / (self.resolution * km_per_degree * 0.01)) + 1
+        for r in range(rings + 1):
+            # Nothing in this ring or beyond can be nearer than what has been found
+            pending = pending[(r - 0.5) * cell_km[pending] < np.minimum(distance[pending], max_distance_km)]
+            if not len(pending):
+                break
+            if r == 0:
+                di = dj = np.zeros(1, dtype=np.int64)
+            else:
+                side = np.arange(-r, r + 1)
+                di = np.concatenate([np.full(2 * r + 1, -r), np.full(2 * r + 1, r), side[1:-1], side[1:-1]])
+                dj = np.concatenate([side, side, np.full(2 * r - 1, -r), np.full(2 * r - 1, r)])
+            ci = i[pending, None] + di
+            cj = j[pending, None] + dj
+            inside = (ci >= 0) & (ci < self.shape[0]) & (cj >= 0) & (cj < self.shape[1])
+            candidates = np.where(inside, self._index[np.clip(ci, 0, self.shape[0] - 1),
+                                                      np.clip(cj, 0, self.shape[1] - 1)], -1)
+            d = haversine_km(lat[pending, None], lon[pending, None],
+                             self.lat0 + ci * self.resolution, self.lon0 + cj * self.resolution)
+            d[candidates < 0] = np.inf
+            best = d.argmin(axis=1)
+            best_d = d[np.arange(len(pending)), best]
+            better = best_d < distance[pending]
+            rows = pending[better]
+            distance[rows] = best_d[better]
+            record[rows] = candidates[better, best[better]]
+        record[distance > max_distance_km] = -1
+        return record, np.where(record >= 0, distance, np.inf)
+
+    def lookup(self, latitude, longitude, max_distance_km=25.0):
+        """Monthly sun hours at each site from the nearest grid cell with data within ``max_distance_km``."""
+        lat = np.atleast_1d(np.asarray(latitude, dtype=float))
+        lon = np.atleast_1d(np.asarray(longitude, dtype=float))
+        lat, lon = np.broadcast_arrays(lat, lon)
+        usable = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90)
+        lat = np.where(usable, lat, 0.0)
+        lon = np.where(usable, (lon + 180) % 360 - 180, 0.0)
+        i = np.rint((lat - self.lat0) / self.resolution).astype(np.int64)
+        j = np.rint((lon - self.lon0) / self.resolution).astype(np.int64)
+
+        record, distance = self._search(lat, lon, i, j, max_distance_km)
+        found = usable & (record >= 0)
+        monthly = np.full((len(lat), 12), np.nan)
+        # Fancy indexing on the map reads only the pages holding these records
+        monthly[found] = self._records[record[found]] / self.scale
+        distance = np.where(found, distance, np.inf)
+        return SiteResource(monthly, design_sun_hours(monthly, "average"), distance, found)
+
+    def close(self):
+        self._index = self._records = None
+        self._file._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_points(path):
+    """``(latitude, longitude, monthly)`` from a CSV with monthly or yearly sun-hour columns."""
+    import pandas as pd
+
+    from solarcalc.portfolio import month_columns
+
+    table = pd.read_csv(path)
+    missing = [name for name in ("latitude", "longitude") if name not in table.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    if all(name in table.columns for name in month_columns):
+        monthly = table[month_columns].to_numpy(dtype=float)
+    elif "sun_hours" in table.columns:
+        monthly = np.repeat(table["sun_hours"].to_numpy(dtype=float)[:, None], 12, axis=1)
+    else:
+        raise ValueError(f"Need {month_columns[0]} ... {month_columns[-1]} or sun_hours columns")
+    return table["latitude"].to_numpy(dtype=float), table["longitude"].to_numpy(dtype=float), monthly
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m solarcalc.irradiance",
+                                     description="Build or query a local irradiance grid.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write a grid from a CSV of cells")
+    build.add_argument("input", help="CSV with latitude, longitude and monthly or yearly sun hours")
+    build.add_argument("output", nargs="?", default=default_grid_path,
+                       help=f"grid file to write (default: {default_grid_path})")
+    build.add_argument("--resolution", type=float, required=True, help="cell size in degrees")
+    query = commands.add_parser("query", help="print the sun hours at a coordinate")
+    query.add_argument("grid", help="grid file")
+    query.add_argument("latitude", type=float)
+    query.add_argument("longitude", type=float)
+    query.add_argument("--max-distance", type=float, default=25.0, help="km to search (default: 25)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            lat0, lon0, values = grid_from_points(*read_points(args.input), args.resolution)
+            points = write_grid(args.output, lat0, lon0, args.resolution, values)
+            print(f"{args.output}: {points:,} cells, {values.shape[0]} x {values.shape[1]} grid, "
+                  f"{os.path.getsize(args.output) / 1e6:.1f} MB")
+        else:
+            with IrradianceGrid(args.grid) as grid:
+                site = grid.lookup(args.latitude, args.longitude, args.max_distance)
+            if not site.found[0]:
+                print(f"No data within {args.max_distance:g} km", file=sys.stderr)
+                return 1
+            print(" ".join(f"{v:.2f}" for v in site.monthly[0]))
+            print(f"average {site.sun_hours[0]:.2f} h/day, {site.distance_km[0]:.1f} km from the cell centre")
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
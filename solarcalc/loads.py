@@ -0,0 +1,151 @@
+"""Sites that run several appliances from one solar system.
+
+Each appliance has its own power, processing speed, income per kg, price
+and a daily window of ``runtime_per_day`` hours from ``start_hour``
+(windows past midnight wrap). Loads superpose: the site's daily energy,
+production and income are the sums over its appliances, its operating
+hours are the hours when anything runs and its coincident peak is the most
+load running at once.
+
+``site_columns`` folds each site into the single-appliance ``Scenario``
+columns the engine sizes. Runtime becomes the operating hours and power
+the daily energy spread over them, so the array and battery follow the
+site's daily energy as they do for one machine. Processing speed and
+income per kg are set so production and income come out as the appliance
+sums, the price is the sum of the prices and ``peak_power`` is the
+coincident peak, which an AC inverter must carry.
+
+Loads are constant within their windows, so the load only changes at a
+window's start or end. Sorting those events and keeping a running sum of
+the power switched on and off gives the peak and operating hours exactly,
+in O(loads log loads) per site. Sites are rows of ``(sites, loads)``
+arrays, padded with zero-power loads that never run, so a portfolio of
+sites with dozens of loads each is one sort and one cumulative sum along
+the rows.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from solarcalc.dispatch import hours_per_day, load_shape
+
+load_fields = ("power", "processing_speed", "runtime_per_day", "start_hour", "price_usd", "income_per_kg")
+
+
+class Load(NamedTuple):
+    name: str
+    power: float                # kW
+    processing_speed: float     # kg/hour
+    runtime_per_day: float = 4.0
+    start_hour: float = 8.0
+    price_usd: float = 0
+    income_per_kg: float = 0.036
+
+
+def pad_loads(site, **columns):
+    """Per-load columns grouped into ``(sites, max loads per site)`` arrays.
+
+    ``site`` labels each load's site; sites come out in order of first
+    appearance. Padding loads have zero power and runtime. Returns
+    ``(labels, padded)``.
+    """
+    site = np.asarray(site)
+    _, first, inverse = np.unique(site, return_index=True, return_inverse=True)
+    # Renumber so sites keep the order they first appear in
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    row = rank[inverse.ravel()]
+    by_site = np.argsort(row, kind="stable")
+    counts = np.bincount(row, minlength=len(order))
+    slot = np.empty(len(row), dtype=np.int64)
+    slot[by_site] = np.arange(len(row)) - np.repeat(np.cumsum(counts) - counts, counts)
+    width = int(counts.max()) if len(counts) else 0
+    padded = {}
+    for name, values in columns.items():
+        full = np.zeros((len(order), width))
+        full[row, slot] = np.asarray(values, dtype=float)
+        padded[name] = full
+    return site[np.sort(first)], padded
+
+
+def load_windows(start_hour, runtime_per_day, power):
+    """Operating hours and coincident peak (kW) of each site; inputs are ``(sites, loads)``."""
+    start = np.asarray(start_hour, dtype=float) % hours_per_day
+    runtime = np.clip(np.asarray(runtime_per_day, dtype=float), 0, hours_per_day)
+    running = (np.asarray(power, dtype=float) > 0) & (runtime > 0)
+    power = np.where(running, power, 0.0)
+    end = start + runtime
+    # Loads running at midnight: windows that wrap, and whole-day ones, which have no events
+    whole_day = running & (runtime >= hours_per_day)
+    events = running & ~whole_day
+    wraps = events & (end > hours_per_day)
+    times = np.concatenate([start, np.where(wraps, end - hours_per_day, end)], axis=1)
+    change = np.concatenate([np.where(events, power, 0.0), np.where(events, -power, 0.0)], axis=1)
+    count = np.concatenate([events, -events.astype(int)], axis=1).astype(int)
+    # Sweep the day in time order; a load ending when another starts is off first
+    order = np.lexsort((change > 0, times), axis=1)
+    times = np.take_along_axis(times, order, axis=1)
+    at_midnight = (power * (wraps | whole_day)).sum(axis=1)
+    load = at_midnight[:, None] + np.cumsum(np.take_along_axis(change, order, axis=1), axis=1)
+    active = (wraps | whole_day).sum(axis=1)[:, None] + np.cumsum(np.take_along_axis(count, order, axis=1), axis=1)
+    # Load after each event holds until the next one; from midnight to the first event it is at_midnight
+    length = np.diff(times, axis=1, append=hours_per_day)
+    first = times[:, 0] if times.shape[1] else np.full(len(times), float(hours_per_day))
+    operating_hours = (length * (active > 0)).sum(axis=1) + np.where(at_midnight > 0, first, 0.0)
+    peak = np.maximum(load.max(axis=1, initial=0), at_midnight)
+    return operating_hours, peak
+
+
+def site_columns(power, processing_speed, runtime_per_day, start_hour, price_usd, income_per_kg):
+    """Single-appliance ``Scenario`` columns for each site, from ``(sites, loads)`` arrays.
+
+    Returns power, processing_speed, runtime_per_day, price_usd,
+    income_per_kg and peak_power, plus energy_required_per_day,
+    production_per_day, income_per_day and appliances (loads with power
+    and runtime). Sites with no running load get NaN power.
+    """
+    power, processing_speed, runtime, price_usd, income_per_kg = (
+        np.asarray(v, dtype=float) for v in (power, processing_speed, runtime_per_day, price_usd, income_per_kg)
+    )
+    runtime = np.clip(runtime, 0, hours_per_day)
+    operating_hours, peak = load_windows(start_hour, runtime, power)
+    energy = (power * runtime).sum(axis=1)
+    production = (processing_speed * runtime).sum(axis=1)
+    income = (income_per_kg * processing_speed * runtime).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        equivalent_power = np.where(operating_hours > 0, energy / operating_hours, np.nan)
+        equivalent_speed = np.where(operating_hours > 0, production / operating_hours, np.nan)
+        equivalent_income = np.where(production > 0, income / production, 0.0)
+    return {
+        "power": equivalent_power,
+        "processing_speed": equivalent_speed,
+        "runtime_per_day": operating_hours,
+        "price_usd": price_usd.sum(axis=1),
+        "income_per_kg": equivalent_income,
+        "peak_power": peak,
+        "energy_required_per_day": energy,
+        "production_per_day": production,
+        "income_per_day": income,
+        "appliances": ((power > 0) & (runtime > 0)).sum(axis=1),
+    }
+
+
+def daily_load(start_hour, runtime_per_day, power):
+    """Each site's load through the day in kWh per hour, shape ``(24, sites)``, from ``(sites, loads)`` arrays."""
+    start = np.asarray(start_hour, dtype=float)
+    shape = load_shape(start.ravel(), np.asarray(runtime_per_day, dtype=float).ravel())
+    return (shape * np.asarray(power, dtype=float).ravel()).reshape(hours_per_day, *start.shape).sum(axis=2)
+
+
+def load_arrays(loads):
+    """``load_fields`` arrays of shape ``(1, loads)`` for one site given ``Load`` tuples."""
+    return {name: np.array([[getattr(load, name) for load in loads]], dtype=float).reshape(1, -1)
+            for name in load_fields}
+
+
+def site_row(loads):
+    """``site_columns`` of one site given ``Load`` tuples, as plain numbers."""
+    arrays = load_arrays(loads)
+    return {name: values[0].item() for name, values in site_columns(*(arrays[name] for name in load_fields)).items()}
+
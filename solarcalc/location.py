@@ -0,0 +1,92 @@
+"""Geo-IP currency detection that never blocks a Streamlit rerun.
+
+``LocationResolver.get`` answers from a bounded TTL store keyed on the
+client IP. On a miss it starts one background lookup for that IP and
+returns None, so the caller can render straight away and pick the answer
+up on a later rerun. Failed lookups are stored too, with a shorter TTL, so
+a dead service is not hit again on every slider drag.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+unknown_location = ("Unknown", "USD")
+
+
+def lookup_currency(ip=None, timeout=3):
+    """Ask ipapi.co for ``(country, currency)``; ``ip=None`` means the caller's own address."""
+    url = f"https://ipapi.co/{ip}/json/" if ip else "https://ipapi.co/json/"
+    ip_info = requests.get(url, timeout=timeout).json()
+    if ip_info.get("error"):
+        raise ValueError(ip_info.get("reason", "lookup failed"))
+    return ip_info.get("country_name", "Unknown"), ip_info.get("currency", "USD")
+
+
+class TTLStore:
+    """Thread-safe mapping with per-entry expiry and LRU eviction past ``maxsize``."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class LocationResolver:
+    """Background geo-IP lookups with one request in flight per IP."""
+
+    def __init__(self, ttl=24 * 3600, failure_ttl=600, maxsize=1024, timeout=3, lookup=lookup_currency):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.timeout = timeout
+        self.lookup = lookup
+        self.store = TTLStore(maxsize)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _resolve(self, ip):
+        try:
+            value = (self.lookup(ip, self.timeout), True)
+            ttl = self.ttl
+        except Exception:
+            value = (unknown_location, False)
+            ttl = self.failure_ttl
+        self.store.set(ip, value, ttl)
+        with self._lock:
+            self._pending.discard(ip)
+
+    def get(self, ip=None):
+        """Return ``((country, currency), ok)`` if known, else start a lookup and return None."""
+        cached = self.store.get(ip)
+        if cached is not None:
+            return cached
+        with self._lock:
+            if ip in self._pending:
+                return None
+            self._pending.add(ip)
+        threading.Thread(target=self._resolve, args=(ip,), name="geoip-lookup", daemon=True).start()
+        return None
@@ -0,0 +1,151 @@
+"""Search for the cheapest or fastest-paying configuration that is viable.
+
+The search covers runtime per day, battery hours, loan term, deposit and
+AC/DC, within user bounds. It leans on the shape of the formulas instead of
+trying every combination:
+
+* Battery hours only add cost, so the lower bound is always best.
+* Installed cost and simple payback do not depend on the loan term or the
+  deposit. Those two only decide whether a system is viable, and a longer
+  term or a bigger deposit always lowers the daily repayment. A system is
+  checked once, at the longest term and largest deposit. Only the winner's
+  financing is then worked out.
+* For each loan term, the smallest viable deposit follows in closed form
+  from the viability rule. It is rounded up to the deposit step and checked
+  with the engine.
+
+A configuration counts as viable when it meets the Viability tab's rule and
+also pays back, i.e. the annual net profit is positive.
+"""
+import math
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from solarcalc.batch import evaluate_batch
+from solarcalc.engine import Result, Scenario, evaluate
+
+objectives = {"cost": "total_after_subsidy", "payback": "payback_years"}
+
+
+class Bounds(NamedTuple):
+    """Inclusive search ranges, in the units of the input expander."""
+    runtime_per_day: tuple = (1.0, 24.0)
+    battery_hours: tuple = (0, 24)
+    loan_term_years: tuple = (1, 10)
+    deposit_percentage: tuple = (0, 100)
+    systems: tuple = ("AC", "DC")
+    runtime_step: float = 0.5
+    deposit_step: float = 5
+
+
+class Search(NamedTuple):
+    """Outcome of ``optimize``; ``best`` and ``result`` are None when nothing in bounds is viable."""
+    objective: str
+    best: Optional[Scenario]
+    result: Optional[Result]
+    evaluations: int
+    combinations: int
+    seconds: float
+
+
+def _grid(low, high, step):
+    count = int(math.floor((high - low) / step + 1e-9)) + 1
+    return low + step * np.arange(max(count, 0))
+
+
+def combinations(bounds):
+    """Size of the brute-force grid the search stands in for."""
+    return (
+        len(_grid(*bounds.runtime_per_day, bounds.runtime_step))
+        * (int(bounds.battery_hours[1]) - int(bounds.battery_hours[0]) + 1)
+        * (int(bounds.loan_term_years[1]) - int(bounds.loan_term_years[0]) + 1)
+        * len(_grid(*bounds.deposit_percentage, bounds.deposit_step))
+        * len(bounds.systems)
+    )
+
+
+def _viable(result):
+    return result.viable_business and result.payback_years is not None
+
+
+def _min_deposit(result, interest_rate, loan_term_years):
+    """Smallest deposit (in %) that makes the loan affordable, or None if only 100% would do."""
+    net_income_per_day = result.net_income_per_day
+    if net_income_per_day <= 0 or interest_rate <= 0:
+        # No income to repay from, or an interest-free loan, which the rule never counts as viable
+        return None
+    if result.total_after_subsidy <= 0:
+        # Fully subsidised: nothing is financed
+        return 0.0
+    monthly_rate = interest_rate / 12
+    annuity = monthly_rate / (1 - (1 + monthly_rate)**(-(loan_term_years * 12)))
+    affordable_principal = net_income_per_day * 365 / 12 / annuity
+    return max(0.0, 100 * (1 - affordable_principal / result.total_after_subsidy))
+
+
+def optimize(base, objective="cost", bounds=Bounds()):
+    """Best ``Scenario`` built from ``base`` for ``objective`` ("cost" or "payback") within ``bounds``.
+
+    Ties go to the longer runtime, since it earns more for the same outlay.
+    The winner's financing is the smallest viable deposit, then the
+    shortest term at that deposit.
+    """
+    if objective not in objectives:
+        raise ValueError(f"objective must be one of {', '.join(objectives)}")
+    systems = [s for s in bounds.systems if s in ("AC", "DC")]
+    if not systems:
+        raise ValueError("Choose at least one of AC and DC")
+    start = time.perf_counter()
+    evaluations = 0
+
+    # Every runtime and system, with the smallest battery and the most lenient financing
+    runtimes = _grid(*bounds.runtime_per_day, bounds.runtime_step)
+    battery_hours = int(bounds.battery_hours[0])
+    term_low, term_high = int(bounds.loan_term_years[0]), int(bounds.loan_term_years[1])
+    deposits = _grid(*bounds.deposit_percentage, bounds.deposit_step)
+    data = dict(base._asdict(), battery_hours=battery_hours, loan_term_years=term_high,
+                deposit_percentage=float(deposits[-1]))
+    data["runtime_per_day"] = np.tile(runtimes, len(systems))
+    data["system"] = np.repeat(systems, len(runtimes))
+    out = evaluate_batch(data)
+    evaluations += len(data["runtime_per_day"])
+
+    feasible = out["viable_business"] & np.isfinite(out["payback_years"])
+    if not feasible.any():
+        return Search(objective, None, None, evaluations, combinations(bounds), time.perf_counter() - start)
+    # Lowest objective first, then the longer runtime
+    order = np.lexsort((-data["runtime_per_day"], out[objectives[objective]]))
+    pick = order[feasible[order]][0]
+    chosen = base._replace(runtime_per_day=float(data["runtime_per_day"][pick]), system=str(data["system"][pick]),
+                           battery_hours=battery_hours)
+
+    # Financing for the chosen system: per term, the smallest deposit the rule allows.
+    # Net income and the amount to finance do not depend on the financing.
+    chosen_result = evaluate(chosen)
+    evaluations += 1
+    best = None
+    for term in range(term_low, term_high + 1):
+        needed = _min_deposit(chosen_result, chosen.interest_rate, term)
+        if needed is None:
+            candidates = deposits[deposits >= 100]
+        else:
+            # The first step at or above the bound, plus the one below in case of rounding
+            i = int(np.searchsorted(deposits, needed))
+            candidates = deposits[max(i - 1, 0):i + 1]
+        for deposit in candidates:
+            scenario = chosen._replace(loan_term_years=term, deposit_percentage=float(deposit))
+            result = evaluate(scenario)
+            evaluations += 1
+            if _viable(result):
+                if best is None or (deposit, term) < (best[0].deposit_percentage, best[0].loan_term_years):
+                    best = (scenario, result)
+                break
+
+    if best is None:
+        # Stage one proved the longest term and largest deposit work
+        scenario = chosen._replace(loan_term_years=term_high, deposit_percentage=float(deposits[-1]))
+        best = (scenario, evaluate(scenario))
+        evaluations += 1
+    return Search(objective, best[0], best[1], evaluations, combinations(bounds), time.perf_counter() - start)
@@ -0,0 +1,375 @@
+"""Chunked evaluation of site portfolios read from CSV or Parquet.
+
+Input files use one row per site or appliance, with the same fields and
+units as the input expander: ``interest_rate`` and ``install_increase`` are
+percentages, like the sliders. Rows are read, evaluated with
+``evaluate_batch`` and written out ``chunksize`` rows at a time, so memory
+follows the chunk size rather than the file size. Rows can optionally be
+run through the hourly dispatch simulation as well.
+
+Files with all twelve ``sun_hours_jan`` ... ``sun_hours_dec`` columns are
+sized to a design month with ``evaluate_monthly`` and get monthly net
+income columns. Rows with a month missing use their ``sun_hours`` for
+every month. Given an ``IrradianceGrid``, rows with ``latitude`` and
+``longitude`` and no complete monthly columns take their sun hours from
+the grid.
+
+Given ``lifetime`` options, rows also get a yearly cash-flow projection
+from ``solarcalc.cashflow``: NPV, IRR (with the iterations it took) and
+discounted payback for the project and NPV and IRR for the owner.
+
+Given a ``ScenarioStore``, the valid rows are also saved to it, a chunk at
+a time, labelled with their appliance or site.
+
+Files with a ``site`` column hold one row per appliance: rows with the same
+``site`` share one system and come out as one row per site, sized to the
+site's daily energy and coincident peak (see ``solarcalc.loads``). Each
+appliance row gives its power, speed, price, runtime, income per kg and an
+optional ``start_hour`` (default 8); the other inputs come from the site's
+first row. A site's rows must be consecutive.
+"""
+import numpy as np
+import pandas as pd
+
+from solarcalc.batch import evaluate_batch
+from solarcalc.cashflow import lifetime_columns
+from solarcalc.dispatch import simulate_dispatch
+from solarcalc.engine import Scenario, panel_wattage_kw
+from solarcalc.inputs import input_defaults, required_columns
+from solarcalc.loads import Load, daily_load, load_fields, pad_loads, site_columns
+from solarcalc.seasonal import evaluate_monthly, flat_profile
+
+# Output columns: the "Detailed Calculations" table followed by the financials
+tech_columns = {
+    "machine_power_kw": "power",
+    "daily_runtime_hours": "runtime_per_day",
+    "energy_required_kwh_per_day": "energy_required_per_day",
+    "system_efficiency_pct": "system_efficiency",
+    "energy_production_needed_kwh_per_day": "energy_production",
+    "sun_hours_available": "sun_hours",
+    "solar_system_size_kwp": "recommended_solar_size",
+    "panel_wattage_w": None,
+    "panels_required": "panels_required",
+    "production_rate_kg_per_hour": "processing_speed",
+    "daily_production_kg": "production_per_day",
+    "battery_storage_kwh": "battery_capacity",
+}
+financial_columns = [
+    "solar_panel_cost",
+    "inverter_cost",
+    "controller_cost",
+    "battery_cost",
+    "fob_subtotal_usd",
+    "import_install_usd",
+    "total_with_import_usd",
+    "subsidy_amount",
+    "total_after_subsidy",
+    "deposit_amount",
+    "loan_principal_usd",
+    "monthly_repayment_usd",
+    "annual_repayment_usd",
+    "daily_repayment_usd",
+    "total_interest_paid_usd",
+    "income_per_day",
+    "net_income_per_day",
+    "repayment_percentage",
+    "net_revenue_repayment_percentage",
+    "daily_surplus",
+    "annual_net_profit",
+    "viable_business",
+    "payback_years",
+]
+# Monthly sun-hour input columns, January first
+month_columns = [f"sun_hours_{m}" for m in ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct",
+                                            "nov", "dec")]
+# Hourly dispatch columns, when asked for
+dispatch_columns = {
+    "unmet_load_hours": "unmet_hours",
+    "load_served_pct": "load_served_pct",
+    "curtailed_kwh_per_year": "curtailed_kwh",
+    "required_battery_kwh": "required_battery_kwh",
+}
+# Lifetime cash-flow columns, when asked for; rates are written as percentages
+lifetime_output = {
+    "npv_usd": "npv",
+    "irr_pct": "irr",
+    "irr_iterations": "irr_iterations",
+    "discounted_payback_years": "discounted_payback_years",
+    "equity_npv_usd": "equity_npv",
+    "equity_irr_pct": "equity_irr",
+    "lifetime_net_cash_usd": "lifetime_net_cash",
+}
+
+
+def template_frame():
+    """One example row with every input column, for users to fill in."""
+    row = dict(input_defaults, appliance="Mill 2kW", power=2.0, processing_speed=100, price_usd=600, system="AC")
+    return pd.DataFrame([row])
+
+
+def to_scenario_columns(chunk):
+    """Map a chunk in file units onto ``Scenario`` columns, filling defaults.
+
+    Numbers that cannot be parsed come back as NaN.
+    """
+    missing = [name for name in required_columns if name not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    def col(name):
+        if name in chunk.columns:
+            values = pd.to_numeric(chunk[name], errors="coerce")
+            if input_defaults[name] is not None:
+                values = values.fillna(input_defaults[name])
+            return values.to_numpy(dtype=float)
+        return np.full(len(chunk), float(input_defaults[name]))
+
+    columns = {name: col(name) for name in Scenario._fields if name in input_defaults and name != "system"}
+    columns["system"] = chunk["system"].astype(str).str.strip().str.upper().to_numpy()
+    columns["interest_rate"] = col("interest_rate") / 100
+    columns["install_multiplier"] = 1 + col("install_increase") / 100
+    return columns
+
+
+def group_sites(chunk, columns):
+    """Fold a chunk of appliance rows into one row per ``site``.
+
+    ``columns`` are the chunk's ``to_scenario_columns``. Returns the first
+    row of each site, in order of appearance, with its ``Scenario`` columns
+    (the site's equivalent load and ``peak_power``) and the ``(sites,
+    loads)`` arrays of its loads.
+    """
+    if "start_hour" in chunk.columns:
+        start_hour = pd.to_numeric(chunk["start_hour"], errors="coerce").fillna(Load._field_defaults["start_hour"])
+    else:
+        start_hour = np.full(len(chunk), Load._field_defaults["start_hour"])
+    label = chunk["site"].astype(str).to_numpy()
+    _, loads = pad_loads(label, **{name: start_hour if name == "start_hour" else columns[name]
+                                   for name in load_fields})
+    site = site_columns(*(loads[name] for name in load_fields))
+    first = ~pd.Series(label).duplicated().to_numpy()
+    grouped = {name: values[first] for name, values in columns.items()}
+    grouped.update({name: site[name] for name in ("power", "processing_speed", "runtime_per_day", "price_usd",
+                                                  "income_per_kg", "peak_power")})
+    grouped["appliances"] = site["appliances"]
+    return chunk[first], grouped, loads
+
+
+def monthly_profiles(chunk, sun_hours, irradiance=None):
+    """Monthly sun hours for each row, shape ``(rows, 12)``, and the distance to the grid cell used.
+
+    Rows take the ``month_columns``, then the ``irradiance`` grid at their
+    ``latitude`` and ``longitude``, then their ``sun_hours`` every month.
+    Returns ``(None, None)`` when the chunk has neither monthly columns nor
+    coordinates to look up; the distance is None without a lookup.
+    """
+    has_months = all(name in chunk.columns for name in month_columns)
+    has_coordinates = irradiance is not None and {"latitude", "longitude"} <= set(chunk.columns)
+    if not (has_months or has_coordinates):
+        return None, None
+    if has_months:
+        profiles = np.column_stack([pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype=float)
+                                    for name in month_columns])
+    else:
+        profiles = np.full((len(chunk), 12), np.nan)
+    distance = None
+    if has_coordinates:
+        incomplete = ~np.isfinite(profiles).all(axis=1)
+        latitude, longitude = (pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype=float)[incomplete]
+                               for name in ("latitude", "longitude"))
+        site = irradiance.lookup(latitude, longitude)
+        rows = np.flatnonzero(incomplete)[site.found]
+        profiles[rows] = site.monthly[site.found]
+        distance = np.full(len(chunk), np.nan)
+        distance[rows] = site.distance_km[site.found]
+    incomplete = ~np.isfinite(profiles).all(axis=1)
+    profiles[incomplete] = flat_profile(sun_hours[incomplete])
+    return profiles, distance
+
+
+def evaluate_chunk(chunk, dispatch=False, sizing=("worst", 10.0, 1), irradiance=None, lifetime=None, store=None,
+                   source="portfolio"):
+    """Evaluate one chunk; rows that cannot be sized get ``status`` 'invalid' and empty results.
+
+    With ``dispatch`` the valid rows are also simulated hour by hour, with
+    the ``simulate_dispatch`` defaults. ``sizing`` is the ``(basis,
+    percentile, month)`` passed to ``evaluate_monthly`` when the chunk has
+    monthly sun hours. ``irradiance`` is an ``IrradianceGrid`` to look up
+    sites by coordinates; their rows get an ``irradiance_distance_km``
+    column. ``lifetime`` is a dict of ``lifetime_columns`` options (years,
+    discount rate...) to add the ``lifetime_output`` columns. A chunk with a
+    ``site`` column is evaluated per site, as
+    grouped by ``group_sites``, with ``peak_load_kw`` and ``appliances``
+    columns. ``store`` is a ``ScenarioStore`` to save the valid rows to,
+    under ``source``.
+    """
+    columns = to_scenario_columns(chunk)
+    loads = None
+    if "site" in chunk.columns:
+        chunk, columns, loads = group_sites(chunk, columns)
+        appliances = columns.pop("appliances")
+    profiles, distance = monthly_profiles(chunk, columns["sun_hours"], irradiance)
+    numeric = [values for name, values in columns.items() if name != "system"]
+    valid = (
+        np.isin(columns["system"], ["AC", "DC"])
+        & (columns["power"] > 0)
+        & (columns["processing_speed"] >= 0)
+        & (columns["sun_hours"] > 0)
+        & (columns["system_efficiency"] > 0)
+        & (columns["loan_term_years"] >= 1)
+        # Whole days and terms, as inputs.to_scenario requires
+        & (np.mod(columns["loan_term_years"], 1) == 0)
+        & (np.mod(columns["operating_days"], 1) == 0)
+        & np.isfinite(np.column_stack(numeric)).all(axis=1)
+    )
+    if profiles is None:
+        results = evaluate_batch({name: values[valid] for name, values in columns.items()})
+    else:
+        valid &= (profiles > 0).all(axis=1)
+        results = evaluate_monthly({name: values[valid] for name, values in columns.items()}, profiles[valid],
+                                   *sizing)
+        # The sizing column shows the design sun hours; a saved row keeps the runtime share with them
+        columns["sun_hours"] = columns["sun_hours"].copy()
+        columns["sun_hours"][valid] = results["design_sun_hours"]
+        columns["runtime_share"] = np.ones(len(chunk))
+        columns["runtime_share"][valid] = results["runtime_share"]
+
+    out = pd.DataFrame(index=chunk.index)
+    if loads is not None:
+        out["site"] = chunk["site"].astype("string")
+    elif "appliance" in chunk.columns:
+        out["appliance"] = chunk["appliance"].astype("string")
+    out["system"] = columns["system"]
+    out["status"] = np.where(valid, "ok", "invalid")
+
+    def expand(values):
+        full = np.full(len(chunk), np.nan)
+        full[valid] = values
+        return full
+
+    for name, field in tech_columns.items():
+        if field is None:
+            out[name] = panel_wattage_kw * 1000
+        elif field in results:
+            out[name] = expand(results[field])
+        else:
+            out[name] = columns[field]
+    for name in financial_columns:
+        out[name] = expand(results[name])
+    if loads is not None:
+        out["peak_load_kw"] = columns["peak_power"]
+        out["appliances"] = appliances
+    # Loan terms, so schedules can be rebuilt from the results file
+    out["interest_rate_pct"] = np.where(valid, columns["interest_rate"] * 100, np.nan)
+    out["loan_term_months"] = expand(results["months"])
+    if distance is not None:
+        out["irradiance_distance_km"] = distance
+    if profiles is not None:
+        out["months_short"] = expand((results["monthly_runtime_share"] < 1).sum(axis=1))
+        for name, values in zip(month_columns, results["monthly_net_income"].T):
+            out[name.replace("sun_hours", "net_income_usd")] = expand(values)
+    if lifetime is not None:
+        cash = lifetime_columns({name: values[valid] for name, values in columns.items()}, results, **lifetime)
+        for name, field in lifetime_output.items():
+            out[name] = expand(cash[field] * 100 if name.endswith("_pct") else cash[field])
+    if dispatch:
+        year = simulate_dispatch(
+            columns["power"][valid], columns["runtime_per_day"][valid], columns["operating_days"][valid],
+            results["recommended_solar_size"], results["battery_capacity"], columns["sun_hours"][valid],
+            columns["system_efficiency"][valid], monthly_sun_hours=None if profiles is None else profiles[valid],
+            load_profile=None if loads is None else daily_load(
+                loads["start_hour"][valid], loads["runtime_per_day"][valid], loads["power"][valid])
+        )
+        for name, field in dispatch_columns.items():
+            out[name] = expand(getattr(year, field))
+    if store is not None:
+        label = out["site"] if loads is not None else out.get("appliance")
+        if label is not None:
+            label = label[valid].astype(object).where(label[valid].notna(), None).to_numpy()
+        store.add_batch({name: values[valid] for name, values in columns.items()}, results, label, source)
+    out["viable_business"] = out["viable_business"] == 1
+    return out
+
+
+def iter_chunks(source, file_format, chunksize):
+    """Yield ``(chunk, fraction_done)`` pairs from a CSV or Parquet file object."""
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(source)
+        total = max(parquet.metadata.num_rows, 1)
+        done = 0
+        for batch in parquet.iter_batches(batch_size=chunksize):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(done, done + len(chunk))
+            done += len(chunk)
+            yield chunk, done / total
+    else:
+        source.seek(0, 2)
+        size = max(source.tell(), 1)
+        source.seek(0)
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            yield chunk, min(source.tell() / size, 1.0)
+
+
+def whole_sites(chunks):
+    """Pass ``(chunk, fraction_done)`` pairs through, holding back the last site of each until its rows end.
+
+    Chunks without a ``site`` column go through as they are.
+    """
+    carry = None
+    for chunk, fraction in chunks:
+        if "site" not in chunk.columns:
+            yield chunk, fraction
+            continue
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        label = chunk["site"].astype(str).to_numpy()
+        held = label == label[-1]
+        carry = chunk[held]
+        if not held.all():
+            yield chunk[~held], fraction
+    if carry is not None:
+        yield carry, 1.0
+
+
+def run_portfolio(source, file_format, output, chunksize=50_000, on_progress=None, dispatch=False,
+                  sizing=("worst", 10.0, 1), irradiance=None, lifetime=None, store=None, source_name="portfolio"):
+    """Evaluate every row of ``source`` and write CSV results to ``output``.
+
+    ``output`` is a binary file object. ``on_progress(fraction, rows)`` is
+    called after each chunk. ``dispatch`` adds the hourly simulation
+    columns, ``sizing`` picks the design month for monthly sun hours and
+    ``irradiance`` looks sites up by coordinates and ``lifetime`` adds the
+    cash-flow projection, as in ``evaluate_chunk``. With a ``store`` the
+    valid rows are saved under ``source_name`` and its statistics refreshed
+    at the end.
+    With a ``site`` column, a site whose rows run on past the end of a
+    chunk is held back and evaluated with the next one. Returns ``(rows,
+    valid_rows)``, counting output rows.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    rows = 0
+    valid_rows = 0
+    writer = None
+    schema = None
+    try:
+        for chunk, fraction in whole_sites(iter_chunks(source, file_format, chunksize)):
+            out = evaluate_chunk(chunk, dispatch, sizing, irradiance, lifetime, store, source_name)
+            table = pa.Table.from_pandas(out, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pa_csv.CSVWriter(output, schema)
+            writer.write_table(table)
+            rows += len(out)
+            valid_rows += int((out["status"] == "ok").sum())
+            if on_progress:
+                on_progress(fraction, rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    if store is not None and valid_rows:
+        store.analyze()
+    return rows, valid_rows
@@ -0,0 +1,153 @@
+"""Exchange rates with a concurrent endpoint race and an on-disk snapshot.
+
+``fetch_rates`` queries every endpoint at once and returns the first valid
+response. ``RateCache`` keeps the last good rates in a JSON snapshot so they
+can be served immediately on startup; once they are older than ``ttl`` they
+are still served while a background thread fetches fresh ones.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+endpoints = [
+    "https://api.exchangerate-api.com/v4/latest/USD",
+    "https://open.er-api.com/v6/latest/USD"
+]
+
+# Common currencies with sample exchange rates (fallback)
+common_currencies = {
+    "USD": 1.0,
+    "EUR": 0.93,
+    "GBP": 0.80,
+    "JPY": 154.62,
+    "CAD": 1.37,
+    "AUD": 1.52,
+    "CHF": 0.91,
+    "CNY": 7.24,
+    "INR": 83.45,
+    "BRL": 5.40,
+    "MXN": 17.05,
+    "ZAR": 18.85,
+    "NGN": 1400.0,
+    "KES": 133.0,
+    "GHS": 13.5,
+    "EGP": 47.9,
+    "XOF": 610.0
+}
+
+default_snapshot_path = os.environ.get(
+    "SOLAR_RATES_SNAPSHOT",
+    os.path.join(os.path.expanduser("~"), ".cache", "solar_calculator", "rates.json")
+)
+
+
+def _fetch_one(url, timeout):
+    resp = requests.get(url, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    if not isinstance(data.get("rates"), dict):
+        raise ValueError(f"No rates in response from {url}")
+    # Merge with our common currencies as fallback
+    rates = dict(data["rates"])
+    for currency, rate in common_currencies.items():
+        rates.setdefault(currency, rate)
+    return rates
+
+
+def fetch_rates(urls=None, timeout=5):
+    """Query all endpoints concurrently and return the first valid rates, or None."""
+    urls = endpoints if urls is None else urls
+    if not urls:
+        return None
+    pool = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="rates")
+    try:
+        pending = {pool.submit(_fetch_one, url, timeout) for url in urls}
+        deadline = time.monotonic() + timeout
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        return None
+    finally:
+        # Don't wait for the slower endpoint once we have an answer
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RateCache:
+    """Stale-while-revalidate rate store backed by a JSON snapshot.
+
+    ``get`` never waits on the network when a snapshot exists. Only the very
+    first call on a machine without a snapshot fetches synchronously, and
+    that is bounded by a single ``timeout``. Failed refreshes are not
+    retried until ``retry_after`` seconds have passed.
+    """
+
+    def __init__(self, path=default_snapshot_path, ttl=3600, urls=None, timeout=5, retry_after=300):
+        self.path = path
+        self.ttl = ttl
+        self.urls = urls
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._rates = None
+        self._fetched_at = None
+        self._last_attempt = 0.0
+        self._refreshing = False
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self._rates = snapshot["rates"]
+            self._fetched_at = float(snapshot["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save_snapshot(self, rates, fetched_at):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": fetched_at, "rates": rates}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def refresh(self):
+        """Fetch rates now; returns True if live rates were stored."""
+        rates = fetch_rates(self.urls, self.timeout)
+        with self._lock:
+            self._last_attempt = time.time()
+            self._refreshing = False
+            if rates is None:
+                return False
+            self._rates = rates
+            self._fetched_at = self._last_attempt
+        self._save_snapshot(rates, self._fetched_at)
+        return True
+
+    def get(self):
+        """Return ``(rates, fetched_at)``; ``fetched_at`` is None for the sample rates."""
+        with self._lock:
+            now = time.time()
+            stale = self._fetched_at is None or now - self._fetched_at >= self.ttl
+            due = stale and not self._refreshing and now - self._last_attempt >= self.retry_after
+            cold = self._rates is None
+            if due:
+                self._refreshing = True
+        if due and cold:
+            self.refresh()
+        elif due:
+            threading.Thread(target=self.refresh, name="rates-refresh", daemon=True).start()
+        with self._lock:
+            if self._rates is None:
+                return common_currencies, None
+            return self._rates, self._fetched_at
@@ -0,0 +1,124 @@
+"""Monte Carlo viability risk for one scenario.
+
+The inputs the user is least sure of are drawn from distributions and every
+draw goes through ``evaluate_batch`` in one vectorized pass. Draws are made
+in fixed-size chunks from a seeded generator, so a given seed always gives
+the same answer. Only the daily surplus, payback and viability of each draw
+are kept, so memory grows with the sample count and not with the number of
+result fields.
+"""
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from solarcalc.batch import evaluate_batch
+
+risk_inputs = ("sun_hours", "runtime_per_day", "operating_days", "income_per_kg", "daily_operating_cost")
+
+# Draws are clipped to these ranges so every sample can be sized
+bounds = {
+    "sun_hours": (0.5, 12.0),
+    "runtime_per_day": (0.0, 24.0),
+    "operating_days": (0.0, 365.0),
+    "income_per_kg": (0.0, math.inf),
+    "daily_operating_cost": (0.0, math.inf),
+}
+percentiles = (5, 25, 50, 75, 95)
+chunk_size = 65_536
+
+
+class Distribution(NamedTuple):
+    """How one input varies.
+
+    ``kind`` is "fixed", "uniform", "triangular" or "normal". Uniform draws
+    lie between ``low`` and ``high``; triangular draws peak at ``mode``;
+    normal draws are centred on ``mode`` with ``low`` and ``high`` as the
+    2.5th and 97.5th percentiles. A fixed input is always ``mode``.
+    """
+    kind: str
+    low: float
+    mode: float
+    high: float
+
+
+class RiskSummary(NamedTuple):
+    """Outcome of ``simulate``; money in USD.
+
+    ``payback_percentiles`` are over the draws that pay back (NaN if none
+    do). ``payback_counts`` and ``payback_edges`` are a histogram of those
+    payback periods up to their 99th percentile.
+    """
+    samples: int
+    seed: int
+    probability_viable: float
+    surplus_percentiles: tuple
+    probability_payback: float
+    payback_percentiles: tuple
+    payback_counts: tuple
+    payback_edges: tuple
+
+
+def draw(dist, n, rng):
+    """``n`` unclipped samples of ``dist``."""
+    low, mode, high = float(dist.low), float(dist.mode), float(dist.high)
+    if dist.kind == "fixed" or low >= high:
+        return np.full(n, mode)
+    if dist.kind == "uniform":
+        return rng.uniform(low, high, n)
+    if dist.kind == "triangular":
+        return rng.triangular(low, min(max(mode, low), high), high, n)
+    if dist.kind == "normal":
+        return rng.normal(mode, (high - low) / 3.92, n)
+    raise ValueError(f"Unknown distribution: {dist.kind!r}")
+
+
+def simulate(scenario, distributions, samples=100_000, seed=42):
+    """Draw ``samples`` variations of ``scenario`` and summarise viability.
+
+    ``distributions`` maps names in ``risk_inputs`` to ``Distribution``s;
+    inputs not listed keep the scenario's value.
+    """
+    unknown = set(distributions) - set(risk_inputs)
+    if unknown:
+        raise ValueError(f"Cannot vary: {', '.join(sorted(unknown))}")
+    if samples < 1:
+        raise ValueError("samples must be at least 1")
+
+    rng = np.random.default_rng(seed)
+    base = scenario._asdict()
+    surplus = np.empty(samples)
+    payback = np.empty(samples)
+    viable = np.empty(samples, dtype=bool)
+    for start in range(0, samples, chunk_size):
+        stop = min(start + chunk_size, samples)
+        data = dict(base)
+        for name in risk_inputs:
+            if name in distributions:
+                values = np.clip(draw(distributions[name], stop - start, rng), *bounds[name])
+                if name == "operating_days":
+                    values = np.rint(values)
+                data[name] = values
+        data["sun_hours"] = np.broadcast_to(data["sun_hours"], stop - start)
+        out = evaluate_batch(data)
+        surplus[start:stop] = out["daily_surplus"]
+        payback[start:stop] = out["payback_years"]
+        viable[start:stop] = out["viable_business"]
+
+    paid_back = payback[np.isfinite(payback)]
+    if paid_back.size:
+        payback_percentiles = tuple(np.percentile(paid_back, percentiles).tolist())
+        counts, edges = np.histogram(paid_back, bins=30, range=(0.0, float(np.percentile(paid_back, 99))))
+    else:
+        payback_percentiles = (math.nan,) * len(percentiles)
+        counts, edges = np.zeros(0, dtype=int), np.zeros(0)
+    return RiskSummary(
+        samples,
+        seed,
+        float(viable.mean()),
+        tuple(np.percentile(surplus, percentiles).tolist()),
+        paid_back.size / samples,
+        payback_percentiles,
+        tuple(counts.tolist()),
+        tuple(edges.tolist()),
+    )
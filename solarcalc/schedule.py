@@ -0,0 +1,124 @@
+"""Month-by-month amortization schedules.
+
+``amortization_schedule`` works out interest, principal and balance for
+every month of a loan with array arithmetic instead of a month loop. After
+``k`` repayments the balance is ``(1 + r)**k`` times the opening balance
+less the discounted payments so far, so the whole schedule is one
+cumulative sum. The same form covers level payments, a grace period at the
+start and seasonal payments weighted by calendar month. ``schedule_page``
+cuts one page out of the schedules of many loans and only builds the
+loans that appear on that page.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+month_names = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+schedule_columns = ("month", "calendar_month", "payment", "interest", "principal", "balance")
+
+
+class Schedule(NamedTuple):
+    """One loan, one row per month; ``month`` counts from 1 and ``calendar_month`` is 1-12.
+
+    ``level_payment`` is the repayment for a weight of 1: the fixed monthly
+    repayment when there are no seasonal weights.
+    """
+    month: np.ndarray
+    calendar_month: np.ndarray
+    payment: np.ndarray
+    interest: np.ndarray
+    principal: np.ndarray
+    balance: np.ndarray
+    level_payment: float
+
+
+def amortization_schedule(principal, interest_rate, months, grace_months=0, capitalize_grace=False, weights=None,
+                          start_month=1):
+    """Schedule for a loan of ``principal`` at annual ``interest_rate`` (a fraction) over ``months``.
+
+    The first ``grace_months`` are interest-only, or payment-free with the
+    interest added to the balance if ``capitalize_grace`` is set; the
+    remaining months repay the loan. ``weights`` gives twelve relative
+    payment sizes, January first, for businesses that earn more in some
+    months; ``start_month`` is the calendar month of the first payment.
+    With no grace period and no weights the payment is the same closed form
+    as ``monthly_repayment_usd``.
+    """
+    months = int(months)
+    grace_months = max(int(grace_months), 0)
+    if months < 1:
+        raise ValueError("The loan needs at least one month")
+    if grace_months >= months:
+        raise ValueError("The grace period must be shorter than the loan term")
+    r = interest_rate / 12
+    month = np.arange(1, months + 1)
+    calendar_month = (start_month - 1 + month - 1) % 12 + 1
+
+    # Grace period
+    g = np.arange(1, grace_months + 1)
+    if capitalize_grace:
+        grace_balance = principal * (1 + r)**g
+        grace_interest = grace_balance - np.concatenate(([principal], grace_balance[:-1]))
+        grace_payment = np.zeros(grace_months)
+    else:
+        grace_balance = np.full(grace_months, float(principal))
+        grace_interest = np.full(grace_months, principal * r)
+        grace_payment = grace_interest
+    opening = float(grace_balance[-1]) if grace_months else float(principal)
+
+    # Repayment period
+    n = months - grace_months
+    j = np.arange(1, n + 1)
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=float)[calendar_month[grace_months:] - 1]
+    if (w < 0).any() or not w.any():
+        raise ValueError("Seasonal weights must be non-negative and not all zero in the repayment months")
+    if r > 0:
+        discount = (1 + r)**(-j.astype(float))
+        level_payment = (opening * r) / (1 - (1 + r)**(-n)) if weights is None else opening / (w * discount).sum()
+        payment = level_payment * w
+        balance = (opening - np.cumsum(payment * discount)) / discount
+    else:
+        level_payment = opening / w.sum()
+        payment = level_payment * w
+        balance = opening - np.cumsum(payment)
+    # The last payment clears the loan; drop the rounding residue
+    balance[-1] = 0.0
+    previous = np.concatenate(([opening], balance[:-1]))
+    interest = previous * r
+
+    return Schedule(
+        month,
+        calendar_month,
+        np.concatenate((grace_payment, payment)),
+        np.concatenate((grace_interest, interest)),
+        np.concatenate((grace_payment - grace_interest, payment - interest)),
+        np.concatenate((grace_balance, balance)),
+        float(level_payment),
+    )
+
+
+def schedule_page(principals, interest_rates, months, page, page_size, **options):
+    """Rows ``page * page_size`` onwards of the loans' schedules laid end to end.
+
+    Returns ``(columns, total_rows)``; ``columns`` maps ``loan`` (the index
+    into the inputs) and the ``Schedule`` columns to arrays. Only loans
+    with rows on the page are built. ``options`` go to
+    ``amortization_schedule``.
+    """
+    counts = np.asarray(months, dtype=np.int64)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    total_rows = int(ends[-1]) if len(ends) else 0
+    first = page * page_size
+    last = min(first + page_size, total_rows)
+
+    pieces = {name: [] for name in ("loan",) + schedule_columns}
+    for i in range(int(np.searchsorted(ends, first, side="right")), int(np.searchsorted(starts, last))):
+        schedule = amortization_schedule(principals[i], interest_rates[i], counts[i], **options)
+        a = max(first - int(starts[i]), 0)
+        b = min(last - int(starts[i]), int(counts[i]))
+        pieces["loan"].append(np.full(b - a, i))
+        for name in schedule_columns:
+            pieces[name].append(getattr(schedule, name)[a:b])
+    columns = {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in pieces.items()}
+    return columns, total_rows
@@ -0,0 +1,148 @@
+"""Monthly sun-hour profiles, sizing to a design month and monthly income.
+
+One yearly ``sun_hours`` figure sizes a system for an average day, which
+comes up short in the rainy season. Here a site has twelve monthly peak sun
+hours, January first. ``design_sun_hours`` turns a profile into the one
+figure to size against: the yearly average, the worst month, a percentile
+of the months or a chosen month. ``evaluate_monthly`` sizes and costs with
+``evaluate_batch`` at that figure, then works out every month of every
+scenario as ``(scenarios, 12)`` arrays. In a month with fewer sun hours than
+the design figure the array cannot run the machine for its full runtime,
+so production and income fall with the share of the runtime it can cover.
+When every month is covered the yearly figures equal ``evaluate_batch``'s
+bit for bit. ``monthly_scenario`` carries the yearly share back into a
+``Scenario``, so the scalar engine gives the same income and payback.
+"""
+import numpy as np
+
+from solarcalc.batch import evaluate_batch, viability_columns
+from solarcalc.engine import Scenario, panel_wattage_kw
+from solarcalc.schedule import month_names
+
+month_days = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+# Month (0-11) of each day of the year
+day_month = np.repeat(np.arange(12), month_days)
+sizing_bases = ("average", "worst", "percentile", "month")
+# Design-month choices offered by the app: label -> (basis, percentile, month) for design_sun_hours
+design_month_options = {
+    "Worst month": ("worst", 10.0, 1),
+    "10th percentile month": ("percentile", 10.0, 1),
+    "25th percentile month": ("percentile", 25.0, 1),
+    "Average month": ("average", 10.0, 1),
+    **{name: ("month", 10.0, i + 1) for i, name in enumerate(month_names)},
+}
+
+# Typical shapes of the year for common climates, in peak sun hours per day.
+# They are rough guides, not measurements; use site data where there is some.
+sun_hour_catalog = {
+    "East Africa, two rainy seasons": (5.8, 6.0, 5.6, 4.8, 4.5, 4.6, 4.4, 4.7, 5.3, 5.2, 4.8, 5.3),
+    "Sahel, summer rains": (5.9, 6.3, 6.4, 6.3, 6.1, 5.8, 5.2, 4.9, 5.4, 5.9, 5.9, 5.7),
+    "West African coast": (4.9, 5.2, 5.2, 5.0, 4.6, 3.9, 3.8, 3.9, 4.1, 4.6, 4.9, 4.8),
+    "Southern Africa, summer rains": (5.2, 5.3, 5.4, 5.6, 5.5, 5.3, 5.6, 6.2, 6.6, 6.5, 5.7, 5.1),
+    "South Asia, monsoon": (4.6, 5.3, 6.0, 6.3, 6.2, 4.8, 4.1, 4.2, 4.8, 5.3, 4.9, 4.4),
+}
+
+
+def flat_profile(sun_hours):
+    """The same sun hours every month, shape ``(..., 12)``."""
+    return np.repeat(np.asarray(sun_hours, dtype=float)[..., None], 12, axis=-1)
+
+
+def design_sun_hours(profiles, basis="worst", percentile=10.0, month=1):
+    """Sun hours to size against for each profile in ``profiles`` (shape ``(..., 12)``).
+
+    ``basis`` is "average" (weighted by days per month), "worst",
+    "percentile" (of the twelve months) or "month" (``month`` is 1-12).
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    if profiles.shape[-1:] != (12,):
+        raise ValueError("A sun-hour profile needs twelve monthly values")
+    if basis == "average":
+        return (profiles * month_days).sum(axis=-1) / month_days.sum()
+    if basis == "worst":
+        return profiles.min(axis=-1)
+    if basis == "percentile":
+        return np.percentile(profiles, percentile, axis=-1)
+    if basis == "month":
+        if not 1 <= month <= 12:
+            raise ValueError(f"month must be 1-12, got {month!r}")
+        return profiles[..., month - 1]
+    raise ValueError(f"basis must be one of {', '.join(sizing_bases)}")
+
+
+def evaluate_monthly(data, profiles, basis="worst", percentile=10.0, month=1):
+    """``evaluate_batch`` sized to a design month, with income worked out month by month.
+
+    ``data`` is as for ``evaluate_batch``; its ``sun_hours`` is replaced by
+    the design sun hours of ``profiles``, shape ``(scenarios, 12)`` or
+    ``(12,)`` for all, and its ``runtime_share`` is worked out here. Operating days are spread over the months by their
+    length. The yearly income, viability and payback fields are replaced by
+    the sums over the months; ``net_income_per_day`` becomes the average
+    over operating days. Added fields, ``(scenarios, 12)`` unless noted:
+
+    * ``design_sun_hours`` and ``runtime_share`` (one per scenario, the
+      day-weighted share of the runtime covered) and ``monthly_sun_hours``
+    * ``monthly_panels_required`` and ``monthly_solar_size``: what each
+      month alone would need
+    * ``monthly_runtime_share``: share of the daily runtime the installed
+      array covers
+    * ``monthly_operating_days``, ``monthly_production_kg``,
+      ``monthly_income``, ``monthly_net_income`` (after operating costs) and
+      ``monthly_surplus`` (after the loan repayment), money in USD
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    design = design_sun_hours(profiles, basis, percentile, month)
+    results = evaluate_batch(dict(data, sun_hours=design, runtime_share=1.0))
+    n = len(results["recommended_solar_size"])
+    sun = np.broadcast_to(profiles, (n, 12))
+    column = {name: np.broadcast_to(np.asarray(data.get(name, Scenario._field_defaults[name]), dtype=float), n)
+              for name in ("operating_days", "daily_operating_cost", "deposit_percentage")}
+
+    # What each month alone would need, and how much of the runtime the installed array covers
+    energy_production = results["energy_production"][:, None]
+    monthly_panels_required = np.ceil(energy_production / (panel_wattage_kw * sun)).astype(np.int64)
+    monthly_solar_size = np.ceil((energy_production / sun) * 2) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covered = results["recommended_solar_size"][:, None] * sun / energy_production
+    runtime_share = np.where(energy_production > 0, np.minimum(covered, 1.0), 1.0)
+
+    monthly_operating_days = column["operating_days"][:, None] * month_days / month_days.sum()
+    monthly_production_kg = results["production_per_day"][:, None] * runtime_share * monthly_operating_days
+    monthly_income = results["income_per_day"][:, None] * runtime_share * monthly_operating_days
+    monthly_net_income = monthly_income - column["daily_operating_cost"][:, None] * monthly_operating_days
+
+    # The year: income scales with the day-weighted runtime share, which is exactly 1 when every month is covered
+    share = (runtime_share * month_days).sum(axis=1) / month_days.sum()
+    income_per_day = results["income_per_day"] * share
+    net_income_per_day = income_per_day - column["daily_operating_cost"]
+    results.update(
+        income_per_day=income_per_day,
+        gross_income_per_year=income_per_day * column["operating_days"],
+        net_income_per_day=net_income_per_day,
+        **viability_columns(income_per_day, net_income_per_day, column["operating_days"],
+                            results["daily_repayment_usd"], column["deposit_percentage"],
+                            results["total_after_subsidy"]),
+        design_sun_hours=np.broadcast_to(design, n).copy(),
+        runtime_share=share,
+        monthly_sun_hours=sun,
+        monthly_panels_required=monthly_panels_required,
+        monthly_solar_size=monthly_solar_size,
+        monthly_runtime_share=runtime_share,
+        monthly_operating_days=monthly_operating_days,
+        monthly_production_kg=monthly_production_kg,
+        monthly_income=monthly_income,
+        monthly_net_income=monthly_net_income,
+        monthly_surplus=monthly_net_income - results["monthly_repayment_usd"][:, None],
+    )
+    return results
+
+
+def monthly_scenario(scenario, profile, basis="worst", percentile=10.0, month=1):
+    """``scenario`` sized to the design month of ``profile``, with its yearly ``runtime_share``.
+
+    ``evaluate`` of the result gives the yearly income, viability and payback
+    ``evaluate_monthly`` works out month by month.
+    """
+    results = evaluate_monthly(scenario._asdict(), profile, basis, percentile, month)
+    return scenario._replace(sun_hours=float(results["design_sun_hours"][0]),
+                             runtime_share=float(results["runtime_share"][0]))
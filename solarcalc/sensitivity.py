@@ -0,0 +1,103 @@
+"""One-at-a-time sensitivity of the viability outputs to each input.
+
+Every input in ``sensitivity_inputs`` is moved down and up by the same
+step while the others stay at the base scenario. The base row and all the
+perturbed rows go through ``evaluate_batch`` together, one call per base
+scenario and step. Results are kept in an LRU keyed on the normalized
+scenario, like ``engine.evaluate_cached``.
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from solarcalc.batch import evaluate_batch
+from solarcalc.engine import normalize
+
+sensitivity_inputs = (
+    "sun_hours", "system_efficiency", "battery_hours", "runtime_per_day", "operating_days",
+    "income_per_kg", "daily_operating_cost", "interest_rate", "loan_term_years",
+    "deposit_percentage", "subsidy_percentage", "install_multiplier",
+)
+outputs = ("daily_surplus", "net_revenue_repayment_percentage", "payback_years")
+
+# Inputs that usually sit at zero move by ``step * 100`` percentage points instead
+point_inputs = {"deposit_percentage", "subsidy_percentage"}
+# Whole-number inputs move by at least one
+whole_inputs = {"operating_days", "loan_term_years"}
+limits = {
+    "sun_hours": (0.1, 24.0),
+    "system_efficiency": (1.0, 100.0),
+    "runtime_per_day": (0.0, 24.0),
+    "operating_days": (1, 365),
+    "loan_term_years": (1, 50),
+    "deposit_percentage": (0.0, 100.0),
+    "subsidy_percentage": (0.0, 100.0),
+    "install_multiplier": (1.0, None),
+}
+
+
+class Swing(NamedTuple):
+    """Outputs with one input moved down and up; outputs are in ``outputs`` order."""
+    input: str
+    low_input: float
+    high_input: float
+    low: tuple
+    high: tuple
+
+
+class Sensitivity(NamedTuple):
+    """Base outputs and one ``Swing`` per input; money in USD, payback NaN when not viable."""
+    step: float
+    base: tuple
+    swings: tuple
+
+
+def _moved(name, value, step):
+    """``(low, high)`` values of one input for a relative ``step``."""
+    if name in point_inputs:
+        delta = step * 100
+    elif name == "install_multiplier":
+        # The slider is the increase over FOB, so that is what moves
+        delta = (value - 1) * step
+    elif name in whole_inputs:
+        delta = max(1, round(value * step))
+    else:
+        delta = abs(value) * step
+    low, high = value - delta, value + delta
+    lo, hi = limits.get(name, (None, None))
+    if lo is not None:
+        low, high = max(low, lo), max(high, lo)
+    if hi is not None:
+        low, high = min(low, hi), min(high, hi)
+    return float(low), float(high)
+
+
+def sensitivity(scenario, step=0.1):
+    """Base outputs and the swing of each input moved by ``step`` (0.1 for ±10%)."""
+    return _sensitivity_normalized(normalize(scenario), round(float(step), 9))
+
+
+@lru_cache(maxsize=256)
+def _sensitivity_normalized(scenario, step):
+    base = scenario._asdict()
+    moved = {name: _moved(name, base[name], step) for name in sensitivity_inputs}
+
+    # Row 0 is the base; then each input low, high in order
+    rows = 1 + 2 * len(sensitivity_inputs)
+    data = {name: np.full(rows, value) for name, value in base.items() if name != "system"}
+    data["system"] = scenario.system
+    for i, name in enumerate(sensitivity_inputs):
+        data[name][1 + 2 * i:3 + 2 * i] = moved[name]
+    results = evaluate_batch(data)
+    table = np.column_stack([results[name] for name in outputs]).tolist()
+
+    swings = tuple(
+        Swing(name, *moved[name], tuple(table[1 + 2 * i]), tuple(table[2 + 2 * i]))
+        for i, name in enumerate(sensitivity_inputs)
+    )
+    return Sensitivity(step, tuple(table[0]), swings)
+
+
+cache_info = _sensitivity_normalized.cache_info
+cache_clear = _sensitivity_normalized.cache_clear
@@ -0,0 +1,297 @@
+"""Every calculated scenario, kept in a local SQLite database for later queries.
+
+One ``scenarios`` row holds a scenario's inputs (the ``Scenario`` fields),
+its key results, where it came from (``source``: "app" or a portfolio file
+name), a label (the appliance or site), the display currency with the rate
+it was shown at, and when it was saved. Money is stored in USD, like the
+engine's results; ``rate`` converts it back to what was shown.
+
+Analysts' filters are indexed: system, viability, power and payback
+together, so "viable 3kW DC systems paying back within 2 years" is one
+index range, and cost, surplus, currency and source on their own. Pages
+come newest first and are keyed by ``id`` rather than an offset, so a page
+deep in a store of millions of rows costs the same as the first one.
+
+Portfolio runs insert a chunk at a time with ``executemany`` in one
+transaction and then ``analyze`` the table: without statistics SQLite
+reads every match of a broad filter through an index and sorts it, rather
+than walking ids down from the newest. The file is in WAL mode, so the
+app keeps reading while a portfolio is being saved, and the connection is
+shared by every session in the process.
+
+    python -m solarcalc.store query --system DC --viable --min-power 3 --max-power 3 --max-payback 2
+    python -m solarcalc.store count --currency KES
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from solarcalc.batch import columns_from_scenarios, evaluate_batch
+from solarcalc.engine import Scenario
+
+# Results kept with each scenario; the inputs are kept in full, so the rest can be recomputed
+result_columns = (
+    "recommended_solar_size",
+    "battery_capacity",
+    "total_after_subsidy",
+    "monthly_repayment_usd",
+    "income_per_day",
+    "net_income_per_day",
+    "daily_surplus",
+    "annual_net_profit",
+    "net_revenue_repayment_percentage",
+    "viable_business",
+    "payback_years",
+)
+record_columns = ("created", "source", "label", "currency", "rate")
+columns = record_columns + Scenario._fields + result_columns
+schema = f"""
+CREATE TABLE IF NOT EXISTS scenarios (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    source TEXT NOT NULL,
+    label TEXT,
+    currency TEXT NOT NULL,
+    rate REAL NOT NULL,
+    system TEXT NOT NULL,
+    {", ".join(f"{name} REAL" for name in Scenario._fields if name != "system")},
+    viable_business INTEGER NOT NULL,
+    {", ".join(f"{name} REAL" for name in result_columns if name != "viable_business")}
+);
+CREATE INDEX IF NOT EXISTS scenarios_search ON scenarios (system, viable_business, currency, power, payback_years);
+CREATE INDEX IF NOT EXISTS scenarios_payback ON scenarios (payback_years);
+CREATE INDEX IF NOT EXISTS scenarios_cost ON scenarios (total_after_subsidy);
+CREATE INDEX IF NOT EXISTS scenarios_surplus ON scenarios (daily_surplus);
+CREATE INDEX IF NOT EXISTS scenarios_source ON scenarios (source);
+"""
+
+cache_mb = 64
+
+default_store_path = os.environ.get(
+    "SOLAR_SCENARIO_STORE",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "solar_calculator", "scenarios.sqlite")
+)
+
+
+class StoredScenario(NamedTuple):
+    """One saved scenario: the record fields, the ``Scenario`` fields, then ``result_columns``."""
+    id: int
+    created: float                  # Unix time
+    source: str
+    label: str
+    currency: str
+    rate: float                     # currency per USD when saved
+    power: float
+    processing_speed: float
+    price_usd: float
+    system: str
+    runtime_per_day: float
+    operating_days: float
+    income_per_kg: float
+    sun_hours: float
+    system_efficiency: float
+    battery_hours: float
+    daily_operating_cost: float
+    loan_term_years: float
+    interest_rate: float
+    deposit_percentage: float
+    install_multiplier: float
+    subsidy_percentage: float
+    peak_power: float
+    runtime_share: float
+    recommended_solar_size: float
+    battery_capacity: float
+    total_after_subsidy: float
+    monthly_repayment_usd: float
+    income_per_day: float
+    net_income_per_day: float
+    daily_surplus: float
+    annual_net_profit: float
+    net_revenue_repayment_percentage: float
+    viable_business: bool
+    payback_years: float            # None if not viable
+
+    def scenario(self):
+        return Scenario(**{name: getattr(self, name) for name in Scenario._fields})
+
+
+class Page(NamedTuple):
+    rows: list                      # StoredScenario, newest first
+    next_before: Optional[int]      # pass as ``before`` for the next page; None on the last one
+
+
+def _values(values, n):
+    """A column as a list of ``n`` plain Python values; NaN becomes None."""
+    values = np.broadcast_to(np.asarray(values), n)
+    if values.dtype.kind == "f":
+        return np.where(np.isnan(values), None, values).tolist()
+    return values.tolist()
+
+
+class ScenarioStore:
+    """Reads and writes a store file, created with its directory on first use."""
+
+    def __init__(self, path=default_store_path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("PRAGMA synchronous = NORMAL")
+                # Bulk inserts touch every index; a larger page cache keeps them off the disk
+                conn.execute(f"PRAGMA cache_size = -{cache_mb * 1024}")
+                conn.executescript(schema)
+                self._conn = conn
+            return self._conn
+
+    def _query(self, sql, params=()):
+        conn = self._connection()
+        with self._lock:
+            return conn.execute(sql, params).fetchall()
+
+    def add_batch(self, data, results, labels=None, source="app", currency="USD", rate=1.0):
+        """Save evaluated scenarios in one transaction and return how many.
+
+        ``data`` holds the ``Scenario`` columns (missing ones take their
+        defaults) and ``results`` their ``evaluate_batch`` output; ``labels``
+        is one per scenario or None.
+        """
+        n = len(results["recommended_solar_size"])
+        if not n:
+            return 0
+        record = {"created": time.time(), "source": str(source), "label": labels, "currency": currency,
+                  "rate": float(rate)}
+        values = [_values(record[name], n) if name != "label" or labels is not None else [None] * n
+                  for name in record_columns]
+        values += [_values(data.get(name, Scenario._field_defaults.get(name)), n) for name in Scenario._fields]
+        values += [_values(np.asarray(results[name]).astype(int) if name == "viable_business" else results[name], n)
+                   for name in result_columns]
+        conn = self._connection()
+        with self._lock:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO scenarios ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    zip(*values)
+                )
+        return n
+
+    def analyze(self):
+        """Refresh the statistics the query planner picks indexes by; about half a second per million rows."""
+        conn = self._connection()
+        with self._lock:
+            conn.execute("ANALYZE")
+
+    def add_scenarios(self, labels, scenarios, source="app", currency="USD", rate=1.0):
+        """Evaluate ``Scenario`` tuples together and save them; returns how many."""
+        data = columns_from_scenarios(scenarios)
+        return self.add_batch(data, evaluate_batch(data), labels, source, currency, rate)
+
+    def _where(self, system=None, viable=None, min_power=None, max_power=None, max_payback=None,
+               currency=None, source=None, max_cost=None, min_surplus=None):
+        where, params = [], []
+        for clause, value in (("system = ?", system), ("viable_business = ?", None if viable is None else int(viable)),
+                              ("power >= ?", min_power), ("power <= ?", max_power),
+                              ("payback_years <= ?", max_payback), ("currency = ?", currency),
+                              ("source = ?", source), ("total_after_subsidy <= ?", max_cost),
+                              ("daily_surplus >= ?", min_surplus)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        return where, params
+
+    def query(self, before=None, limit=50, **filters):
+        """A ``Page`` of saved scenarios matching ``filters``, newest first, with ids below ``before``.
+
+        Filters: ``system``, ``viable``, ``min_power`` and ``max_power``
+        (kW), ``max_payback`` (years), ``currency``, ``source``,
+        ``max_cost`` (USD after subsidy) and ``min_surplus`` (USD a day).
+        """
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit!r}")
+        where, params = self._where(**filters)
+        if before is not None:
+            where.append("id < ?")
+            params.append(before)
+        sql = f"SELECT id, {', '.join(columns)} FROM scenarios"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # One row past the page says whether there is another
+        rows = self._query(sql + " ORDER BY id DESC LIMIT ?", (*params, limit + 1))
+        page = [StoredScenario(*row[:-2], bool(row[-2]), row[-1]) for row in rows[:limit]]
+        return Page(page, page[-1].id if len(rows) > limit else None)
+
+    def count(self, **filters):
+        """How many saved scenarios match ``filters``, as for ``query``."""
+        where, params = self._where(**filters)
+        sql = "SELECT COUNT(*) FROM scenarios"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._query(sql, params)[0][0]
+
+    def sources(self):
+        return [row[0] for row in self._query("SELECT DISTINCT source FROM scenarios ORDER BY source")]
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM scenarios")[0][0]
+
+
+@lru_cache(maxsize=None)
+def get_store(path=default_store_path):
+    """The process-wide store for ``path``; the file is opened on first use."""
+    return ScenarioStore(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m solarcalc.store",
+                                     description="Query the saved scenarios.")
+    parser.add_argument("--store", default=default_store_path, help=f"store file (default: {default_store_path})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    query = commands.add_parser("query", help="list matching scenarios, newest first")
+    count = commands.add_parser("count", help="count matching scenarios")
+    for command in (query, count):
+        command.add_argument("--system", type=str.upper, choices=["AC", "DC"])
+        command.add_argument("--viable", action="store_true", default=None, help="only viable scenarios")
+        command.add_argument("--min-power", type=float, help="kW")
+        command.add_argument("--max-power", type=float, help="kW")
+        command.add_argument("--max-payback", type=float, help="years")
+        command.add_argument("--currency", type=str.upper)
+        command.add_argument("--source", help='"app" or a portfolio file name')
+    query.add_argument("--before", type=int, help="only ids below this, for the next page")
+    query.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    filters = {name: getattr(args, name) for name in ("system", "viable", "min_power", "max_power", "max_payback",
+                                                      "currency", "source")}
+    try:
+        store = ScenarioStore(args.store)
+        if args.command == "count":
+            print(f"{store.count(**filters):,}")
+        else:
+            page = store.query(args.before, args.limit, **filters)
+            for row in page.rows:
+                payback = f"{row.payback_years:.1f} years" if row.payback_years is not None else "not viable"
+                print(f"{row.id}\t{time.strftime('%Y-%m-%d %H:%M', time.localtime(row.created))}\t{row.label or ''}\t"
+                      f"{row.power:g} kW {row.system}\t{row.total_after_subsidy * row.rate:,.1f} {row.currency}\t"
+                      f"{payback}")
+            if page.next_before is not None:
+                print(f"more: --before {page.next_before}", file=sys.stderr)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,11 @@
+"""optimize with financing edge cases."""
+from solarcalc.engine import Scenario
+from solarcalc.optimize import optimize
+
+
+def test_full_subsidy_has_nothing_to_finance():
+    search = optimize(Scenario(2.0, 100, 600, "AC", subsidy_percentage=100), "cost")
+    assert search.best is not None
+    assert search.result.total_after_subsidy == 0
+    assert search.result.loan_principal_usd == 0
+    assert search.result.viable_business
@@ -0,0 +1,19 @@
+"""evaluate_chunk row validation."""
+import warnings
+
+import pandas as pd
+
+from solarcalc.portfolio import evaluate_chunk, template_frame
+
+
+def test_bad_loan_terms_are_invalid():
+    chunk = pd.concat([template_frame()] * 5, ignore_index=True)
+    chunk["loan_term_years"] = [0, -3, 2.5, 3, 3]
+    chunk["operating_days"] = [250, 250, 250, 250.5, 250]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        out = evaluate_chunk(chunk)
+    assert out["status"].tolist() == ["invalid", "invalid", "invalid", "invalid", "ok"]
+    assert out["monthly_repayment_usd"][:4].isna().all()
+    assert out["loan_term_months"][:4].isna().all()
+    assert out["loan_term_months"][4] == 36
@@ -0,0 +1,83 @@
+"""fetch_rates and RateCache against local stand-in endpoints."""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from solarcalc.rates import RateCache, fetch_rates
+
+
+@pytest.fixture
+def endpoint():
+    """Start a stand-in rates endpoint: ``endpoint(body, delay=0, status=200)`` returns its URL."""
+    servers = []
+
+    def start(body, delay=0, status=200):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fastest_valid_endpoint_wins(endpoint):
+    slow = endpoint({"rates": {"USD": 1, "KES": 999.0}}, delay=2)
+    fast = endpoint({"rates": {"USD": 1, "KES": 130.0}})
+    started = time.monotonic()
+    rates = fetch_rates([slow, fast], timeout=5)
+    assert time.monotonic() - started < 1
+    assert rates["KES"] == 130.0
+    # Currencies the endpoint leaves out come from the sample rates
+    assert rates["EUR"] == 0.93
+
+
+def test_invalid_and_slow_endpoints_are_ignored(endpoint):
+    no_rates = endpoint({"result": "error"})
+    failing = endpoint({}, status=500)
+    too_slow = endpoint({"rates": {"USD": 1, "KES": 999.0}}, delay=2)
+    valid = endpoint({"rates": {"USD": 1, "KES": 130.0}}, delay=0.2)
+    assert fetch_rates([no_rates, failing, too_slow, valid], timeout=1)["KES"] == 130.0
+    started = time.monotonic()
+    assert fetch_rates([no_rates, failing, too_slow], timeout=0.5) is None
+    assert time.monotonic() - started < 1.5
+
+
+def test_stale_snapshot_served_while_refreshing(endpoint, tmp_path):
+    path = tmp_path / "rates.json"
+    path.write_text(json.dumps({"fetched_at": time.time() - 7200, "rates": {"USD": 1, "KES": 120.0}}))
+    cache = RateCache(str(path), ttl=3600, urls=[endpoint({"rates": {"USD": 1, "KES": 130.0}}, delay=0.5)])
+
+    started = time.monotonic()
+    rates, fetched_at = cache.get()
+    assert time.monotonic() - started < 0.2
+    assert rates["KES"] == 120.0
+    assert fetched_at < time.time() - 3600
+
+    deadline = time.monotonic() + 5
+    while cache.get()[0]["KES"] != 130.0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    rates, fetched_at = cache.get()
+    assert rates["KES"] == 130.0
+    assert fetched_at > time.time() - 60
+    # The refreshed rates are the snapshot for the next start
+    assert json.loads(path.read_text())["rates"]["KES"] == 130.0
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]